@@ -0,0 +1,251 @@
+"""
+Autopilot for Energiby YderZonen.
+
+`Autopilot.plan` searches a schedule of air flow, turbine share and oven
+fills that keeps production inside the electricity and heat envelopes for
+the current wind/sun scenario. The schedule is piecewise constant over
+segments of `segment_steps` ticks; fills follow a "fill when the oven is
+below a level" rule whose level is part of the search. Candidates are
+evaluated a whole population at a time with `BatchEnergyGrid` and improved
+with the cross-entropy method, starting from a feed-forward guess, until the
+time budget is used up.
+
+The planned schedule drives the unattended demo mode and its predicted
+production is shown as the "expert" ghost trace. `AutopilotProcess` runs the
+planner in a forked worker so the search never competes with the render loop.
+"""
+
+import multiprocessing
+import pickle
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from energiby_batch import BatchEnergyGrid
+from energiby_score import BAND_WEIGHT, DEVIATION_PENALTY, EMISSION_PENALTY
+
+
+# Planned controls per tick from `start`, and the production they lead to
+Schedule = namedtuple("Schedule", "start air_flow turbine_pct fill electricity heat score")
+
+
+def _lead(values, steps):
+    """Shift along the last axis so values[..., k] is the value `steps` ticks later."""
+    return np.concatenate([values[..., steps:], np.repeat(values[..., -1:], steps, axis=-1)], axis=-1)
+
+
+def feed_forward_controls(requirements, plant, renewables, start=0):
+    """
+    Per-tick air flow and turbine share aimed at the envelope centres.
+
+    `renewables[..., k]` is the wind + sun production at tick `start + k`;
+    leading dimensions (several scenarios) are broadcast.
+    """
+    n = renewables.shape[-1]
+    el_need = np.maximum(requirements.electricity.need_vector[start:start + n] - renewables, 0.0)
+    heat_need = np.broadcast_to(requirements.heat.need_vector[start:start + n], el_need.shape)
+    # The plant follows its air flow with a time constant of ~1/alpha_up ticks
+    lead = min(int(1 / plant.alpha_up), n - 1)
+    el_need = _lead(el_need, lead)
+    heat_need = _lead(heat_need, lead)
+    power = np.clip(el_need + heat_need, 1e-3, plant.power_max)
+    turbine = np.clip(el_need / power, 0.0, 1.0)
+    oven_pct = (plant.oven_amount_ok_min + plant.oven_amount_ok_max) / 2 / plant.oven_amount_max
+    air_flow = np.clip(power / (oven_pct * plant.power_max), 0.0, 1.0)
+    return air_flow, turbine
+
+
+def simulate_batch(batch, start, air_steps, turbine_steps, fill_level, CaCO3_amount=0.0, NaOH_amount=0.0):
+    """
+    Drive a `BatchEnergyGrid` with per-tick controls (ticks x copies) from tick `start`.
+
+    Fills follow the "fill when the oven is below `fill_level`" rule. Returns
+    (objective, electricity, heat, fills); the objective is the unclipped
+    EnvelopeScore of each copy, so a search still has a gradient in hopeless
+    regions.
+    """
+    n, size = air_steps.shape
+    electricity = np.empty((n, size))
+    heat = np.empty((n, size))
+    emission = np.zeros(size)
+    fills = np.zeros((n, size), dtype=bool)
+    for k in range(n):
+        fill = (batch.oven_amount < fill_level) & (batch.storage_amount > 0.0)
+        fills[k] = fill
+        batch.fill_oven(fill)
+        electricity[k], heat[k] = batch.step(start + k, air_steps[k], turbine_steps[k], CaCO3_amount, NaOH_amount)
+        emission += batch.acid + batch.CO
+
+    req = batch.requirements
+    deviation = np.zeros(size)
+    in_band = np.ones((n, size), dtype=bool)
+    for produced, need in ((electricity, req.electricity), (heat, req.heat)):
+        over = np.maximum(produced - need.need_max_vector[start:start + n, None], 0.0)
+        under = np.maximum(need.need_min_vector[start:start + n, None] - produced, 0.0)
+        deviation += (over + under).sum(axis=0)
+        in_band &= (over == 0.0) & (under == 0.0)
+    dt = 0.05
+    objective = (BAND_WEIGHT * in_band.mean(axis=0)
+                 - DEVIATION_PENALTY * deviation * dt
+                 - EMISSION_PENALTY * emission * dt)
+    return objective, electricity, heat, fills
+
+
+class Autopilot:
+    """Cross-entropy search over piecewise-constant control schedules."""
+
+    def __init__(self, energy_grid, N, segment_steps=40, population=128, elite=16,
+                 iterations=40, time_budget=1.5, seed=0):
+        self.energy_grid = energy_grid
+        self.N = N
+        self.segment_steps = segment_steps
+        self.population = population
+        self.elite = elite
+        self.iterations = iterations
+        self.time_budget = time_budget
+        self.rng = np.random.default_rng(seed)
+
+    def initial_guess(self, start, segments):
+        """Feed-forward controls from the envelope centres and the renewables, per segment."""
+        grid = self.energy_grid
+        renewables = np.array([grid.wind_generator.get(i) + grid.sun_generator.get(i)
+                               for i in range(start, self.N)])
+        air_flow, turbine = feed_forward_controls(grid.requirements, grid.powerplant, renewables, start)
+        return self._segment_means(air_flow, segments), self._segment_means(turbine, segments)
+
+    def _segment_means(self, values, segments):
+        padded = np.resize(values, segments * self.segment_steps)
+        padded[len(values):] = values[-1]
+        return padded.reshape(segments, self.segment_steps).mean(axis=1)
+
+    def simulate(self, start, air_flow, turbine_pct, fill_level):
+        """Run the candidates (rows of the segment arrays) from tick `start`; see `simulate_batch`."""
+        grid = self.energy_grid
+        plant = grid.powerplant
+        batch = BatchEnergyGrid(grid, len(fill_level))
+        n = self.N - start
+        air_steps = np.repeat(air_flow.T, self.segment_steps, axis=0)[:n]
+        turbine_steps = np.repeat(turbine_pct.T, self.segment_steps, axis=0)[:n]
+        return simulate_batch(batch, start, air_steps, turbine_steps, fill_level,
+                              plant.CaCO3_amount, plant.NaOH_amount)
+
+    def plan(self, start=0):
+        """Best schedule found within the time budget, from tick `start`."""
+        deadline = time.perf_counter() + self.time_budget
+        plant = self.energy_grid.powerplant
+        segments = -(-(self.N - start) // self.segment_steps)
+        air_mean, turbine_mean = self.initial_guess(start, segments)
+        fill_mean = np.array([plant.oven_amount_ok_min + 1.0])
+        mean = np.concatenate([air_mean, turbine_mean, fill_mean])
+        std = np.concatenate([np.full(2 * segments, 0.15), [2.0]])
+        low = np.concatenate([np.zeros(2 * segments), [0.0]])
+        high = np.concatenate([np.ones(2 * segments), [plant.oven_amount_max]])
+
+        best = mean
+        best_objective = -np.inf
+        for _ in range(self.iterations):
+            candidates = self.rng.normal(mean, std, (self.population, len(mean)))
+            candidates[0] = best  # keep the incumbent
+            candidates = np.clip(candidates, low, high)
+            objective = self.simulate(start, candidates[:, :segments], candidates[:, segments:-1],
+                                      candidates[:, -1])[0]
+            order = np.argsort(objective)[::-1]
+            if objective[order[0]] > best_objective:
+                best_objective = objective[order[0]]
+                best = candidates[order[0]]
+            elite = candidates[order[:self.elite]]
+            mean = 0.7 * elite.mean(axis=0) + 0.3 * mean
+            std = np.maximum(0.7 * elite.std(axis=0) + 0.3 * std, 0.01)
+            if time.perf_counter() > deadline:
+                break
+
+        best = best[None, :]
+        objective, electricity, heat, fills = self.simulate(start, best[:, :segments], best[:, segments:-1],
+                                                            best[:, -1])
+        n = self.N - start
+        return Schedule(
+            start=start,
+            air_flow=np.repeat(best[0, :segments], self.segment_steps)[:n],
+            turbine_pct=np.repeat(best[0, segments:-1], self.segment_steps)[:n],
+            fill=fills[:, 0],
+            electricity=electricity[:, 0],
+            heat=heat[:, 0],
+            score=float(np.clip(objective[0], 0.0, BAND_WEIGHT)),
+        )
+
+
+def _autopilot_process_main(conn, energy_grid, N, options):
+    """Entry point of the planner process; plans on the copy of the grid inherited from the simulator."""
+    try:
+        while True:
+            try:
+                msg = conn.recv()
+                # Requests made while the last plan was running are stale except the newest
+                while msg[0] == 'plan' and conn.poll():
+                    msg = conn.recv()
+            except (pickle.UnpicklingError, ValueError, AttributeError, IndexError) as e:
+                print("autopilot: dropped a message ({0!r})".format(e), file=sys.stderr)
+                continue
+            if msg[0] == 'stop':
+                break
+            _, token, scenario, snapshot, start = msg
+            energy_grid.set_scenario(scenario)
+            energy_grid.restore(snapshot)
+            schedule = Autopilot(energy_grid, N, **options).plan(start)
+            conn.send((token, schedule))
+    except (EOFError, OSError, KeyboardInterrupt):
+        pass
+    conn.close()
+
+
+class AutopilotProcess:
+    """
+    Planner running in its own process.
+
+    `request` sends the scenario and a snapshot of the plant (not the grid,
+    which the worker inherited when it was forked) and returns immediately;
+    `poll` returns the schedule for the latest request once it is ready.
+    Like `PlotProcess` it is forked, so it has to be started before the
+    simulator starts any threads, after the demand profiles have been added
+    to `energy_grid`.
+    """
+
+    def __init__(self, N, energy_grid, **options):
+        ctx = multiprocessing.get_context('fork')
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_autopilot_process_main, args=(child_conn, energy_grid, N, options),
+                                   daemon=True)
+        self.token = 0
+
+    def start(self):
+        self.process.start()
+
+    def request(self, energy_grid, start=0):
+        self.token += 1
+        try:
+            self.conn.send(('plan', self.token, energy_grid.scenario(), energy_grid.snapshot(), start))
+        except (BrokenPipeError, EOFError, OSError):
+            pass
+
+    def poll(self):
+        """Latest requested schedule if it has arrived, else None."""
+        schedule = None
+        try:
+            while self.conn.poll():
+                token, result = self.conn.recv()
+                if token == self.token:
+                    schedule = result
+        except (EOFError, OSError):
+            pass
+        return schedule
+
+    def stop(self, timeout=2.0):
+        try:
+            self.conn.send(('stop',))
+        except (BrokenPipeError, EOFError, OSError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
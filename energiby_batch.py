@@ -0,0 +1,165 @@
+"""
+Vectorized power plant and grid for Energiby YderZonen.
+
+`BatchEnergyGrid` steps many copies of the power plant at once: every piece
+of plant state is a NumPy array with one entry per copy, and one `step` call
+advances all copies by one 0.05 h tick with their own controls. The wind/sun
+scenario and the demand envelopes are shared with the `EnergyGrid` it was
+created from, unless each copy is given its own renewable production. The arithmetic follows `PowerPlant.calculate` operation by
+operation, so a copy driven with the same controls reproduces the scalar
+simulation.
+
+Used by the autopilot to search control schedules, by the multi-station
+exhibit to run every station's plant in one computation, and by anything else
+that needs to simulate many alternatives within a frame budget.
+"""
+
+import numpy as np
+
+
+class BatchEnergyGrid:
+    """
+    `size` independent copies of an `EnergyGrid`'s power plant.
+
+    `renewables` optionally gives every copy its own wind + sun production
+    (size x N array), for evaluating many scenarios at once or for copies
+    that play different games.
+    """
+
+    def __init__(self, energy_grid, size, renewables=None):
+        self.size = size
+        self.requirements = energy_grid.requirements
+        self.wind_generator = energy_grid.wind_generator
+        self.sun_generator = energy_grid.sun_generator
+        self.renewables = renewables
+        self._rows = np.arange(size)
+
+        # Plant constants
+        plant = energy_grid.powerplant
+        self.storage_amount_max = plant.storage_amount_max
+        self.oven_amount_max = plant.oven_amount_max
+        self.oven_amount_ok_min = plant.oven_amount_ok_min
+        self.oven_amount_ok_max = plant.oven_amount_ok_max
+        self.oven_amount_to_fill = plant.oven_amount_to_fill
+        self.oven_consumption_rate = plant.oven_consumption_rate
+        self.power_max = plant.power_max
+        self.alpha_up = plant.alpha_up
+        self.alpha_down = plant.alpha_down
+        self.alpha_empty = plant.alpha_empty
+        self.turbine_alpha = plant.turbine_pct_filter.alpha
+        self.acid_alpha = plant.acid_emission.alpha
+        self.CO_alpha = plant.CO_emission.alpha
+
+        self.load(plant.snapshot())
+
+    def load(self, state, rows=None):
+        """Set every copy, or the copies in `rows`, to a `PlantState` (see `PowerPlant.snapshot`)."""
+        if rows is not None:
+            for name in ('storage_amount', 'oven_amount', 'power', 'turbine', 'acid', 'CO'):
+                getattr(self, name)[rows] = float(getattr(state, name))
+            return
+        size = self.size
+        self.storage_amount = np.full(size, float(state.storage_amount))
+        self.oven_amount = np.full(size, float(state.oven_amount))
+        self.power = np.full(size, float(state.power))
+        self.turbine = np.full(size, float(state.turbine))
+        self.acid = np.full(size, float(state.acid))
+        self.CO = np.full(size, float(state.CO))
+
+    def fill_oven(self, mask):
+        """Vectorized `PowerPlant.fill_oven` for the copies where `mask` is set."""
+        space = self.oven_amount_max - self.oven_amount
+        room = mask & (space >= self.oven_amount_to_fill)
+        full_load = room & (self.storage_amount >= self.oven_amount_to_fill)
+        rest = room & ~full_load
+        self.oven_amount = np.where(full_load, self.oven_amount + self.oven_amount_to_fill,
+                                    np.where(rest, self.oven_amount + self.storage_amount, self.oven_amount))
+        self.storage_amount = np.where(full_load, self.storage_amount - self.oven_amount_to_fill,
+                                       np.where(rest, 0.0, self.storage_amount))
+
+    def step(self, index, air_flow, turbine_pct, CaCO3_amount=0.0, NaOH_amount=0.0, mask=None):
+        """
+        Advance all copies by one tick, like `EnergyGrid.calculate(index)`.
+
+        Controls are scalars or arrays of length `size`. With per-copy
+        `renewables`, `index` may also be an array (copies at different
+        ticks). Copies where `mask` is False keep their state. Returns the
+        total electricity and heat production (arrays of length `size`).
+        """
+        power_max = self.power_max
+        previous = (self.turbine, self.oven_amount, self.power, self.acid, self.CO)
+
+        # Turbine filter
+        self.turbine = turbine_pct * self.turbine_alpha + self.turbine * (1 - self.turbine_alpha)
+
+        # Oven and power (PowerPlant.calculate_power)
+        oven = self.oven_amount
+        oven_pct = oven / self.oven_amount_max
+        tmp_power = air_flow * oven_pct * power_max
+        oven_factor = 0.8 + 0.3 * oven / self.oven_amount_max
+        consumption = (0.3 + 0.7 * tmp_power / power_max) * oven_factor * self.oven_consumption_rate
+        overfull = oven > self.oven_amount_ok_max + 0.5
+        consumption = np.where(overfull, consumption * (1 + (oven - self.oven_amount_ok_max)), consumption)
+        underfull = ~overfull & (oven < self.oven_amount_ok_min - 0.5)
+        bio_factor = np.where(underfull, np.maximum(1 - 0.02 * (self.oven_amount_ok_min - oven), 0.0), 1.0)
+        oven = np.maximum(oven - consumption, 0.0)
+        self.oven_amount = oven
+
+        power = self.power
+        tmp_power = tmp_power * bio_factor
+        rising = tmp_power * self.alpha_up + power * (1 - self.alpha_up)
+        falling = tmp_power * self.alpha_down + power * (1 - self.alpha_down)
+        power = np.where(tmp_power > power, rising, np.where(tmp_power < power, falling, power))
+        empty = 0.0 * self.alpha_empty + self.power * (1 - self.alpha_empty)
+        power = np.where(oven == 0.0, empty, power)
+        self.power = power
+
+        # Emissions
+        power_pct = power / power_max
+        self.acid = (power_pct * (1 - CaCO3_amount) * 0.6) * self.acid_alpha + self.acid * (1 - self.acid_alpha)
+        self.CO = (power_pct * (1 - NaOH_amount) * 0.4) * self.CO_alpha + self.CO * (1 - self.CO_alpha)
+
+        if mask is not None:
+            # Copies outside the mask keep their state
+            turbine, oven, power, acid, CO = previous
+            self.turbine = np.where(mask, self.turbine, turbine)
+            self.oven_amount = np.where(mask, self.oven_amount, oven)
+            self.power = power = np.where(mask, self.power, power)
+            self.acid = np.where(mask, self.acid, acid)
+            self.CO = np.where(mask, self.CO, CO)
+
+        if self.renewables is None:
+            renewables = self.wind_generator.get(index) + self.sun_generator.get(index)
+        elif np.ndim(index):
+            renewables = self.renewables[self._rows, index]
+        else:
+            renewables = self.renewables[:, index]
+        electricity = renewables + power * self.turbine
+        heat = power * (1 - self.turbine)
+        return electricity, heat
+
+
+class PlantView:
+    """
+    One copy of a `BatchEnergyGrid` behind the `PowerPlant` getters that
+    `EnvelopeScore` and the OSC outputs read.
+    """
+
+    def __init__(self, batch, row):
+        self.batch = batch
+        self.row = row
+
+    def get_total_power(self):
+        return self.batch.power[self.row]
+
+    def get_electricity_pct(self):
+        return self.batch.turbine[self.row]
+
+    def get_electric_power(self):
+        return self.batch.power[self.row] * self.batch.turbine[self.row]
+
+    def get_acid_emission(self):
+        return self.batch.acid[self.row]
+
+    def get_CO_emission(self):
+        return self.batch.CO[self.row]
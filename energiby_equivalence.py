@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Differential check of the simulation engines against the frozen reference.
+
+    python energiby_equivalence.py --count 2000 --tolerance 0
+
+Every scenario is a seed. The seed draws the wind/sun scenario (the global
+`np.random` state is seeded with it before each reset, since the reference
+reset does not take a seed) and a random control stream: piecewise-constant
+air flow, turbine, CaCO3 and NaOH settings, oven fills, and wind and sun
+switched off and on. The stream is played through energiby_reference and
+through each engine under test:
+
+    model  the scalar classes in energiby_model
+    batch  BatchEnergyGrid, with every scenario of a chunk in one batch
+
+The traces are compared tick by tick. The report gives the maximum absolute
+deviation per trace and the seed where it occurred. With --tolerance, the
+exit status says whether every engine stayed within it. Chunks of seeds run
+in parallel on all cores.
+"""
+
+import argparse
+import multiprocessing
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+import energiby_reference as reference
+from energiby_model import EnergyGrid, N
+from energiby_batch import BatchEnergyGrid
+
+
+ENGINES = ("model", "batch")
+
+# Per-tick traces compared for every engine
+TRACES = ("electricity", "heat", "power", "turbine", "oven_amount", "storage_amount", "acid", "CO")
+
+Controls = namedtuple("Controls", "air_flow turbine_pct CaCO3 NaOH fill wind_active sun_active")
+
+
+def control_stream(seed, steps=N):
+    """Random controls for one scenario, reproducible from its seed."""
+    rng = np.random.default_rng([seed, 1])
+
+    def piecewise(mean_hold):
+        changes = rng.random(steps) < 1.0 / mean_hold
+        changes[0] = True
+        return rng.random(changes.sum())[np.cumsum(changes) - 1]
+
+    def switch(p_toggle):
+        return np.cumsum(rng.random(steps) < p_toggle) % 2 == 0
+
+    return Controls(piecewise(40), piecewise(40), piecewise(80), piecewise(80),
+                    rng.random(steps) < 0.01, switch(0.003), switch(0.003))
+
+
+def reset_scenario(grid, seed):
+    """Draw the wind/sun scenario of a seed on a reference or model `EnergyGrid`."""
+    np.random.seed(seed)
+    # The wind phase of a fresh grid; the model restarts it with every vector, the reference carries it over
+    grid.wind_generator.n = 0
+    if isinstance(grid, reference.EnergyGrid):
+        grid.reset()
+    else:
+        grid.reset(seed=seed)
+
+
+def run_scalar(grid, seed, controls):
+    """Play a control stream through an `EnergyGrid` (reference or model); traces x N."""
+    reset_scenario(grid, seed)
+    plant = grid.powerplant
+    wind, sun = grid.wind_generator, grid.sun_generator
+    air_flow, turbine_pct = controls.air_flow.tolist(), controls.turbine_pct.tolist()
+    CaCO3, NaOH = controls.CaCO3.tolist(), controls.NaOH.tolist()
+    fill, wind_active, sun_active = controls.fill.tolist(), controls.wind_active.tolist(), controls.sun_active.tolist()
+    traces = np.empty((len(TRACES), N))
+    for i in range(N):
+        wind.activate(wind_active[i])
+        sun.activate(sun_active[i])
+        if fill[i]:
+            plant.fill_oven()
+        plant.set_air_flow(air_flow[i])
+        plant.set_turbine_pct(turbine_pct[i])
+        plant.set_CaCO3_amount(CaCO3[i])
+        plant.set_NaOH_amount(NaOH[i])
+        grid.calculate(i)
+        traces[:, i] = (grid.get_total_electricity(i), grid.get_total_heat(i), plant.get_total_power(),
+                        plant.get_electricity_pct(), plant.oven_amount, plant.storage_amount,
+                        plant.get_acid_emission(), plant.get_CO_emission())
+    return traces
+
+
+def run_batch(grid, wind, sun, controls):
+    """Play a chunk of control streams through one `BatchEnergyGrid`; scenarios x traces x N."""
+    wind_active = np.array([c.wind_active for c in controls])
+    sun_active = np.array([c.sun_active for c in controls])
+    renewables = wind * wind_active + sun * sun_active
+    batch = BatchEnergyGrid(grid, len(controls), renewables=renewables)
+    grid.powerplant.reset()
+    batch.load(grid.powerplant.snapshot())
+    air_flow, turbine_pct, CaCO3, NaOH, fill = (np.array([getattr(c, name) for c in controls])
+                                                for name in ("air_flow", "turbine_pct", "CaCO3", "NaOH", "fill"))
+    traces = np.empty((len(controls), len(TRACES), N))
+    for i in range(N):
+        batch.fill_oven(fill[:, i])
+        electricity, heat = batch.step(i, air_flow[:, i], turbine_pct[:, i], CaCO3[:, i], NaOH[:, i])
+        for t, values in enumerate((electricity, heat, batch.power, batch.turbine, batch.oven_amount,
+                                    batch.storage_amount, batch.acid, batch.CO)):
+            traces[:, t, i] = values
+    return traces
+
+
+_grids = None
+
+
+def _init_worker():
+    global _grids
+    _grids = {"reference": reference.EnergyGrid(), "model": EnergyGrid()}
+
+
+def _worst(deviations, name, values, seed):
+    """Keep the largest deviation per trace and the seed it came from."""
+    value = float(np.max(values)) if np.size(values) else 0.0
+    if name not in deviations or value > deviations[name][0]:
+        deviations[name] = (value, seed)
+
+
+def _check_chunk(args):
+    seeds, engines = args
+    ref_grid, model_grid = _grids["reference"], _grids["model"]
+    deviations = {engine: {} for engine in engines}
+    controls = [control_stream(seed) for seed in seeds]
+    ref_traces, ref_wind, ref_sun = [], [], []
+    for seed, stream in zip(seeds, controls):
+        ref_traces.append(run_scalar(ref_grid, seed, stream))
+        ref_wind.append(ref_grid.wind_generator.vector.copy())
+        ref_sun.append(ref_grid.sun_generator.vector.copy())
+
+    if "model" in engines:
+        found = deviations["model"]
+        for carrier in ("electricity", "heat"):
+            ref_req, req = getattr(ref_grid.requirements, carrier), getattr(model_grid.requirements, carrier)
+            for vector in ("need_vector", "need_min_vector", "need_max_vector"):
+                _worst(found, "demand", np.abs(getattr(req, vector) - getattr(ref_req, vector)), None)
+        for k, (seed, stream) in enumerate(zip(seeds, controls)):
+            traces = run_scalar(model_grid, seed, stream)
+            _worst(found, "wind", np.abs(model_grid.wind_generator.vector - ref_wind[k]), seed)
+            _worst(found, "sun", np.abs(model_grid.sun_generator.vector - ref_sun[k]), seed)
+            for t, name in enumerate(TRACES):
+                _worst(found, name, np.abs(traces[t] - ref_traces[k][t]), seed)
+
+    if "batch" in engines:
+        found = deviations["batch"]
+        traces = run_batch(model_grid, np.array(ref_wind), np.array(ref_sun), controls)
+        for k, seed in enumerate(seeds):
+            for t, name in enumerate(TRACES):
+                _worst(found, name, np.abs(traces[k, t] - ref_traces[k][t]), seed)
+    return deviations
+
+
+def check(count, seed=0, engines=ENGINES, processes=None, chunk=32):
+    """Maximum deviation per engine and trace: {engine: {trace: (deviation, seed)}}."""
+    seeds = [int(s) for s in np.random.SeedSequence(seed).generate_state(count)]
+    chunks = [(seeds[i:i + chunk], tuple(engines)) for i in range(0, count, chunk)]
+    deviations = {engine: {} for engine in engines}
+    with multiprocessing.Pool(processes, initializer=_init_worker) as pool:
+        for result in pool.imap_unordered(_check_chunk, chunks):
+            for engine, found in result.items():
+                for name, (value, where) in found.items():
+                    if name not in deviations[engine] or value > deviations[engine][name][0]:
+                        deviations[engine][name] = (value, where)
+    return deviations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the simulation engines with the frozen reference")
+    parser.add_argument("--count", type=int, default=1000, help="Scenarios to run")
+    parser.add_argument("--seed", type=int, default=0, help="Master seed")
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES))
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--chunk", type=int, default=32, help="Scenarios per task (and per batch)")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help="Fail if any deviation is larger (0 demands bitwise equality)")
+    args = parser.parse_args()
+
+    deviations = check(args.count, args.seed, args.engines, args.processes, args.chunk)
+    failed = False
+    print("Maximum deviation from the reference over {0} scenarios".format(args.count))
+    for engine in args.engines:
+        print("  {0}".format(engine))
+        for name, (value, where) in sorted(deviations[engine].items()):
+            bad = args.tolerance is not None and value > args.tolerance
+            failed |= bad
+            print("    {0:<15} {1:12.3e}{2}{3}".format(name, value, "  (seed {0})".format(where) if value and where is not None else "",
+                                                      "  FAIL" if bad else ""))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
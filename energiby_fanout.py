@@ -0,0 +1,188 @@
+"""
+OSC state fan-out to any number of subscribers.
+
+The Teensy, control tablets and extra displays all want the plant state.
+`StateFanout.publish` encodes each OSC message of a snapshot once per tick
+and sends the same bytes to every subscriber that wants it, so another
+screen costs a `sendto` per datagram, not another round of serialization.
+
+Subscribers choose:
+
+    patterns  OSC-style address patterns (`*`, `?`, `[...]`), default everything
+    rate      updates per second (at most one per published snapshot)
+    bundle    all messages of a tick in one OSC bundle (one datagram)
+
+Clients subscribe over OSC (see `energiby_yderzonen.startOsc`):
+
+    /Subscribe        port [rate] [pattern ...]
+    /SubscribeBundled port [rate] [pattern ...]
+    /Unsubscribe      port
+
+New subscribers get a burst with the latest value of every address they
+match. Subscriptions made over OSC expire after `ttl` seconds unless renewed;
+the Teensy and other configured outputs are permanent.
+"""
+
+import numbers
+import socket
+import struct
+import time
+from fnmatch import fnmatchcase
+from threading import Lock
+
+
+BROADCAST_PORT = 7255  # The Teensy firmware's broadcast port
+
+_FLOAT = struct.Struct('>f')
+_INT = struct.Struct('>i')
+_INT64 = struct.Struct('>q')
+_BUNDLE_HEADER = b"#bundle\0" + struct.pack('>Q', 1)  # time tag "immediately"
+_SIZE = struct.Struct('>i')
+
+
+def _osc_string(text):
+    data = text.encode()
+    return data + b"\0" * (4 - len(data) % 4)
+
+
+def encode_message(address, value):
+    """OSC message bytes; single numbers take a cached fast path with the tag python-osc would use."""
+    if isinstance(value, bool):
+        return _prefix(address, ",T" if value else ",F")
+    if isinstance(value, numbers.Integral):
+        if -2**31 <= value < 2**31:
+            return _prefix(address, ",i") + _INT.pack(value)
+        return _prefix(address, ",h") + _INT64.pack(value)
+    if isinstance(value, numbers.Real):
+        return _prefix(address, ",f") + _FLOAT.pack(value)
+    # python-osc is only needed here, so importing this module does not pull it in
+    from pythonosc.osc_message_builder import OscMessageBuilder
+    builder = OscMessageBuilder(address)
+    for arg in value if isinstance(value, (list, tuple)) else [value]:
+        builder.add_arg(arg)
+    return builder.build().dgram
+
+
+_prefixes = {}
+
+
+def _prefix(address, tags):
+    prefix = _prefixes.get((address, tags))
+    if prefix is None:
+        prefix = _prefixes[address, tags] = _osc_string(address) + _osc_string(tags)
+    return prefix
+
+
+def encode_bundle(messages):
+    return _BUNDLE_HEADER + b"".join(_SIZE.pack(len(m)) + m for m in messages)
+
+
+class Subscriber:
+    """One output target and what it wants."""
+
+    def __init__(self, target, patterns=("*",), rate=None, bundle=False, expires=None):
+        self.target = target
+        self.patterns = tuple(patterns) or ("*",)
+        self.interval = 1.0 / rate if rate else 0.0
+        self.bundle = bundle
+        self.expires = expires
+        self.last_sent = 0.0
+        self.burst = True
+        self.key = (self.patterns, bundle)
+
+    def wants(self, address):
+        return any(fnmatchcase(address, pattern) for pattern in self.patterns)
+
+
+class StateFanout:
+    """Registry of OSC subscribers; encodes once per tick and sends to all of them."""
+
+    def __init__(self, ttl=120.0):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        self.ttl = ttl
+        self.lock = Lock()
+        self.subscribers = {}
+        self.latest = {}        # address -> newest encoded message (insertion ordered)
+        self._selections = {}   # (patterns, address tuple) -> selected addresses
+
+    def add(self, ip, port, patterns=("*",), rate=None, bundle=False, permanent=False):
+        """Add or renew a subscriber; the next snapshot (or this call) brings it up to date."""
+        target = (ip, int(port))
+        expires = None if permanent else time.monotonic() + self.ttl
+        with self.lock:
+            existing = self.subscribers.get(target)
+            subscriber = Subscriber(target, patterns, rate, bundle, expires)
+            if existing is not None and existing.key == subscriber.key:
+                # A renewal only extends the subscription
+                if existing.expires is not None:
+                    existing.expires = expires
+                existing.interval = subscriber.interval
+                return existing
+            self.subscribers[target] = subscriber
+            if self.latest:
+                self._send(subscriber, self._datagrams(subscriber, self.latest, {}))
+                subscriber.burst = False
+        return subscriber
+
+    def remove(self, ip, port):
+        with self.lock:
+            self.subscribers.pop((ip, int(port)), None)
+
+    def _select(self, subscriber, messages):
+        key = (subscriber.patterns, tuple(messages))
+        addresses = self._selections.get(key)
+        if addresses is None:
+            if len(self._selections) > 256:
+                self._selections.clear()
+            addresses = self._selections[key] = [a for a in messages if subscriber.wants(a)]
+        return addresses
+
+    def _datagrams(self, subscriber, messages, cache):
+        """Datagrams for a subscriber, shared by all subscribers with the same filter and format."""
+        datagrams = cache.get(subscriber.key)
+        if datagrams is None:
+            selected = [messages[a] for a in self._select(subscriber, messages)]
+            if subscriber.bundle and selected:
+                selected = [encode_bundle(selected)]
+            datagrams = cache[subscriber.key] = selected
+        return datagrams
+
+    def _send(self, subscriber, datagrams):
+        try:
+            for datagram in datagrams:
+                self.sock.sendto(datagram, subscriber.target)
+        except OSError:
+            pass  # an unreachable subscriber must not stop the others
+
+    def publish(self, values):
+        """Send a snapshot, an iterable of (address, value), to every subscriber that is due."""
+        messages = {address: encode_message(address, value) for address, value in values}
+        now = time.monotonic()
+        with self.lock:
+            self.latest.update(messages)
+            per_tick, bursts = {}, {}
+            for target, subscriber in list(self.subscribers.items()):
+                if subscriber.expires is not None and now > subscriber.expires:
+                    del self.subscribers[target]
+                    continue
+                if subscriber.burst:
+                    self._send(subscriber, self._datagrams(subscriber, self.latest, bursts))
+                    subscriber.burst = False
+                elif now - subscriber.last_sent >= subscriber.interval:
+                    self._send(subscriber, self._datagrams(subscriber, messages, per_tick))
+                else:
+                    continue
+                subscriber.last_sent = now
+
+    def send(self, address, value):
+        """A one-off message (e.g. the run summary) to every subscriber that matches, regardless of rate."""
+        message = encode_message(address, value)
+        with self.lock:
+            self.latest[address] = message
+            for subscriber in self.subscribers.values():
+                if subscriber.wants(address):
+                    self._send(subscriber, [encode_bundle([message])] if subscriber.bundle else [message])
+
+    def close(self):
+        self.sock.close()
@@ -0,0 +1,152 @@
+"""
+Live production forecast for Energiby YderZonen.
+
+While a run is live, `Forecaster` takes a snapshot of the grid after the
+current tick and simulates the next `horizon_steps` ticks in one batched pass
+(`BatchEnergyGrid`): branch 0 keeps the current controls, the other branches
+form a fan of alternative air-flow/turbine settings around them. The plots
+show the forecast as a faint line and the fan as fainter ones, so visitors
+see where the current settings lead and which way the knobs push it.
+
+`ForecastProcess` runs the forecaster in a forked worker, on the copy of the
+grid it inherited. The simulator sends the scenario (wind and sun vectors and
+the demand profile names) once per run and then only a small `GridSnapshot`
+per tick; requests that pile up while the worker is busy are coalesced.
+"""
+
+import itertools
+import multiprocessing
+import pickle
+import sys
+from collections import namedtuple
+from threading import Lock
+
+import numpy as np
+
+from energiby_batch import BatchEnergyGrid
+
+
+# Forecast from tick `start`; fan_* rows are the alternative settings
+Forecast = namedtuple("Forecast", "start electricity heat fan_electricity fan_heat")
+
+
+class Forecaster:
+    """Batched what-if simulation of the next few hours from a grid snapshot."""
+
+    def __init__(self, energy_grid, N, horizon_steps=80,
+                 air_offsets=(-0.2, 0.0, 0.2), turbine_offsets=(-0.2, 0.0, 0.2)):
+        self.energy_grid = energy_grid
+        self.N = N
+        self.horizon_steps = horizon_steps
+        offsets = [(0.0, 0.0)] + [o for o in itertools.product(air_offsets, turbine_offsets) if o != (0.0, 0.0)]
+        self.air_offsets = np.array([o[0] for o in offsets])
+        self.turbine_offsets = np.array([o[1] for o in offsets])
+        self.batch = BatchEnergyGrid(energy_grid, len(offsets))
+
+    def forecast(self, start, snapshot):
+        """Forecast from tick `start`, with the plant in `snapshot` (a `GridSnapshot`)."""
+        grid = self.energy_grid
+        grid.restore(snapshot)
+        plant = snapshot.plant
+        batch = self.batch
+        batch.load(plant)
+        air_flow = np.clip(plant.air_flow + self.air_offsets, 0.0, 1.0)
+        turbine_pct = np.clip(plant.turbine_pct + self.turbine_offsets, 0.0, 1.0)
+        n = min(self.horizon_steps, self.N - start)
+        electricity = np.empty((len(air_flow), max(n, 0)))
+        heat = np.empty_like(electricity)
+        for k in range(n):
+            electricity[:, k], heat[:, k] = batch.step(start + k, air_flow, turbine_pct,
+                                                       plant.CaCO3_amount, plant.NaOH_amount)
+        return Forecast(start, electricity[0], heat[0], electricity[1:], heat[1:])
+
+
+def _forecast_process_main(conn, energy_grid, N, options):
+    """Entry point of the forecast process; `energy_grid` is the copy inherited from the simulator."""
+    forecaster = None
+    try:
+        while True:
+            try:
+                msg = conn.recv()
+                # Only the newest forecast request matters
+                while msg[0] == 'forecast' and conn.poll():
+                    msg = conn.recv()
+            except (pickle.UnpicklingError, ValueError, AttributeError, IndexError) as e:
+                # A damaged message is dropped; the next request brings the forecaster up to date
+                print("forecast: dropped a message ({0!r})".format(e), file=sys.stderr)
+                continue
+            kind = msg[0]
+            if kind == 'stop':
+                break
+            elif kind == 'scenario':
+                energy_grid.set_scenario(msg[1])
+                if forecaster is None:
+                    forecaster = Forecaster(energy_grid, N, **options)
+            elif kind == 'forecast' and forecaster is not None:
+                _, token, start, snapshot = msg
+                conn.send((token, forecaster.forecast(start, snapshot)))
+    except (EOFError, OSError, KeyboardInterrupt):
+        pass
+    conn.close()
+
+
+class ForecastProcess:
+    """
+    Forecaster running in its own process.
+
+    Call `set_scenario` with the grid when a new scenario starts, `request`
+    once per tick and `poll` to pick up the newest finished forecast. Forked
+    like `PlotProcess`, so it has to be started before any threads, after
+    the demand profiles have been added to `energy_grid`. The methods may be
+    called from different threads.
+    """
+
+    def __init__(self, N, energy_grid, **options):
+        ctx = multiprocessing.get_context('fork')
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_forecast_process_main, args=(child_conn, energy_grid, N, options),
+                                   daemon=True)
+        # Large messages are written in two parts; keep senders on other threads from interleaving
+        self.lock = Lock()
+        self.token = 0
+        self.scenario = 0
+
+    def start(self):
+        self.process.start()
+
+    def _send(self, msg):
+        try:
+            with self.lock:
+                self.conn.send(msg)
+        except (BrokenPipeError, EOFError, OSError):
+            pass
+
+    def set_scenario(self, energy_grid):
+        """Send the scenario: the wind and sun vectors and the active demand profiles, not the whole grid."""
+        # Forecasts for the previous scenario are dropped by poll()
+        self.scenario = self.token + 1
+        self._send(('scenario', energy_grid.scenario()))
+
+    def request(self, start, snapshot):
+        with self.lock:
+            self.token += 1
+            token = self.token
+        self._send(('forecast', token, start, snapshot))
+
+    def poll(self):
+        """Newest forecast that has arrived since the last call, or None."""
+        forecast = None
+        try:
+            while self.conn.poll():
+                token, result = self.conn.recv()
+                if token >= self.scenario:
+                    forecast = result
+        except (EOFError, OSError):
+            pass
+        return forecast
+
+    def stop(self, timeout=2.0):
+        self._send(('stop',))
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
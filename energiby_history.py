@@ -0,0 +1,270 @@
+"""
+Run history store for Energiby YderZonen.
+
+Every completed run is persisted with its per-tick traces (production,
+generators, control inputs), where its scenario came from (the seed, the
+scenario bank entry or the measured weather window) and its score. Run metadata goes into a
+SQLite database; the traces go into one columnar `.npz` file per run next to
+it. All disk I/O happens on a writer thread that batches the queued runs into
+one transaction, so the simulation loop only pays for an in-memory copy.
+
+`RunHistory.load_traces` stacks many runs' traces into 2-D NumPy arrays
+(runs x steps) for season-long analysis. `RecentRuns` keeps the last few
+runs and the day's best in memory for the overlay behind the live plots.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import time
+from collections import deque
+from threading import Thread
+
+import numpy as np
+
+import energiby_log as log
+
+
+DATA_DIR = os.path.join(os.environ.get('XDG_DATA_HOME', os.path.expanduser('~/.local/share')), 'energiby')
+HISTORY_DIR = os.path.join(DATA_DIR, 'history')
+
+# Per-tick columns recorded for each run
+TRACE_FIELDS = (
+    't',
+    'electricity',          # total electricity production [MW]
+    'heat',                 # total heat production [MW]
+    'wind',                 # [MW]
+    'sun',                  # [MW]
+    'plant_power',          # [MW]
+    'acid_emission',
+    'CO_emission',
+    'oven_amount',
+    'storage_amount',
+    # Control inputs
+    'air_flow',
+    'turbine_pct',
+    'CaCO3_amount',
+    'NaOH_amount',
+    'fills',                # number of oven fills up to this tick
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    finished REAL NOT NULL,
+    seed INTEGER,
+    steps INTEGER NOT NULL,
+    score REAL,
+    summary TEXT,
+    traces TEXT NOT NULL,
+    source TEXT
+)
+"""
+
+
+class RunRecorder:
+    """Preallocated per-tick trace buffers for the run in progress."""
+
+    def __init__(self, N):
+        self.N = N
+        self.traces = np.zeros((len(TRACE_FIELDS), N))
+        self.columns = {name: row for name, row in zip(TRACE_FIELDS, self.traces)}
+        self.reset()
+
+    def reset(self, seed=None, source=None):
+        """Start a run; `seed` replays its scenario if not None, `source` says where the scenario came from."""
+        self.steps = 0
+        self.fills = 0
+        self.seed = seed
+        self.source = source
+
+    def record(self, index, **values):
+        """Store one tick; missing fields keep their previous contents."""
+        if index >= self.N:
+            return
+        columns = self.columns
+        for name, value in values.items():
+            columns[name][index] = value
+        columns['fills'][index] = self.fills
+        self.steps = index + 1
+
+    def snapshot(self):
+        """Copy of the recorded traces, as a dict of 1-D arrays."""
+        return {name: self.columns[name][:self.steps].copy() for name in TRACE_FIELDS}
+
+
+class RunHistory:
+    """
+    SQLite + .npz store of completed runs, written by a background thread.
+
+    `submit` only enqueues; the writer thread owns the database connection
+    and commits whatever has accumulated in the queue as one batch. Queries
+    open their own read connection.
+    """
+
+    def __init__(self, path=HISTORY_DIR, batch_interval=1.0):
+        self.path = path
+        self.db_path = os.path.join(path, 'runs.sqlite')
+        self.batch_interval = batch_interval
+        os.makedirs(path, exist_ok=True)
+        with sqlite3.connect(self.db_path) as db:
+            db.execute(_SCHEMA)
+            # Databases from before the scenario source was recorded
+            if 'source' not in [row[1] for row in db.execute("PRAGMA table_info(runs)")]:
+                db.execute("ALTER TABLE runs ADD COLUMN source TEXT")
+        self.queue = queue.Queue()
+        self.thread = Thread(target=self._writer, name="RunHistoryWriter", daemon=True)
+        self.thread.start()
+
+    # -------------------------------------------------------------- writing
+    def submit(self, traces, seed=None, summary=None, source=None):
+        """Queue a completed run; never blocks on disk."""
+        self.queue.put((time.time(), seed, traces, summary, source))
+
+    def close(self, timeout=5.0):
+        """Flush the queued runs and stop the writer thread."""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout)
+
+    def _writer(self):
+        db = sqlite3.connect(self.db_path)
+        try:
+            running = True
+            while running:
+                batch = [self.queue.get()]
+                # Collect whatever else arrives within the batch interval
+                deadline = time.monotonic() + self.batch_interval
+                while batch[-1] is not None:
+                    try:
+                        batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                    except queue.Empty:
+                        break
+                if batch[-1] is None:
+                    batch.pop()
+                    running = False
+                if batch:
+                    self._write_batch(db, batch)
+        finally:
+            db.close()
+
+    def _write_batch(self, db, batch):
+        rows = []
+        for finished, seed, traces, summary, source in batch:
+            name = "run_{0}_{1}.npz".format(time.strftime('%Y%m%d_%H%M%S', time.localtime(finished)),
+                                             int((finished % 1) * 1e6))
+            try:
+                np.savez(os.path.join(self.path, name), **traces)
+            except OSError as e:
+                log.warning("run_history_traces_not_written", error=e)
+                continue
+            steps = len(next(iter(traces.values()))) if traces else 0
+            score = summary.get('score') if summary else None
+            rows.append((finished, seed, steps, score, json.dumps(summary) if summary else None, name,
+                         json.dumps(source) if source else None))
+        try:
+            with db:
+                db.executemany(
+                    "INSERT INTO runs (finished, seed, steps, score, summary, traces, source)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        except sqlite3.Error as e:
+            log.warning("run_history_runs_not_stored", error=e)
+
+    # ------------------------------------------------------------- querying
+    def runs(self, since=None, until=None, min_steps=0):
+        """Metadata of the stored runs, oldest first, as a list of dicts."""
+        query = "SELECT id, finished, seed, steps, score, summary, traces, source FROM runs WHERE steps >= ?"
+        params = [min_steps]
+        if since is not None:
+            query += " AND finished >= ?"
+            params.append(since)
+        if until is not None:
+            query += " AND finished < ?"
+            params.append(until)
+        query += " ORDER BY finished"
+        with sqlite3.connect(self.db_path) as db:
+            rows = db.execute(query, params).fetchall()
+        return [
+            {'id': id_, 'finished': finished, 'seed': seed, 'steps': steps, 'score': score,
+             'summary': json.loads(summary) if summary else None, 'traces': traces,
+             'source': json.loads(source) if source else None}
+            for id_, finished, seed, steps, score, summary, traces, source in rows
+        ]
+
+    def load_traces(self, runs=None, fields=TRACE_FIELDS, steps=None):
+        """
+        Stack the traces of `runs` (default: all) into {field: runs x steps}.
+
+        Shorter runs are padded with NaN up to `steps` (default: the longest
+        run). Returns the run metadata alongside the arrays.
+        """
+        if runs is None:
+            runs = self.runs()
+        if steps is None:
+            steps = max((run['steps'] for run in runs), default=0)
+        stacked = {field: np.full((len(runs), steps), np.nan) for field in fields}
+        for row, run in enumerate(runs):
+            with np.load(os.path.join(self.path, run['traces'])) as data:
+                for field in fields:
+                    if field in data:
+                        values = data[field][:steps]
+                        stacked[field][row, :len(values)] = values
+        return stacked, runs
+
+
+class RecentRuns:
+    """
+    The last `count` completed runs and the best run of the day, for the plots.
+
+    Only the fields drawn (`t` and the production traces) are kept. `load`
+    seeds it from today's runs in a `RunHistory`, so a restart keeps them.
+    """
+
+    def __init__(self, count=3, fields=('t', 'electricity', 'heat')):
+        self.fields = fields
+        self.recent = deque(maxlen=count)
+        self.best = None    # (score, traces)
+        self.day = None
+
+    def add(self, traces, score=None, finished=None):
+        """Add a completed run (a `RunRecorder.snapshot()`)."""
+        traces = {field: traces[field] for field in self.fields}
+        self.recent.append(traces)
+        self._offer_best(traces, score, finished)
+
+    def _offer_best(self, traces, score, finished):
+        day = time.localtime(finished)[:3]
+        if day != self.day:
+            self.day, self.best = day, None
+        if score is not None and (self.best is None or score > self.best[0]):
+            self.best = (score, traces)
+
+    def load(self, history):
+        """Seed with the stored runs of today."""
+        midnight = time.mktime(time.localtime()[:3] + (0, 0, 0, 0, 0, -1))
+        try:
+            runs = history.runs(since=midnight, min_steps=2)
+        except sqlite3.Error as e:
+            log.warning("recent_runs_not_loaded", error=e)
+            return
+        scored = [run for run in runs if run['score'] is not None]
+        best = max(scored, key=lambda run: run['score'], default=None)
+        keep = runs[len(runs) - self.recent.maxlen:] if self.recent.maxlen else []
+        for run in keep + ([best] if best is not None and best not in keep else []):
+            try:
+                with np.load(os.path.join(history.path, run['traces'])) as data:
+                    traces = {field: data[field] for field in self.fields}
+            except (OSError, KeyError, ValueError) as e:
+                log.warning("recent_run_not_loaded", run=run['id'], error=e)
+                continue
+            if run in keep:
+                self.add(traces, run['score'], run['finished'])
+            else:
+                self._offer_best(traces, run['score'], run['finished'])
+
+    def lines(self, field):
+        """([(t, values), ...] of the recent runs, oldest first; (t, values) of the best run or None)."""
+        recent = [(traces['t'], traces[field]) for traces in self.recent]
+        best = (self.best[1]['t'], self.best[1][field]) if self.best is not None else None
+        return recent, best
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for the exhibition hardware and an OSC load test.
+
+    python energiby_loadtest.py teensy                      # what the Teensy would get
+    python energiby_loadtest.py surface --profile worst --rate 500
+    python energiby_loadtest.py run --duration 20 -- --fast-osc
+
+`FakeTeensy` listens where the simulator sends the plant state (7134) and
+decodes the `sendElData` messages. `FakeSurface` plays fader sweeps into the
+simulator's control port (7133) like the TouchOSC surface: `realistic` moves
+one fader at a time in human-speed sweeps, `worst` slams every fader end to
+end on every message.
+
+`run` starts the simulator (arguments after `--` are passed on) or attaches
+to a running one, measures its CPU while a game runs without input, then
+plays a surface profile and reports the control-to-output latency
+percentiles, lost controls and the CPU cost per message. Every fader value
+sent is unique, so the first time the fake Teensy sees it echoed back gives
+its latency. Everything runs on loopback; the simulator itself still needs a
+display (e.g. xvfb-run in CI).
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from threading import Event, Thread
+
+import numpy as np
+import psutil
+from pythonosc import udp_client
+from pythonosc.osc_message import OscMessage, ParseError
+
+from energiby_osc import decode_message
+
+
+# Messages sendElData sends to the Teensy each output tick, in order
+TEENSY_ADDRESSES = (
+    "/OvenAmount", "/WasteStorage", "/OvenPower", "/WindPower", "/SunPower", "/Acid", "/CO",
+    "/ElectricityPct", "/HeatPct", "/PlantElectricPower", "/OvenTemp", "/CaCO3", "/NaOH",
+    "/TurbinePct", "/OvenAirFlow", "/Score", "/InBand",
+)
+
+# Surface faders whose value the simulator echoes back to the Teensy
+FADERS = ("/OvenAirFlow", "/TurbinePct", "/CaCO3", "/NaOH")
+
+SIMULATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "energiby_yderzonen.py")
+
+
+class FakeTeensy:
+    """Receives and decodes the simulator's Teensy traffic on a background thread."""
+
+    def __init__(self, ip="127.0.0.1", port=7134):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.sock.bind((ip, port))
+        self.sock.settimeout(0.2)
+        self.values = {}
+        self.counts = Counter()
+        self.frames = 0
+        self.incomplete_frames = 0
+        self.listeners = []  # called as listener(address, args, receive_time)
+        self._frame = set()
+        self._stop = Event()
+        self.thread = Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.thread.join()
+        # A frame cut off by stopping is not an incomplete frame
+        if self._frame.issuperset(TEENSY_ADDRESSES):
+            self._close_frame()
+        self.sock.close()
+
+    def _close_frame(self):
+        if self._frame:
+            self.frames += 1
+            if not self._frame.issuperset(TEENSY_ADDRESSES):
+                self.incomplete_frames += 1
+            self._frame = set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                data = self.sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.handle(data, time.perf_counter())
+
+    def handle(self, data, now):
+        message = decode_message(data)
+        if message is not None:
+            address, params = message[0].decode(), message[1]
+        else:
+            # /RunSummary and anything unusual go through python-osc
+            try:
+                message = OscMessage(data)
+            except ParseError:
+                self.counts["<malformed>"] += 1
+                return
+            address, params = message.address, message.params
+        if address == TEENSY_ADDRESSES[0]:
+            self._close_frame()
+        self._frame.add(address)
+        self.counts[address] += 1
+        self.values[address] = params[0] if len(params) == 1 else params
+        for listener in self.listeners:
+            listener(address, params, now)
+
+
+def realistic_sweeps(rate, rng):
+    """One fader at a time, 0.5-2 s sweeps to random targets with pauses in between."""
+    position = {address: 0.5 for address in FADERS}
+    while True:
+        address = rng.choice(FADERS)
+        start, target = position[address], rng.random()
+        steps = max(1, int(rng.uniform(0.5, 2.0) * rate))
+        for k in range(1, steps + 1):
+            yield address, start + (target - start) * k / steps
+        position[address] = target
+        for _ in range(int(rng.uniform(0.2, 1.5) * rate)):
+            yield None
+        if rng.random() < 0.05:
+            yield "/cmd", "FillButton"
+
+
+def worst_case_sweeps(rate, rng):
+    """Every fader from one end to the other on every message."""
+    high = False
+    while True:
+        high = not high
+        for address in FADERS:
+            yield address, float(high)
+
+
+PROFILES = {
+    "realistic": realistic_sweeps,
+    "worst": worst_case_sweeps,
+}
+
+
+class FakeSurface:
+    """Plays a fader profile into the simulator at a fixed message rate."""
+
+    def __init__(self, ip="127.0.0.1", port=7133, profile="realistic", rate=30.0, seed=0):
+        self.client = udp_client.SimpleUDPClient(ip, port)
+        self.rate = rate
+        self.sweeps = PROFILES[profile](rate, random.Random(seed))
+        self.sent = 0
+        self._seq = 0
+
+    def command(self, value):
+        self.client.send_message("/cmd", value)
+
+    def mark(self, value):
+        """`value` in [0, 1] nudged to a float32 no other recent message carries."""
+        self._seq += 1
+        value = round(min(max(value, 0.0), 1.0), 3) * (1.0 - 1e-4) + (self._seq % 1000) * 1e-7
+        return float(np.float32(value))
+
+    def play(self, duration, on_send=None, restart_every=None):
+        """
+        Send for `duration` seconds (forever if None).
+
+        `on_send(address, value, send_time)` is called just before each fader
+        message; `restart_every` presses Start again so a game never runs out.
+        """
+        interval = 1.0 / self.rate
+        begin = next_send = last_restart = time.perf_counter()
+        while duration is None or next_send - begin < duration:
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            next_send += interval
+            now = time.perf_counter()
+            if restart_every and now - last_restart >= restart_every:
+                self.command("StartButton")
+                last_restart = now
+            item = next(self.sweeps)
+            if item is None:
+                continue
+            address, value = item
+            if address in FADERS:
+                value = self.mark(value)
+                if on_send is not None:
+                    on_send(address, value, now)
+            self.client.send_message(address, value)
+            self.sent += 1
+
+
+class LatencyTracker:
+    """Matches fader values sent by the surface with their echo at the Teensy."""
+
+    def __init__(self):
+        self.markers = []   # [address, value, sent_at, seen_at]
+        self.pending = {}
+
+    def sent(self, address, value, now):
+        marker = [address, value, now, None]
+        self.markers.append(marker)
+        self.pending[(address, value)] = marker
+
+    def output(self, address, params, now):
+        if address in FADERS and params:
+            marker = self.pending.pop((address, params[0]), None)
+            if marker is not None:
+                marker[3] = now
+
+    def report(self, end, hold):
+        """
+        Latency percentiles [ms] and loss.
+
+        A value only counts as lost if it stayed on its fader for `hold`
+        seconds, long enough for the simulator to output it; values replaced
+        sooner are superseded.
+        """
+        latency = []
+        held = lost = superseded = 0
+        last_on = {}
+        for marker in reversed(self.markers):
+            address, _, sent_at, seen_at = marker
+            replaced_at = last_on.get(address, end)
+            last_on[address] = sent_at
+            if seen_at is not None:
+                latency.append(seen_at - sent_at)
+            if replaced_at - sent_at >= hold:
+                held += 1
+                lost += seen_at is None
+            elif seen_at is None:
+                superseded += 1
+        latency = np.array(latency) * 1000.0
+        result = {
+            "markers": len(self.markers),
+            "observed": len(latency),
+            "held": held,
+            "lost": lost,
+            "superseded": superseded,
+            "loss_pct": 100.0 * lost / held if held else 0.0,
+        }
+        if len(latency):
+            for p in (50, 90, 99):
+                result["p{0}_ms".format(p)] = float(np.percentile(latency, p))
+            result["max_ms"] = float(latency.max())
+        return result
+
+
+def cpu_seconds(process):
+    """CPU time of a process and all its children (plot/forecast workers)."""
+    total = 0.0
+    for p in [process] + process.children(recursive=True):
+        try:
+            times = p.cpu_times()
+        except psutil.NoSuchProcess:
+            continue
+        total += times.user + times.system
+    return total
+
+
+def wait_for_output(surface, teensy, timeout):
+    """Press Start until the Teensy sees plant state."""
+    deadline = time.perf_counter() + timeout
+    while teensy.frames == 0 and not teensy._frame:
+        if time.perf_counter() > deadline:
+            raise RuntimeError("no output from the simulator within {0:.0f} s".format(timeout))
+        surface.command("StartButton")
+        time.sleep(0.5)
+
+
+def run_load_test(args):
+    teensy = FakeTeensy(args.teensy_ip, args.teensy_port)
+    tracker = LatencyTracker()
+    teensy.listeners.append(tracker.output)
+    teensy.start()
+    surface = FakeSurface(args.ip, args.port, args.profile, args.rate, args.seed)
+
+    simulator = None
+    if args.attach:
+        process = psutil.Process(args.attach)
+    else:
+        sim_args = [a for a in args.sim_args if a != "--"]
+        cmd = [sys.executable, SIMULATOR, "--backend", "raster", "--ip", args.ip, "--port", str(args.port),
+               "--teensy-ip", args.teensy_ip, "--teensy-port", str(args.teensy_port),
+               "--history-dir", ""] + sim_args
+        log = open(args.sim_log, "w") if args.sim_log else subprocess.DEVNULL
+        simulator = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+        process = psutil.Process(simulator.pid)
+
+    try:
+        wait_for_output(surface, teensy, args.startup_timeout)
+
+        # Idle game: CPU baseline and output rate
+        surface.command("StartButton")
+        frames, cpu, begin = teensy.frames, cpu_seconds(process), time.perf_counter()
+        time.sleep(args.baseline)
+        baseline_time = time.perf_counter() - begin
+        baseline_cpu = cpu_seconds(process) - cpu
+        output_hz = (teensy.frames - frames) / baseline_time
+
+        # Load
+        surface.command("StartButton")
+        cpu, begin = cpu_seconds(process), time.perf_counter()
+        surface.play(args.duration, on_send=tracker.sent, restart_every=40.0)
+        end = time.perf_counter()
+        load_cpu = cpu_seconds(process) - cpu
+        load_time = end - begin
+        time.sleep(args.drain)
+        settled = time.perf_counter()
+    finally:
+        if simulator is not None:
+            simulator.terminate()
+            try:
+                simulator.wait(5)
+            except subprocess.TimeoutExpired:
+                simulator.kill()
+        teensy.stop()
+
+    # A value has to survive a few output ticks before its absence counts as loss
+    hold = 3.0 / output_hz if output_hz > 0 else 0.5
+    # The last value on each fader is held through the drain
+    result = tracker.report(settled, hold)
+    result.update({
+        "profile": args.profile,
+        "rate_hz": args.rate,
+        "duration_s": load_time,
+        "sent": surface.sent,
+        "output_hz": output_hz,
+        "frames": teensy.frames,
+        "incomplete_frames": teensy.incomplete_frames,
+        "baseline_cpu_pct": 100.0 * baseline_cpu / baseline_time,
+        "load_cpu_pct": 100.0 * load_cpu / load_time,
+    })
+    extra_cpu = load_cpu - baseline_cpu * load_time / baseline_time
+    result["cpu_ms_per_1000_messages"] = 1e6 * extra_cpu / surface.sent if surface.sent else 0.0
+    return result
+
+
+def print_report(result):
+    print("{profile}: {sent} messages at {rate_hz:.0f} Hz over {duration_s:.1f} s".format(**result))
+    if "p50_ms" in result:
+        print("  control-to-output latency  p50 {p50_ms:.1f}  p90 {p90_ms:.1f}  p99 {p99_ms:.1f}  "
+              "max {max_ms:.1f} ms".format(**result))
+    print("  fader values  {markers} sent, {observed} echoed, {superseded} superseded, "
+          "{lost}/{held} held values lost ({loss_pct:.2f}%)".format(**result))
+    print("  output  {output_hz:.1f} Hz, {frames} frames, {incomplete_frames} incomplete".format(**result))
+    print("  CPU  {baseline_cpu_pct:.1f}% idle game, {load_cpu_pct:.1f}% under load, "
+          "{cpu_ms_per_1000_messages:.1f} ms per 1000 messages".format(**result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Teensy/control surface and OSC load test")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    teensy = commands.add_parser("teensy", help="Listen like the Teensy and print what arrives")
+    teensy.add_argument("--ip", default="127.0.0.1")
+    teensy.add_argument("--port", type=int, default=7134)
+
+    for name, help in (("surface", "Play fader sweeps into the simulator"),
+                       ("run", "Start the simulator and measure latency, loss and CPU")):
+        command = commands.add_parser(name, help=help)
+        command.add_argument("--ip", default="127.0.0.1", help="Simulator address")
+        command.add_argument("--port", type=int, default=7133, help="Simulator control port")
+        command.add_argument("--profile", choices=sorted(PROFILES), default="realistic")
+        command.add_argument("--rate", type=float, default=None,
+                             help="Messages per second (default: 30 realistic, 1000 worst)")
+        command.add_argument("--seed", type=int, default=0)
+        command.add_argument("--duration", type=float, default=None if name == "surface" else 20.0,
+                             help="Seconds to play")
+
+    run = commands.choices["run"]
+    run.add_argument("--teensy-ip", default="127.0.0.1")
+    run.add_argument("--teensy-port", type=int, default=7134, help="Where the fake Teensy listens")
+    run.add_argument("--attach", type=int, metavar="PID",
+                     help="Measure an already running simulator instead of starting one")
+    run.add_argument("--baseline", type=float, default=5.0, help="Seconds of idle game before the load")
+    run.add_argument("--drain", type=float, default=1.0, help="Seconds to wait for late output")
+    run.add_argument("--startup-timeout", type=float, default=60.0)
+    run.add_argument("--sim-log", help="Write the simulator's output here")
+    run.add_argument("--json", help="Write the results to this file")
+    run.add_argument("--max-p99-ms", type=float, help="Fail if the p99 latency is higher")
+    run.add_argument("--max-loss-pct", type=float, help="Fail if more held values are lost")
+    run.add_argument("sim_args", nargs=argparse.REMAINDER, help="Extra simulator arguments after --")
+    args = parser.parse_args()
+
+    if args.command == "teensy":
+        fake = FakeTeensy(args.ip, args.port)
+        fake.start()
+        try:
+            while True:
+                time.sleep(1.0)
+                print("{0} frames ({1} incomplete)  ".format(fake.frames, fake.incomplete_frames) + "  ".join(
+                    "{0}={1:.3f}".format(a[1:], fake.values[a]) for a in FADERS + ("/Score",) if a in fake.values))
+        except KeyboardInterrupt:
+            fake.stop()
+        return
+
+    if args.rate is None:
+        args.rate = 1000.0 if args.profile == "worst" else 30.0
+    if args.command == "surface":
+        surface = FakeSurface(args.ip, args.port, args.profile, args.rate, args.seed)
+        surface.command("StartButton")
+        try:
+            surface.play(args.duration, restart_every=40.0)
+        except KeyboardInterrupt:
+            pass
+        print("Sent {0} messages".format(surface.sent))
+        return
+
+    result = run_load_test(args)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    failed = []
+    if args.max_p99_ms is not None and result.get("p99_ms", float("inf")) > args.max_p99_ms:
+        failed.append("p99 latency")
+    if args.max_loss_pct is not None and result["loss_pct"] > args.max_loss_pct:
+        failed.append("loss")
+    if failed:
+        print("FAILED: " + ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
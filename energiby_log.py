@@ -0,0 +1,212 @@
+"""
+Non-blocking structured logging for Energiby YderZonen.
+
+Log calls on the simulation, OSC and render threads only store a record
+(time, level, event, fields) in a fixed-size ring buffer; a background writer
+formats and writes them, so slow stdout/journald I/O never stalls a tick.
+
+    log.info("osc", address="/OvenAirFlow", value=0.5)
+    log.limit("/OvenAirFlow", per_second=2)   # per event or OSC address
+    log.sample("wind_sample", every=10)
+
+Producers claim a slot with `next()` on an `itertools.count` (atomic under
+the GIL) and never take a lock. When the writer falls more than `capacity`
+records behind, the oldest records are overwritten and counted as dropped.
+Until `start()` (and in tools that never call it) there is no writer thread;
+producers then take a lock and the one that fills the ring writes it out, so
+nothing is dropped.
+Records suppressed by a rate limit or sampling are counted and reported with
+the next record that gets through.
+"""
+
+import atexit
+import itertools
+import json
+import sys
+import time
+from threading import Lock, Thread
+
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+LEVELS = {name.lower(): level for level, name in LEVEL_NAMES.items()}
+
+
+class _Limit:
+    """Token bucket and/or every-nth sampling for one event or address; shared by all threads."""
+
+    def __init__(self, per_second=None, burst=None, every=None):
+        self.per_second = per_second
+        self.burst = burst if burst is not None else max(per_second or 1.0, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.every = every
+        self.count = 0
+        self.suppressed = 0
+        self.lock = Lock()
+
+    def allow(self):
+        """None to drop the record, else the number of records suppressed since the last one kept."""
+        with self.lock:
+            if self.every:
+                self.count += 1
+                if self.count % self.every:
+                    self.suppressed += 1
+                    return None
+            if self.per_second:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.per_second)
+                self.updated = now
+                if self.tokens < 1.0:
+                    self.suppressed += 1
+                    return None
+                self.tokens -= 1.0
+            suppressed, self.suppressed = self.suppressed, 0
+            return suppressed
+
+
+class RingLog:
+    """Structured log records in a ring buffer, written by a background thread."""
+
+    def __init__(self, capacity=4096, level=INFO, stream=None, as_json=False, interval=0.05):
+        self.capacity = capacity
+        self.level = level
+        self.stream = stream
+        self.as_json = as_json
+        self.interval = interval
+        self.dropped = 0
+        self._slots = [None] * capacity
+        self._counter = itertools.count()
+        self._read = 0
+        self._limits = {}
+        self._thread = None
+        self._running = False
+        self._unwritten = Lock()  # serializes producers while there is no writer thread
+
+    # ---------------------------------------------------------------- producers
+
+    def log(self, level, event, **fields):
+        if level < self.level:
+            return
+        limits = self._limits
+        if limits:
+            limit = limits.get(fields.get("address")) or limits.get(event)
+            if limit is not None:
+                suppressed = limit.allow()
+                if suppressed is None:
+                    return
+                if suppressed:
+                    fields["suppressed"] = suppressed
+        if self._thread is None:
+            # No writer thread (not started yet, or a tool that never starts it): write the ring out when full
+            with self._unwritten:
+                seq = next(self._counter)
+                self._slots[seq % self.capacity] = (seq, time.time(), level, event, fields)
+                if seq + 1 - self._read >= self.capacity:
+                    self.drain()
+            return
+        seq = next(self._counter)
+        self._slots[seq % self.capacity] = (seq, time.time(), level, event, fields)
+
+    def debug(self, event, **fields):
+        self.log(DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        self.log(INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self.log(WARNING, event, **fields)
+
+    def error(self, event, **fields):
+        self.log(ERROR, event, **fields)
+
+    def limit(self, name, per_second, burst=None):
+        """At most `per_second` records (bursts of `burst`) for an event or OSC address."""
+        self._limits[name] = _Limit(per_second=per_second, burst=burst)
+
+    def sample(self, name, every):
+        """Keep every `every`-th record of an event or OSC address."""
+        self._limits[name] = _Limit(every=every)
+
+    # ------------------------------------------------------------------- writer
+
+    def format(self, record):
+        _, stamp, level, event, fields = record
+        if self.as_json:
+            return json.dumps(dict(time=round(stamp, 3), level=LEVEL_NAMES.get(level, level), event=event, **fields),
+                              default=str)
+        return " ".join(["{0:<7} {1}".format(LEVEL_NAMES.get(level, level), event)] +
+                        ["{0}={1}".format(k, v) for k, v in fields.items()])
+
+    def drain(self):
+        """Write every record stored so far; returns how many were written."""
+        lines = []
+        capacity = self.capacity
+        dropped = 0
+        while True:
+            record = self._slots[self._read % capacity]
+            if record is None or record[0] < self._read:
+                break  # not written yet
+            if record[0] > self._read:
+                # Lapped: everything older than the slot's previous round is gone
+                oldest = record[0] - capacity + 1
+                dropped += oldest - self._read
+                self._read = oldest
+                continue
+            if dropped:
+                lines.append(self.format((0, record[1], WARNING, "log_overrun", {"dropped": dropped})))
+                self.dropped += dropped
+                dropped = 0
+            lines.append(self.format(record))
+            self._read += 1
+        if lines:
+            stream = self.stream or sys.stdout
+            try:
+                stream.write("\n".join(lines) + "\n")
+                stream.flush()
+            except (OSError, ValueError):
+                pass
+        return len(lines)
+
+    def _run(self):
+        while self._running:
+            self.drain()
+            time.sleep(self.interval)
+
+    def start(self):
+        """Start the writer thread (after any forks) and flush at exit."""
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.drain()
+
+
+_default = RingLog()
+atexit.register(_default.close)
+
+log = _default.log
+debug = _default.debug
+info = _default.info
+warning = _default.warning
+error = _default.error
+limit = _default.limit
+sample = _default.sample
+start = _default.start
+
+
+def configure(level=None, as_json=None, stream=None):
+    """Level (name or number), output format and stream of the default log."""
+    if level is not None:
+        _default.level = LEVELS[level.lower()] if isinstance(level, str) else level
+    if as_json is not None:
+        _default.as_json = as_json
+    if stream is not None:
+        _default.stream = stream
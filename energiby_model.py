@@ -0,0 +1,558 @@
+"""
+Simulation model for Energiby YderZonen.
+
+Demand curves, wind and sun generators, the waste-to-energy power plant and
+the grid that combines them. This module has no GUI or OSC side effects, so
+it can be imported by tools and worker processes as well as by the exhibit
+(energiby_yderzonen.py).
+"""
+
+import hashlib
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+
+import energiby_log as log
+
+
+# Cache for precomputed curves, keyed by kind and parameters
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'energiby')
+CACHE_VERSION = 1
+
+
+def _cache_path(kind, params):
+    key = json.dumps([CACHE_VERSION, kind, params], sort_keys=True)
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, f"{kind}_{digest}.npy")
+
+
+def load_cached(kind, params):
+    """Return a cached array for (kind, params), or None on a miss."""
+    try:
+        return np.load(_cache_path(kind, params))
+    except (OSError, ValueError):
+        return None
+
+
+def store_cached(kind, params, array):
+    """Store an array in the cache; failures (read-only disk, ...) are ignored."""
+    path = _cache_path(kind, params)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+# ==================== LOWPASS FILTER====================
+class OnePole:
+    def __init__(self, alpha, initial_value):
+        self.alpha = alpha
+        self.value = initial_value
+
+    def set_alpha(self, alpha):
+        self.alpha = alpha
+    
+    def update(self, new_value):
+        self.value = new_value * self.alpha + self.value * (1 - self.alpha)
+        return self.value
+    
+    def update_alpha(self, new_value, alpha):
+        self.value = new_value * alpha + self.value * (1 - alpha)
+        return self.value
+    
+    def reset(self, initial_value):
+        self.value = initial_value
+        return self.value
+
+    def get(self):
+        return self.value
+
+
+# Data about the energy requirements
+
+class EnergyRequirement:
+    """Encapsulate a demand profile and derived curves.
+
+    An instance holds an hourly baseline vector and produces the
+    interpolated/filtered curves that the rest of the application uses.
+
+    Two separate objects are created below: one for electricity and one
+    for heat.  The setter method allows the profile to be changed at
+    runtime.
+    """
+
+    def __init__(self, mw_needed, N=961, offset=0.0, uncertainty=7.0, alpha=0.02):
+        self.hours_vector = np.linspace(0, 48, 49, True)
+        self.N = N
+        self.set_mw_needed(mw_needed, offset, uncertainty, alpha)
+
+    def set_mw_needed(self, mw_needed, offset=0.0, uncertainty=7.0, alpha=0.02):
+        """Assign a new hourly demand pattern and recompute all curves."""
+        self.offset = offset
+        self.uncertainty = uncertainty
+        self.alpha = alpha
+
+        self.mw_needed = np.array(mw_needed) + offset
+        self.time_vector = 0.05 * np.arange(self.N)
+        self.need_vector = load_cached('need', self._cache_params())
+        if self.need_vector is None:
+            self.need_vector = self._compute_need_vector()
+            store_cached('need', self._cache_params(), self.need_vector)
+        self.need_min_vector = self.need_vector - self.uncertainty
+        self.need_max_vector = self.need_vector + self.uncertainty
+
+    def _cache_params(self):
+        return {'mw_needed': self.mw_needed.tolist(), 'alpha': self.alpha, 'N': self.N}
+
+    def _compute_need_vector(self):
+        """Spline-interpolate the hourly profile and low-pass filter it."""
+        from scipy.interpolate import interp1d  # only needed on a cache miss
+
+        spline = interp1d(self.hours_vector, self.mw_needed, kind='cubic')
+        targets = spline(self.time_vector)  # one vectorized call instead of one per step
+        need_vector = np.empty(self.N)
+        last_need = self.mw_needed[0]
+        for x, target in enumerate(targets.tolist()):
+            last_need = target * self.alpha + last_need * (1.0 - self.alpha)
+            need_vector[x] = last_need
+        return need_vector
+
+
+# default hourly demand curve used for both electricity and heat
+default_mw_needed = [
+    24.0, 26.0, 27.0, 28.5, 32.5, 37.0, 39.0, 41.0, 40.0, 37.0, 32.0, 27.0,
+    21.0, 17.0, 16.0, 12.0, 18.0, 23.0, 29.0, 32.0, 26.0, 20.0, 16.0, 20.0,
+    22.0, 25.0, 27.0, 29.0, 33.0, 38.0, 40.0, 40.0, 39.0, 37.0, 32.0, 27.0,
+    21.0, 17.0, 16.0, 12.0, 18.0, 23.0, 29.0, 32.0, 26.0, 20.0, 18.0, 20.0,
+    24.0,
+]
+
+# Number of time steps in the simulation (48 hours with 0.05 hour time steps)
+N = 961
+
+# Envelope parameters per carrier, applied to every demand profile
+CARRIER_PARAMS = {
+    'electricity': dict(uncertainty=9.0, alpha=0.020, offset= 5.0),
+    'heat':        dict(uncertainty=7.0, alpha=0.005, offset=-4.0),
+}
+
+# Named demand profiles shipped with the exhibit
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+
+
+def load_profiles(directory=PROFILE_DIR):
+    """Read the demand profiles (<name>.json) in a directory.
+
+    A profile has 49 hourly values for the 48 h run, either one `mw_needed`
+    list for both carriers or separate `electricity` and `heat` lists.
+    """
+    profiles = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.json'):
+            with open(os.path.join(directory, filename)) as f:
+                profiles[filename[:-5]] = json.load(f)
+    return profiles
+
+
+# instantiate requirement object; electricity and heat profiles can be changed independently
+class EnergyRequirements:
+    def __init__(self):
+        # Set default curves for both electricity and heat; they can be changed independently at runtime using the set_mw_needed method
+        self.electricity = EnergyRequirement(default_mw_needed, N=N, **CARRIER_PARAMS['electricity'])
+        self.heat        = EnergyRequirement(default_mw_needed, N=N, **CARRIER_PARAMS['heat'])
+        # Precomputed curves per carrier and profile name; switching profile only swaps objects
+        self.library = {'electricity': {'default': self.electricity}, 'heat': {'default': self.heat}}
+        self.profile_names = {'electricity': 'default', 'heat': 'default'}
+
+    def add_profiles(self, profiles):
+        """Precompute the curves of named profiles (see load_profiles)"""
+        for name, profile in profiles.items():
+            for carrier, params in CARRIER_PARAMS.items():
+                mw_needed = profile.get(carrier, profile.get('mw_needed'))
+                if mw_needed is not None:
+                    self.library[carrier][name] = EnergyRequirement(mw_needed, N=N, **params)
+
+    def set_profile(self, carrier, name):
+        """Make a precomputed profile active for one carrier; raises KeyError if unknown"""
+        requirement = self.library[carrier][name]
+        setattr(self, carrier, requirement)
+        self.profile_names[carrier] = name
+        return requirement
+
+    def get_total_need_vector(self):
+        return self.electricity.need_vector + self.heat.need_vector
+
+    def get_total_need_at(self, index):
+        return self.electricity.need_vector[index] + self.heat.need_vector[index]
+
+
+
+def timeOfDay(t):
+    while(t > 24.0):
+        t -= 24.0
+    return t
+
+
+# ------------------------------------------------------------------------------------------- #
+# ---------------------------------- Wind Generator ----------------------------------------- #
+# ------------------------------------------------------------------------------------------- #
+class WindGenerator:
+    def __init__(self):
+        self.max = 35.0  # Max Wind Power in MW
+        self.n = 0
+        self.N = 15
+        self.mean = 20.0
+        self.sd = 15.0
+        self.f1 = OnePole(0.10, self.mean)
+        self.f2 = OnePole(0.01, self.mean)
+        self.power = self.mean
+        self.tmp = self.mean
+        self.vector = np.zeros(N)
+        self.active = True
+
+    def activate(self, active):
+        self.active = active
+    
+    def calculate(self):
+        if self.n >= self.N:
+            self.tmp = np.random.normal(self.mean, self.sd)
+            log.debug("wind_sample", value=self.tmp)
+            self.n = 0
+        else:
+            self.n = self.n + 1
+
+        self.f1.update(self.tmp)
+        self.f2.update(self.f1.get())
+        self.power = max(self.f2.get(), 0)
+        return self.power
+    
+    def make_new_vector(self):
+        # Reset Wind, including the sample counter, so the same random state gives the same vector
+        self.n = 0
+        self.mean = np.random.normal(10.0, 10.0)
+        if self.mean < 0:
+            self.mean = 0
+        self.sd = abs(np.random.normal(0.0, 15.0))
+        
+        self.f1.reset(self.mean)
+        self.f2.reset(self.mean)
+        self.power = self.mean
+        self.tmp = self.mean
+        for x in range(N):
+            self.vector[x] = self.calculate()
+
+    def set_vector(self, vector):
+        # Use a precomputed wind profile (scenario bank, weather data)
+        self.vector[:] = vector
+
+    def get(self, index):
+        if self.active:
+            return self.vector[index]
+        else:
+            return 0.0
+
+# ------------------------------------------------------------------------------------------- #
+# ---------------------------------- Sun Generator ------------------------------------------ #
+# ------------------------------------------------------------------------------------------- #
+class SunGenerator:
+    def __init__(self):
+        # use the current average electricity demand for scaling
+        self.max = 0.07 * 35 # Max Solar Power in MW, scaled to be a fraction of the average electricity demand
+        self.f1 = OnePole(0.1, 0.0)
+        self.f2 = OnePole(0.1, self.f1.get())
+        self.power = 0.0
+        self.vector = np.zeros(N)
+        self.active = True
+    
+    def activate(self, active):
+        self.active = active
+
+    def calculate(self, td):
+        sol = 0.0
+        sol_alpha = 0.1
+        if td > 5 and td < 13:
+            sol = self.max
+        else:
+            sol = 0.0
+            sol_alpha = 0.05
+        
+        # Two stage lowpass filter to create a smoother curve
+        sol = self.f1.update_alpha(sol, sol_alpha)
+        sol = self.f2.update_alpha(sol, sol_alpha)
+
+        self.power = sol
+        
+        return self.power
+    
+    def make_new_vector(self):
+        self.__init__()  # Reset the sun generator to create a new sun profile
+        for x in range(N):
+            td = timeOfDay(0.05 * x)
+            self.vector[x] = self.calculate(td)
+
+    def set_vector(self, vector):
+        # Use a precomputed sun profile (weather data)
+        self.vector[:] = vector
+
+    def get(self, index):
+        if self.active:
+            return self.vector[index]
+        else:
+            return 0.0
+
+
+# ------------------------------------------------------------------------------------------- #
+# ---------------------------------- PowerPlant --------------------------------------------- #
+# ------------------------------------------------------------------------------------------- #
+# Everything that changes while a plant runs (filter states, amounts and controls)
+PlantState = namedtuple('PlantState', [
+    'storage_amount', 'oven_amount', 'power', 'turbine', 'acid', 'CO',
+    'air_flow', 'turbine_pct', 'CaCO3_amount', 'NaOH_amount',
+])
+
+GridSnapshot = namedtuple('GridSnapshot', ['plant', 'wind_active', 'sun_active'])
+
+# What a worker process needs besides its forked copy of the grid to play the current scenario
+Scenario = namedtuple('Scenario', ['wind_vector', 'sun_vector', 'profile_names'])
+
+class PowerPlant:
+    def __init__(self, requirements):
+        # Ref to requirements for scaling power output and emissions
+        self.requirements = requirements
+        # Parameters related to the storage of burnable waste
+        self.storage_amount_max = 64.0
+        self.storage_amount = self.storage_amount_max
+        # oven state
+        self.oven_amount_initial = 13.0
+        self.oven_amount = self.oven_amount_initial
+        self.oven_amount_max = 26.0
+        self.oven_amount_ok_min = 8.0
+        self.oven_amount_ok_max = 18.0
+        self.oven_amount_to_fill = 4.0
+        self.oven_consumption_rate = 0.3
+        # Air flow state
+        self.air_flow = 0.5
+
+        # power generation state
+        self.power_max = 60  # MW
+        self.alpha_up = 0.008
+        self.alpha_down = 0.004
+        self.alpha_empty = 0.01
+        # initialise filter using the current electricity requirement baseline
+        self.power_filter = OnePole(0.1, self.requirements.get_total_need_at(0))
+        self.v1 = 0.0
+
+        # Turbine amount, i.e. the percentage of power that is converted to electricity
+        self.turbine_pct = 0.3
+        self.turbine_pct_filter = OnePole(0.1, self.turbine_pct)
+
+        # Emission
+        self.CaCO3_amount = 0.0
+        self.NaOH_amount = 0.0
+        self.acid_emission = OnePole(0.05, 0.0)
+        self.CO_emission = OnePole(0.05, 0.0)
+
+    def get_storage_pct(self):
+        return self.storage_amount / self.storage_amount_max
+    
+    def get_oven_pct(self):
+        return self.oven_amount / self.oven_amount_max
+    
+    def set_air_flow(self, air_flow):
+        self.air_flow = air_flow
+
+    def get_air_flow(self):
+        return self.air_flow
+
+    def set_turbine_pct(self, pct):
+        self.turbine_pct = pct
+        
+    def get_electricity_pct(self):
+        return self.turbine_pct_filter.get()
+    
+    def get_heat_pct(self):
+        return 1 - self.turbine_pct_filter.get()
+
+    def get_electric_power(self):
+        return self.power_filter.get() * self.get_electricity_pct()
+    
+    def get_electric_power_pct(self):
+        return self.get_electric_power() / self.power_max
+
+    def get_heat_power(self):
+        return self.power_filter.get() * self.get_heat_pct()
+
+    def get_heat_power_pct(self):
+        return self.get_heat_power() / self.power_max
+    
+    def get_total_power(self):
+        return self.power_filter.get()
+    
+    def get_total_power_pct(self):
+        return self.power_filter.get() / self.power_max
+    
+    def get_oven_temperature(self):
+        return 800.0 * self.get_total_power_pct()
+    
+    def get_oven_temperature_pct(self):
+        return self.get_total_power_pct()
+    
+    def get_lambda(self):
+        if self.oven_amount > 0:
+            return self.air_flow / self.get_oven_pct()
+        else:
+            return 1.0
+
+    def set_CaCO3_amount(self, amount):
+        self.CaCO3_amount = amount
+
+    def set_NaOH_amount(self, amount):
+        self.NaOH_amount = amount
+
+    def get_acid_emission(self):
+        return self.acid_emission.get()
+        
+    def get_CO_emission(self):
+        return self.CO_emission.get()
+    
+    def fill_oven(self):
+        space = self.oven_amount_max - self.oven_amount
+        if self.storage_amount >= self.oven_amount_to_fill and space >= self.oven_amount_to_fill:
+            self.oven_amount += self.oven_amount_to_fill
+            self.storage_amount -= self.oven_amount_to_fill
+        elif space >= self.oven_amount_to_fill:
+            self.oven_amount += self.storage_amount
+            self.storage_amount = 0
+    
+    def calculate_acid_emission(self):
+        # Calculate 
+        acid_emission = self.get_total_power_pct() * (1-self.CaCO3_amount) * 0.6
+        return self.acid_emission.update(acid_emission)
+        
+    def calculate_CO_emission(self):
+        CO_emission = self.get_total_power_pct() * (1-self.NaOH_amount) * 0.4
+        return self.CO_emission.update(CO_emission)
+
+    def calculate_power(self):
+        tmp_power = self.air_flow * self.get_oven_pct() * self.power_max
+        oven_factor = 0.8 + 0.3 * self.oven_amount / self.oven_amount_max
+        bio_factor = 1.0
+        consumption = (0.3 + 0.7 * tmp_power / self.power_max) * oven_factor * self.oven_consumption_rate
+        if self.oven_amount > self.oven_amount_ok_max + 0.5:
+            consumption *= 1 + (self.oven_amount - self.oven_amount_ok_max)
+        elif self.oven_amount < self.oven_amount_ok_min - 0.5:
+            bio_factor = max(1 - 0.02 * (self.oven_amount_ok_min - self.oven_amount), 0.0)
+        self.oven_amount = max(self.oven_amount - consumption, 0.0)
+        if self.oven_amount == 0.0:
+            bio_factor = 0
+            self.power_filter.update_alpha(0.0, self.alpha_empty)
+        else:
+            tmp_power = tmp_power * bio_factor
+            if tmp_power > self.power_filter.get():
+                self.power_filter.update_alpha(tmp_power, self.alpha_up)
+            elif tmp_power < self.power_filter.get():
+                self.power_filter.update_alpha(tmp_power, self.alpha_down)
+
+        return self.power_filter.get()
+    
+    def calculate(self):
+        # Update the turbine filter
+        self.turbine_pct_filter.update(self.turbine_pct)
+        # Calculate the power output of the plant
+        power = self.calculate_power()
+        # Calculate the emissions
+        self.calculate_acid_emission()
+        self.calculate_CO_emission()
+        # Return the power output
+        return power
+
+    def snapshot(self):
+        return PlantState(self.storage_amount, self.oven_amount, self.power_filter.get(),
+                          self.turbine_pct_filter.get(), self.acid_emission.get(), self.CO_emission.get(),
+                          self.air_flow, self.turbine_pct, self.CaCO3_amount, self.NaOH_amount)
+
+    def restore(self, state):
+        self.storage_amount = state.storage_amount
+        self.oven_amount = state.oven_amount
+        self.power_filter.reset(state.power)
+        self.turbine_pct_filter.reset(state.turbine)
+        self.acid_emission.reset(state.acid)
+        self.CO_emission.reset(state.CO)
+        self.air_flow = state.air_flow
+        self.turbine_pct = state.turbine_pct
+        self.CaCO3_amount = state.CaCO3_amount
+        self.NaOH_amount = state.NaOH_amount
+
+    def reset(self):
+        self.__init__(self.requirements)
+       
+
+# EnergyGrid class to manage the overall energy production and consumption balance
+class EnergyGrid:
+    def __init__(self):
+        self.requirements = EnergyRequirements()
+        self.wind_generator = WindGenerator()
+        self.sun_generator = SunGenerator()
+        self.powerplant = PowerPlant(self.requirements)
+        self.seed = None
+
+    def reset(self, seed=None, wind_vector=None, sun_vector=None):
+        # Seed the random scenario so a run can be reproduced from its seed
+        if seed is None:
+            seed = int(np.random.SeedSequence().generate_state(1)[0])
+        self.seed = seed
+        np.random.seed(seed)
+        if wind_vector is None:
+            self.wind_generator.make_new_vector()
+        else:
+            self.wind_generator.set_vector(wind_vector)
+        if sun_vector is None:
+            self.sun_generator.make_new_vector()
+        else:
+            self.sun_generator.set_vector(sun_vector)
+        self.powerplant.reset()
+
+    def snapshot(self):
+        """Cheap copy of the state that changes during a run (the scenario vectors are not copied)"""
+        return GridSnapshot(self.powerplant.snapshot(), self.wind_generator.active, self.sun_generator.active)
+
+    def restore(self, snapshot):
+        self.powerplant.restore(snapshot.plant)
+        self.wind_generator.active = snapshot.wind_active
+        self.sun_generator.active = snapshot.sun_active
+
+    def scenario(self):
+        """Copy of the wind and sun vectors and the active demand profile names"""
+        return Scenario(self.wind_generator.vector.copy(), self.sun_generator.vector.copy(),
+                        dict(self.requirements.profile_names))
+
+    def set_scenario(self, scenario):
+        """Play a `Scenario`; its profiles must be in this grid's library"""
+        self.wind_generator.set_vector(scenario.wind_vector)
+        self.sun_generator.set_vector(scenario.sun_vector)
+        for carrier, name in scenario.profile_names.items():
+            self.requirements.set_profile(carrier, name)
+
+    def get_total_electricity(self, index):
+        return self.wind_generator.get(index) + self.sun_generator.get(index) + self.powerplant.get_electric_power()        
+
+    def get_total_heat(self, index):
+        return self.powerplant.get_heat_power()
+
+    def get_total_production(self, index):
+        return self.wind_generator.get(index) + self.sun_generator.get(index) + self.powerplant.get_total_power()
+
+    def calculate(self, index):
+        # Calculate the power plant output first as it depends on the current state of the oven and air flow
+        plant_power = self.powerplant.calculate()
+        # Then calculate the wind and sun power for the current time step
+        wind_power = self.wind_generator.get(index)
+        sun_power = self.sun_generator.get(index)
+        # Return the total production
+        return wind_power + sun_power + plant_power
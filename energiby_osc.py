@@ -0,0 +1,103 @@
+"""
+Fast-path OSC dispatch for Energiby YderZonen.
+
+python-osc parses every datagram into packet/message objects and matches the
+address against every mapped pattern before a handler runs. The control
+surface only ever sends a small fixed set of addresses with one float,
+int, string or boolean argument, so `FastDispatcher` looks the address up
+in a dict of precompiled entries and unpacks the arguments straight from
+the datagram with precompiled structs. Bundles, unknown addresses and
+unexpected type tags fall back to the generic python-osc path.
+"""
+
+import struct
+
+from pythonosc.dispatcher import Dispatcher
+
+
+# Decoders for the argument type tags seen from the control surface
+_FIXED = {
+    ord('f'): struct.Struct('>f'),
+    ord('i'): struct.Struct('>i'),
+    ord('d'): struct.Struct('>d'),
+    ord('h'): struct.Struct('>q'),
+}
+_CONSTANTS = {ord('T'): True, ord('F'): False, ord('N'): None}
+
+
+def _padded(length):
+    """Length of an OSC string of `length` bytes including its null padding."""
+    return (length + 4) & ~3
+
+
+def decode_message(data):
+    """
+    (address, args) of a plain OSC message with simple argument types.
+
+    Returns None for bundles and anything the fast path does not handle.
+    """
+    if not data or data[0] != 0x2f:  # '/' (bundles start with '#')
+        return None
+    end = data.find(b'\0')
+    offset = _padded(end)
+    if end < 0 or offset >= len(data) or data[offset] != 0x2c:  # ','
+        return None
+    tag_end = data.find(b'\0', offset)
+    if tag_end < 0:
+        return None
+    pos = _padded(tag_end)
+    args = []
+    for tag in data[offset + 1:tag_end]:
+        decoder = _FIXED.get(tag)
+        if decoder is not None:
+            args.append(decoder.unpack_from(data, pos)[0])
+            pos += decoder.size
+        elif tag == 0x73:  # 's'
+            string_end = data.find(b'\0', pos)
+            if string_end < 0:
+                return None
+            args.append(data[pos:string_end].decode('utf-8', 'replace'))
+            pos = _padded(string_end)
+        elif tag in _CONSTANTS:
+            args.append(_CONSTANTS[tag])
+        else:
+            return None
+    return data[:end], args
+
+
+class FastDispatcher(Dispatcher):
+    """
+    Dispatcher with a dict lookup for the fixed control addresses.
+
+    Addresses registered with `map_fast` are called as handler(address, *args)
+    without going through python-osc's parser and pattern matching; everything
+    else is handled by the regular `Dispatcher` machinery (also `map`).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._fast = {}
+        self.fast_count = 0
+        self.fallback_count = 0
+
+    def map_fast(self, address, handler):
+        """Register a handler on the fast path (and the generic one, for bundles)."""
+        self._fast[address.encode()] = (address, handler)
+        self.map(address, handler)
+
+    def call_handlers_for_packet(self, data, client_address):
+        entry = None
+        message = None
+        try:
+            message = decode_message(data)
+            if message is not None:
+                entry = self._fast.get(message[0])
+        except (struct.error, IndexError):
+            entry = None
+        if entry is None:
+            self.fallback_count += 1
+            return super().call_handlers_for_packet(data, client_address)
+        self.fast_count += 1
+        address, handler = entry
+        handler(address, *message[1])
+        return []
@@ -0,0 +1,311 @@
+"""
+Plot setup for the Energiby YderZonen monitors.
+
+The same figure layout is used whether the plots are drawn inside the
+simulator process or by one renderer process per monitor (--plot-processes).
+In the latter mode each figure lives in its own interpreter, so rendering is
+spread over the Pi's cores instead of competing for the simulator's GIL. The
+simulator feeds new samples to each renderer through a pipe.
+"""
+
+import multiprocessing
+import pickle
+import re
+import subprocess
+import sys
+from threading import Lock
+
+import numpy as np
+
+
+HOURS_TICKS = [0, 6, 12, 18, 24, 30, 36, 42, 48]
+HOURS_LABELS = ['0:00', '6:00', '12:00', '18:00', '0:00', '6:00', '12:00', '18:00', '0:00']
+
+
+def get_monitor_info():
+    """Get monitor positions and sizes using xrandr."""
+    result = subprocess.run(['xrandr'], capture_output=True, text=True)
+    output = result.stdout
+    monitors = []
+    for line in output.split('\n'):
+        if ' connected ' in line and 'primary' in line:  # Primary monitor first
+            match = re.search(r'(\d+)x(\d+)\+(\d+)\+(\d+)', line)
+            if match:
+                width, height, x, y = map(int, match.groups())
+                monitors.append((x, y, width, height))
+        elif ' connected ' in line and 'primary' not in line:
+            match = re.search(r'(\d+)x(\d+)\+(\d+)\+(\d+)', line)
+            if match:
+                width, height, x, y = map(int, match.groups())
+                monitors.append((x, y, width, height))
+    return monitors
+
+
+def configure_matplotlib(plt):
+    """Apply the Raspberry Pi friendly rcParams used by all plot windows."""
+    # Reduce matplotlib memory usage and improve rendering
+    plt.rcParams['figure.max_open_warning'] = 0
+    plt.rcParams['lines.linewidth'] = 2
+    #plt.rcParams['lines.antialiased'] = False  # Disable antialiasing for speed
+    #plt.rcParams['patch.antialiased'] = False
+    #plt.style.use('fivethirtyeight')
+    plt.rcParams['toolbar'] = 'None'
+    plt.rcParams['figure.dpi'] = 96  # Standard DPI for RPi displays
+    plt.rcParams['font.size'] = 9
+
+
+def create_plot_on_monitor(monitor, plot_func):
+    """Create a matplotlib figure positioned on the specified monitor."""
+    import matplotlib.pyplot as plt
+    x, y, width, height = monitor
+    width = int(width * 0.5)  # Use 90% of the monitor width
+    height = int(height * 0.5)  # Use 90% of the monitor height
+    fig = plt.figure(figsize=(width/100, height/100), dpi=96)  # Lower DPI for performance
+    # Disable toolbar and enable fast rendering
+    # fig.canvas.set_window_title('')
+    plot_func(fig)
+    # Position the window
+    fig.canvas.manager.window.geometry(f"{width}x{height}+{x}+{y}")
+    fig.canvas.manager.window.deiconify()  # Make the window visible
+    fig.canvas.manager.window.update()  # Update the window to apply position
+    # Enable faster rendering mode
+    fig.patch.set_animated(True)
+    return fig
+
+
+def setup_power_axes(fig, time_vector, need_min_vector, need_max_vector, line_label, x_values=(), y_values=()):
+    """Draw the fixed 0-48 h x 0-70 MW axes; returns the production line, the envelope and the ghost line."""
+    ax = fig.gca()  # Get the current axes
+    ax.set_xlim([0,48]) # Set the x-limits
+    ax.set_ylim([0,70]) # Set the y-limits
+    ax.set_xlabel('Time [h]')
+    ax.set_ylabel('Power [MW]')
+    ax.set_xticks(HOURS_TICKS)
+    ax.set_xticklabels(HOURS_LABELS)
+    # fill the requirement envelope
+    envelope = ax.fill_between(time_vector, need_min_vector, need_max_vector, label="Behov")
+    line, = ax.plot(list(x_values), list(y_values), 'k-', label=line_label) # Create a line with the data
+    # Faint reference trace (autopilot "expert" run) behind the production line
+    ghost, = ax.plot([], [], '-', color='0.35', alpha=0.5, linewidth=1.5, zorder=line.get_zorder() - 0.1)
+
+    ax.legend(loc='upper left')
+    ax.grid(True)
+    return line, envelope, ghost
+
+
+def cache_envelopes(fig, envelopes, active_key, active_artist):
+    """
+    Pre-build hidden envelope artists for other demand profiles.
+
+    `envelopes` maps profile names to (time, min, max). Returns a dict of
+    artists including the active one, for `show_envelope`.
+    """
+    ax = fig.gca()
+    artists = {active_key: active_artist}
+    for key, envelope in envelopes.items():
+        if key not in artists:
+            artist = ax.fill_between(*envelope, color=active_artist.get_facecolor()[0])
+            artist.set_visible(False)
+            artists[key] = artist
+    return artists
+
+
+def show_envelope(artists, key):
+    """Switch the visible envelope to a cached one."""
+    for name, artist in artists.items():
+        artist.set_visible(name == key)
+
+
+def setup_forecast_artists(fig):
+    """Faint forecast line and fan of alternatives (a single LineCollection) on the figure's axes."""
+    from matplotlib.collections import LineCollection
+    ax = fig.gca()
+    forecast, = ax.plot([], [], '--', color='0.2', alpha=0.6, linewidth=1.5)
+    fan = LineCollection([], colors='0.2', alpha=0.2, linewidths=1.0)
+    ax.add_collection(fan)
+    return forecast, fan
+
+
+def set_forecast_data(forecast, fan, x_values, y_values, fan_values):
+    """Update the artists from `setup_forecast_artists`."""
+    forecast.set_data(x_values, y_values)
+    if len(x_values):
+        x = np.asarray(x_values)
+        fan.set_segments([np.column_stack([x, row]) for row in fan_values])
+    else:
+        fan.set_segments([])
+
+
+def setup_runs_artist(fig):
+    """Earlier runs and the day's best as one LineCollection behind the production line."""
+    from matplotlib.collections import LineCollection
+    ax = fig.gca()
+    runs = LineCollection([], zorder=1.8)
+    ax.add_collection(runs)
+    return runs
+
+
+def set_runs_data(runs, recent, best):
+    """Update the artist from `setup_runs_artist`; `recent` is oldest first, older runs are fainter."""
+    segments = [np.column_stack([x, y]) for x, y in recent]
+    colors = [(0.35, 0.35, 0.35, alpha) for alpha in np.linspace(0.25, 0.55, len(recent))]
+    widths = [1.0] * len(recent)
+    if best is not None:
+        segments.append(np.column_stack(best))
+        colors.append((0.17, 0.63, 0.17, 0.8))  # 'C2'
+        widths.append(1.5)
+    runs.set_segments(segments)
+    if segments:
+        runs.set_color(colors)
+        runs.set_linewidths(widths)
+
+
+def _set_cpu_affinity(cpus):
+    """Pin the calling process to the given cores (no-op without psutil)."""
+    if not cpus:
+        return
+    try:
+        import psutil
+        psutil.Process().cpu_affinity(list(cpus))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def _plot_process_main(conn, monitor, envelope, line_label, cpus, interval_ms, envelope_key, extra_envelopes):
+    """Entry point of a renderer process: one figure, fed through `conn`."""
+    _set_cpu_affinity(cpus)
+
+    import matplotlib
+    matplotlib.use('TkAgg')  # Use TkAgg backend for window management
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation
+
+    configure_matplotlib(plt)
+    plt.ioff()
+
+    x_values = []
+    y_values = []
+    artists = {}
+
+    def plot_func(fig):
+        artists['line'], artists['envelope'], artists['ghost'] = setup_power_axes(fig, *envelope, line_label)
+        artists['forecast'], artists['fan'] = setup_forecast_artists(fig)
+        artists['runs'] = setup_runs_artist(fig)
+        artists['envelopes'] = cache_envelopes(fig, extra_envelopes or {}, envelope_key, artists['envelope'])
+
+    fig = create_plot_on_monitor(monitor, plot_func)
+    plt.tight_layout()
+
+    def update(i):
+        changed = False
+        try:
+            while conn.poll():
+                try:
+                    msg = conn.recv()
+                except (pickle.UnpicklingError, ValueError, AttributeError, IndexError) as e:
+                    # A damaged message is dropped; the figure keeps running
+                    print("plot renderer: dropped a message ({0!r})".format(e), file=sys.stderr)
+                    continue
+                kind = msg[0]
+                if kind == 'samples':
+                    x_values.extend(msg[1])
+                    y_values.extend(msg[2])
+                elif kind == 'reset':
+                    x_values.clear()
+                    y_values.clear()
+                elif kind == 'ghost':
+                    artists['ghost'].set_data(msg[1], msg[2])
+                elif kind == 'envelope':
+                    show_envelope(artists['envelopes'], msg[1])
+                elif kind == 'forecast':
+                    set_forecast_data(artists['forecast'], artists['fan'], *msg[1:])
+                elif kind == 'runs':
+                    set_runs_data(artists['runs'], msg[1], msg[2])
+                elif kind == 'stop':
+                    plt.close(fig)
+                    return
+                changed = True
+        except (EOFError, OSError):
+            # Simulator went away
+            plt.close(fig)
+            return
+        if changed:
+            artists['line'].set_data(x_values, y_values)
+
+    ani = FuncAnimation(fig, update, interval=interval_ms, blit=False, cache_frame_data=False)
+    fig.canvas.manager.window.attributes('-fullscreen', False)
+    fig.canvas.draw()
+    plt.show()
+    conn.close()
+
+
+class PlotProcess:
+    """
+    One monitor's figure rendered by its own process.
+
+    The simulator process calls `send_samples` with the samples appended
+    since the last call and `reset` when a run is cleared; the renderer
+    keeps its own copy of the trace. The envelopes of the other demand
+    profiles (`extra_envelopes`) are built up front, so `set_envelope`
+    only switches which one is visible.
+
+    The process is forked (a spawned child would re-run the simulator
+    script), so it must be started before the simulator opens any Tk
+    window or starts its OSC and sender threads.
+    """
+
+    def __init__(self, monitor, envelope, line_label, cpus=None, interval_ms=50,
+                 envelope_key='default', extra_envelopes=None):
+        ctx = multiprocessing.get_context('fork')
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_plot_process_main,
+            args=(child_conn, monitor, envelope, line_label, cpus, interval_ms, envelope_key, extra_envelopes),
+            daemon=True,
+        )
+        # Large messages are written in two parts; keep senders on other threads from interleaving
+        self.lock = Lock()
+
+    def start(self):
+        self.process.start()
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def _send(self, msg):
+        try:
+            with self.lock:
+                self.conn.send(msg)
+        except (BrokenPipeError, EOFError, OSError):
+            pass
+
+    def send_samples(self, x_values, y_values):
+        self._send(('samples', list(x_values), list(y_values)))
+
+    def reset(self):
+        self._send(('reset',))
+
+    def set_ghost(self, x_values, y_values):
+        self._send(('ghost', list(x_values), list(y_values)))
+
+    def set_envelope(self, key):
+        """Show one of the `extra_envelopes` (by profile name)."""
+        self._send(('envelope', key))
+
+    def set_forecast(self, x_values, y_values, fan_values):
+        self._send(('forecast', np.asarray(x_values), np.asarray(y_values), np.asarray(fan_values)))
+
+    def set_runs(self, recent, best):
+        """Earlier runs [(x, y), ...] and the day's best (x, y) or None, behind the production line."""
+        self._send(('runs', [(np.asarray(x), np.asarray(y)) for x, y in recent],
+                    None if best is None else (np.asarray(best[0]), np.asarray(best[1]))))
+
+    def present(self):
+        # The renderer process presents on its own schedule
+        pass
+
+    def stop(self, timeout=2.0):
+        self._send(('stop',))
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
@@ -0,0 +1,260 @@
+"""
+Raster plot backend for the Energiby YderZonen monitors.
+
+A lightweight alternative to matplotlib/TkAgg (--backend raster). The axes,
+grid, tick labels, legend and demand envelope are rasterized once into a
+static NumPy layer; each tick only the new production line segments are drawn
+into the framebuffer, which is then presented fullscreen with OpenCV.
+"""
+
+import cv2
+import numpy as np
+
+from energiby_plots import HOURS_TICKS, HOURS_LABELS
+
+
+# Colours in BGR, matching the matplotlib defaults used by the other backend
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+GRID = (176, 176, 176)
+ENVELOPE = (180, 119, 31)   # matplotlib 'C0'
+GHOST = (150, 110, 80)      # faint line over the envelope
+FORECAST = (70, 70, 70)
+FAN = (140, 120, 100)
+RUN_OLD = (205, 205, 205)   # earlier runs fade from the newest to the oldest
+RUN_NEW = (130, 130, 130)
+BEST = (44, 160, 44)        # matplotlib 'C2'
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+class RasterPlot:
+    """
+    One monitor's power plot rendered directly into a NumPy framebuffer.
+
+    Has the same feeding interface as `PlotProcess` (`send_samples`, `reset`,
+    `set_ghost`, `set_runs`, `set_forecast`, `set_envelope`), plus `present` which shows the framebuffer
+    in its own fullscreen window. The ghost and earlier runs are baked into
+    the static layer. The forecast changes every tick, so it is not drawn
+    into the framebuffer but onto a copy when presenting.
+    """
+
+    def __init__(self, window_name, monitor, envelope, line_label,
+                 x_range=(0.0, 48.0), y_range=(0.0, 70.0), y_ticks=range(0, 71, 10),
+                 envelope_key='default', extra_envelopes=None):
+        self.window_name = window_name
+        self.monitor = monitor
+        self.x_range = x_range
+        self.y_range = y_range
+        self.line_label = line_label
+
+        x, y, width, height = monitor
+        self.width = width
+        self.height = height
+        scale = height / 600.0
+        self.font_scale = 0.5 * scale
+        self.thickness = max(1, int(round(2 * scale)))
+
+        # Plot area inside the margins (labels and ticks go outside)
+        self.left = int(80 * scale)
+        self.right = width - int(20 * scale)
+        self.top = int(20 * scale)
+        self.bottom = height - int(60 * scale)
+
+        # Static layers for every demand profile, rendered up front
+        self.y_ticks = y_ticks
+        self.backgrounds = {envelope_key: self._render_static(envelope, y_ticks)}
+        for key, extra in (extra_envelopes or {}).items():
+            if key not in self.backgrounds:
+                self.backgrounds[key] = self._render_static(extra, y_ticks)
+        self.background = self.backgrounds[envelope_key]
+        self.static = self.background.copy()
+        self.framebuffer = self.static.copy()
+        self.ghost = None
+        self.runs = []      # (pixels, colour, thickness) baked into the static layer
+        self.points = []
+        self.last_point = None
+        self.forecast = None
+        self.display = None
+        self.window_open = False
+        self.dirty = True
+
+    # ---------------------------------------------------------------- helpers
+    def to_pixels(self, x_values, y_values):
+        """Map data coordinates to integer pixel coordinates (N x 2)."""
+        x0, x1 = self.x_range
+        y0, y1 = self.y_range
+        px = self.left + (np.asarray(x_values, dtype=np.float64) - x0) * (self.right - self.left) / (x1 - x0)
+        py = self.bottom - (np.asarray(y_values, dtype=np.float64) - y0) * (self.bottom - self.top) / (y1 - y0)
+        py = np.clip(py, -self.height, 2 * self.height)
+        return np.stack([px, py], axis=-1).round().astype(np.int32)
+
+    def _text(self, img, text, org, anchor="left"):
+        (tw, th), _ = cv2.getTextSize(text, FONT, self.font_scale, 1)
+        x, y = org
+        if anchor == "center":
+            x -= tw // 2
+        elif anchor == "right":
+            x -= tw
+        cv2.putText(img, text, (int(x), int(y + th // 2)), FONT, self.font_scale, BLACK, 1, cv2.LINE_AA)
+
+    def _render_static(self, envelope, y_ticks):
+        """Rasterize everything that does not change during a run."""
+        img = np.full((self.height, self.width, 3), WHITE, dtype=np.uint8)
+        time_vector, need_min_vector, need_max_vector = envelope
+
+        # Demand envelope as one filled polygon
+        upper = self.to_pixels(time_vector, need_max_vector)
+        lower = self.to_pixels(time_vector, need_min_vector)[::-1]
+        cv2.fillPoly(img, [np.concatenate([upper, lower])], ENVELOPE, cv2.LINE_AA)
+
+        # Grid and ticks
+        tick = max(3, int(self.height / 150))
+        for hour, label in zip(HOURS_TICKS, HOURS_LABELS):
+            px = int(self.to_pixels([hour], [self.y_range[0]])[0, 0])
+            cv2.line(img, (px, self.top), (px, self.bottom), GRID, 1)
+            cv2.line(img, (px, self.bottom), (px, self.bottom + tick), BLACK, 1)
+            self._text(img, label, (px, self.bottom + 3 * tick), anchor="center")
+        for value in y_ticks:
+            py = int(self.to_pixels([self.x_range[0]], [value])[0, 1])
+            cv2.line(img, (self.left, py), (self.right, py), GRID, 1)
+            cv2.line(img, (self.left - tick, py), (self.left, py), BLACK, 1)
+            self._text(img, str(value), (self.left - 2 * tick, py), anchor="right")
+
+        # Frame and axis labels
+        cv2.rectangle(img, (self.left, self.top), (self.right, self.bottom), BLACK, 1)
+        self._text(img, 'Time [h]', ((self.left + self.right) // 2, self.bottom + 7 * tick), anchor="center")
+        (tw, th), _ = cv2.getTextSize('Power [MW]', FONT, self.font_scale, 1)
+        label = np.full((th * 2, tw + 4, 3), WHITE, dtype=np.uint8)
+        cv2.putText(label, 'Power [MW]', (2, int(th * 1.5)), FONT, self.font_scale, BLACK, 1, cv2.LINE_AA)
+        label = cv2.rotate(label, cv2.ROTATE_90_COUNTERCLOCKWISE)
+        lx = max(0, self.left // 4 - label.shape[1] // 2)
+        ly = (self.top + self.bottom) // 2 - label.shape[0] // 2
+        img[ly:ly + label.shape[0], lx:lx + label.shape[1]] = label
+
+        # Legend (upper left)
+        row = int(2.2 * tick * 2)
+        lx0 = self.left + 2 * tick
+        ly0 = self.top + 2 * tick
+        entries = ["Behov", self.line_label]
+        text_w = max(cv2.getTextSize(e, FONT, self.font_scale, 1)[0][0] for e in entries)
+        cv2.rectangle(img, (lx0, ly0), (lx0 + text_w + 12 * tick, ly0 + row * len(entries) + tick), WHITE, -1)
+        cv2.rectangle(img, (lx0, ly0), (lx0 + text_w + 12 * tick, ly0 + row * len(entries) + tick), GRID, 1)
+        for i, entry in enumerate(entries):
+            cy = ly0 + row * i + row // 2 + tick // 2
+            if i == 0:
+                cv2.rectangle(img, (lx0 + tick, cy - tick), (lx0 + 7 * tick, cy + tick), ENVELOPE, -1)
+            else:
+                cv2.line(img, (lx0 + tick, cy), (lx0 + 7 * tick, cy), BLACK, self.thickness, cv2.LINE_AA)
+            self._text(img, entry, (lx0 + 9 * tick, cy))
+        return img
+
+    # ------------------------------------------------------ feeding interface
+    def send_samples(self, x_values, y_values):
+        """Draw only the new segments of the production line."""
+        if len(x_values) == 0:
+            return
+        points = self.to_pixels(x_values, y_values)
+        if self.last_point is not None:
+            points = np.concatenate([self.last_point[None, :], points])
+        if len(points) > 1:
+            cv2.polylines(self.framebuffer, [points], False, BLACK, self.thickness, cv2.LINE_AA)
+        self.points.append(points)
+        self.last_point = points[-1]
+        self.dirty = True
+
+    def reset(self):
+        """Restore the static layer for a new run."""
+        np.copyto(self.framebuffer, self.static)
+        self.points = []
+        self.last_point = None
+        self.dirty = True
+
+    def set_ghost(self, x_values, y_values):
+        """Bake a faint reference trace into the static layer (empty to remove it)."""
+        self.ghost = self.to_pixels(x_values, y_values) if len(x_values) > 1 else None
+        self._rebuild_static()
+
+    def set_runs(self, recent, best):
+        """Bake earlier runs [(x, y), ...] (oldest first) and the day's best (x, y) into the static layer."""
+        thin = max(1, self.thickness // 2)
+        self.runs = []
+        for k, (x, y) in enumerate(recent):
+            if len(x) > 1:
+                w = (k + 1) / len(recent)
+                colour = tuple(int(round(o + (n - o) * w)) for o, n in zip(RUN_OLD, RUN_NEW))
+                self.runs.append((self.to_pixels(x, y), colour, thin))
+        if best is not None and len(best[0]) > 1:
+            self.runs.append((self.to_pixels(*best), BEST, self.thickness))
+        self._rebuild_static()
+
+    def set_envelope(self, key, envelope=None):
+        """Switch to the static layer of another demand profile (rendered now if not cached)."""
+        if key not in self.backgrounds:
+            self.backgrounds[key] = self._render_static(envelope, self.y_ticks)
+        self.background = self.backgrounds[key]
+        self._rebuild_static()
+
+    def _rebuild_static(self):
+        np.copyto(self.static, self.background)
+        for pixels, colour, thickness in self.runs:
+            cv2.polylines(self.static, [pixels], False, colour, thickness, cv2.LINE_AA)
+        if self.ghost is not None:
+            cv2.polylines(self.static, [self.ghost], False, GHOST, self.thickness, cv2.LINE_AA)
+        # Redraw the current run on top of the new static layer
+        np.copyto(self.framebuffer, self.static)
+        if self.points:
+            cv2.polylines(self.framebuffer, self.points, False, BLACK, self.thickness, cv2.LINE_AA)
+        self.dirty = True
+
+    def set_forecast(self, x_values, y_values, fan_values):
+        """Overlay a forecast line and its fan (empty `x_values` to remove it)."""
+        if len(x_values) < 2:
+            self.forecast = None
+        else:
+            fan = [self.to_pixels(x_values, row) for row in fan_values]
+            self.forecast = (self.to_pixels(x_values, y_values), fan)
+        self.dirty = True
+
+    # ------------------------------------------------------------ presenting
+    def open_window(self):
+        x, y, width, height = self.monitor
+        cv2.namedWindow(self.window_name, cv2.WINDOW_NORMAL)
+        cv2.moveWindow(self.window_name, x, y)
+        cv2.setWindowProperty(self.window_name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+        self.window_open = True
+
+    def present(self):
+        """Show the framebuffer if anything was drawn since the last call."""
+        if not self.window_open:
+            self.open_window()
+        if self.dirty:
+            frame = self.framebuffer
+            if self.forecast is not None:
+                if self.display is None:
+                    self.display = np.empty_like(self.framebuffer)
+                np.copyto(self.display, self.framebuffer)
+                center, fan = self.forecast
+                cv2.polylines(self.display, fan, False, FAN, 1, cv2.LINE_AA)
+                cv2.polylines(self.display, [center], False, FORECAST, max(1, self.thickness // 2), cv2.LINE_AA)
+                frame = self.display
+            cv2.imshow(self.window_name, frame)
+            self.dirty = False
+
+    def is_alive(self):
+        if not self.window_open:
+            return True
+        try:
+            return cv2.getWindowProperty(self.window_name, cv2.WND_PROP_VISIBLE) >= 1
+        except cv2.error:
+            return False
+
+    def stop(self):
+        if self.window_open:
+            cv2.destroyWindow(self.window_name)
+            self.window_open = False
+
+
+def poll_quit():
+    """Pump the OpenCV window events; True if Q or ESC was pressed."""
+    return (cv2.waitKey(1) & 0xFF) in (ord('q'), 27)
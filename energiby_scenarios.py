@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Difficulty-graded scenario bank for Energiby YderZonen.
+
+Raw `WindGenerator.make_new_vector` draws sometimes give games that cannot be
+kept inside the envelopes, or that need no effort at all. This tool generates
+thousands of seeded wind scenarios on all cores, plays each one with a
+reference policy (the autopilot's feed-forward controls, evaluated for many
+scenarios at once with `BatchEnergyGrid`), drops the trivial and impossible
+tails and sorts the rest into difficulty bands:
+
+    python energiby_scenarios.py --count 4000
+
+The bank is one small `.npz` file: the seeds sorted by difficulty, their
+difficulties and the start offset of each band, so `ScenarioBank.pick` is a
+single index into memory. The game plays a picked scenario with
+`EnergyGrid.reset(seed)`, which draws exactly the wind that was graded; the
+sun profile is deterministic and the demand comes from the active profile.
+"""
+
+import argparse
+import multiprocessing
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from energiby_model import EnergyGrid, WindGenerator, N
+from energiby_batch import BatchEnergyGrid
+from energiby_autopilot import feed_forward_controls, simulate_batch
+from energiby_history import DATA_DIR
+
+
+BANK_PATH = os.path.join(DATA_DIR, 'scenarios.npz')
+DEFAULT_BANDS = ('easy', 'medium', 'hard')
+
+# Fill levels tried by the reference policy; the best one counts
+REFERENCE_FILL_LEVELS = (9.0, 11.0, 13.0)
+
+Scenario = namedtuple("Scenario", "seed difficulty band index")
+
+
+def generate_wind(seed):
+    """The wind vector `EnergyGrid.reset(seed)` draws with a fresh generator."""
+    wind = WindGenerator()
+    np.random.seed(seed)
+    wind.make_new_vector()
+    return wind.vector.copy()
+
+
+_worker_grid = None
+
+
+def _init_worker():
+    global _worker_grid
+    _worker_grid = EnergyGrid()
+    _worker_grid.sun_generator.make_new_vector()
+
+
+def _score_chunk(seeds):
+    """Reference-policy objectives for a chunk of seeds."""
+    grid = _worker_grid
+    wind = np.array([generate_wind(int(seed)) for seed in seeds])
+    renewables = wind + grid.sun_generator.vector
+    air_flow, turbine = feed_forward_controls(grid.requirements, grid.powerplant, renewables)
+
+    # All fill levels in one batch: copy j * len(seeds) + i is scenario i with level j
+    levels = len(REFERENCE_FILL_LEVELS)
+    batch = BatchEnergyGrid(grid, levels * len(seeds), renewables=np.tile(renewables, (levels, 1)))
+    fill_level = np.repeat(REFERENCE_FILL_LEVELS, len(seeds))
+    objective = simulate_batch(batch, 0, np.tile(air_flow, (levels, 1)).T, np.tile(turbine, (levels, 1)).T,
+                               fill_level)[0]
+    return objective.reshape(levels, len(seeds)).max(axis=0)
+
+
+def build_bank(count, seed=0, processes=None, bands=DEFAULT_BANDS, trim=0.05, chunk=64):
+    """Generate and grade `count` scenarios; returns the arrays of the bank file."""
+    seeds = np.random.SeedSequence(seed).generate_state(count)
+    chunks = [seeds[i:i + chunk] for i in range(0, count, chunk)]
+    with multiprocessing.Pool(processes, initializer=_init_worker) as pool:
+        results = pool.map(_score_chunk, chunks)
+    difficulty = -np.concatenate(results)
+
+    # Easiest first; drop the trivial and impossible tails
+    order = np.argsort(difficulty, kind='stable')
+    cut = int(round(trim * count))
+    order = order[cut:count - cut]
+    band_start = np.linspace(0, len(order), len(bands) + 1).round().astype(np.int64)
+    return {
+        'seed': seeds[order].astype(np.uint32),
+        'difficulty': difficulty[order].astype(np.float32),
+        'bands': np.array(bands),
+        'band_start': band_start,
+    }
+
+
+def save_bank(path, bank):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp, **bank)
+    os.replace(tmp, path)
+
+
+class ScenarioBank:
+    """A loaded scenario bank; `pick` is O(1). Raises ValueError for an empty or malformed bank."""
+
+    def __init__(self, path=BANK_PATH):
+        with np.load(path) as data:
+            self.seed = data['seed']
+            self.difficulty = data['difficulty']
+            self.bands = [str(b) for b in data['bands']]
+            self.band_start = data['band_start']
+        if len(self.seed) == 0 or len(self.difficulty) != len(self.seed):
+            raise ValueError("{0} holds no scenarios".format(path))
+        if (len(self.band_start) != len(self.bands) + 1 or self.band_start[0] != 0
+                or self.band_start[-1] != len(self.seed) or np.any(np.diff(self.band_start) < 0)):
+            raise ValueError("{0} has inconsistent band offsets".format(path))
+        self.rng = np.random.default_rng()
+
+    def band_index(self, band):
+        """Band by name or index."""
+        if isinstance(band, str) and not band.isdigit():
+            return self.bands.index(band)
+        return min(max(int(band), 0), len(self.bands) - 1)
+
+    def pick(self, band):
+        """A random scenario from a difficulty band, or from the whole bank if the band is empty."""
+        b = self.band_index(band)
+        lo, hi = self.band_start[b], self.band_start[b + 1]
+        if hi <= lo:
+            lo, hi = 0, len(self.seed)
+        i = int(self.rng.integers(lo, hi))
+        return Scenario(int(self.seed[i]), float(self.difficulty[i]), self.bands[b], i)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a difficulty-graded scenario bank")
+    parser.add_argument("--count", type=int, default=4000, help="Scenarios to generate")
+    parser.add_argument("--seed", type=int, default=0, help="Master seed")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--bands", nargs="+", default=list(DEFAULT_BANDS), help="Difficulty band names, easiest first")
+    parser.add_argument("--trim", type=float, default=0.05,
+                        help="Fraction dropped at each end (trivial/impossible scenarios)")
+    parser.add_argument("--out", default=BANK_PATH, help="Bank file")
+    args = parser.parse_args()
+
+    bank = build_bank(args.count, args.seed, args.processes, args.bands, args.trim)
+    save_bank(args.out, bank)
+    print("Wrote {0} scenarios to {1}".format(len(bank['seed']), args.out))
+    for b, name in enumerate(bank['bands']):
+        lo, hi = bank['band_start'][b], bank['band_start'][b + 1]
+        if hi <= lo:
+            print("  {0:<8}     0 scenarios".format(name))
+            continue
+        print("  {0:<8} {1:5d} scenarios, difficulty {2:7.1f} .. {3:7.1f}".format(
+            name, hi - lo, bank['difficulty'][lo], bank['difficulty'][hi - 1]))
+
+
+if __name__ == "__main__":
+    main()
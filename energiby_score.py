@@ -0,0 +1,143 @@
+"""
+Envelope-compliance scoring for Energiby YderZonen.
+
+`EnvelopeScore` is updated once per simulation tick with the produced
+electricity and heat. It keeps running integrals against the demand envelopes
+(`need_min_vector`/`need_max_vector`), so the live score costs O(1) per tick,
+and stores the per-tick samples in preallocated arrays from which `summary()`
+computes the end-of-run figures with NumPy.
+"""
+
+import numpy as np
+
+
+# Weights of the live score (0..100)
+BAND_WEIGHT = 100.0         # share of time inside both envelopes
+DEVIATION_PENALTY = 0.1     # points per MWh outside an envelope
+EMISSION_PENALTY = 0.5      # points per emission-hour (emission level x hours)
+
+
+def score_value(in_band_fraction, deviation_mwh, emission):
+    """Score of a (full) run from its components; works on NumPy arrays too."""
+    value = (BAND_WEIGHT * in_band_fraction
+             - DEVIATION_PENALTY * deviation_mwh
+             - EMISSION_PENALTY * emission)
+    return np.clip(value, 0.0, BAND_WEIGHT)
+
+
+class EnvelopeScore:
+    """
+    Running score of one run against the electricity and heat envelopes.
+
+    Over- and under-production are integrated in MWh. Wasted fuel is the
+    power plant's share of the overproduction (wind and sun are free), also
+    in MWh. Emissions are the acid and CO levels integrated over time.
+    """
+
+    def __init__(self, requirements, N, dt=0.05):
+        self.requirements = requirements
+        self.N = N
+        self.dt = dt
+        self.trace = {name: np.zeros(N) for name in
+                      ('electricity', 'heat', 'plant_electricity', 'acid', 'CO')}
+        self.reset()
+
+    def reset(self):
+        self.steps = 0
+        self.electricity_over = 0.0
+        self.electricity_under = 0.0
+        self.heat_over = 0.0
+        self.heat_under = 0.0
+        self.electricity_in_band = 0
+        self.heat_in_band = 0
+        self.both_in_band = 0
+        self.acid_total = 0.0
+        self.CO_total = 0.0
+        self.wasted_fuel = 0.0
+
+    def update(self, index, electricity, heat, powerplant):
+        """Add one tick; `electricity` and `heat` are the total productions in MW."""
+        if index >= self.N:
+            return
+        el_req = self.requirements.electricity
+        heat_req = self.requirements.heat
+        dt = self.dt
+        plant_electricity = powerplant.get_electric_power()
+        acid = powerplant.get_acid_emission()
+        CO = powerplant.get_CO_emission()
+
+        el_over = electricity - el_req.need_max_vector[index]
+        el_under = el_req.need_min_vector[index] - electricity
+        heat_over = heat - heat_req.need_max_vector[index]
+        heat_under = heat_req.need_min_vector[index] - heat
+
+        el_ok = True
+        heat_ok = True
+        if el_over > 0:
+            self.electricity_over += el_over * dt
+            self.wasted_fuel += min(el_over, plant_electricity) * dt
+            el_ok = False
+        elif el_under > 0:
+            self.electricity_under += el_under * dt
+            el_ok = False
+        if heat_over > 0:
+            self.heat_over += heat_over * dt
+            self.wasted_fuel += heat_over * dt  # all heat comes from the plant
+            heat_ok = False
+        elif heat_under > 0:
+            self.heat_under += heat_under * dt
+            heat_ok = False
+        self.electricity_in_band += el_ok
+        self.heat_in_band += heat_ok
+        self.both_in_band += el_ok and heat_ok
+        self.acid_total += acid * dt
+        self.CO_total += CO * dt
+
+        trace = self.trace
+        trace['electricity'][index] = electricity
+        trace['heat'][index] = heat
+        trace['plant_electricity'][index] = plant_electricity
+        trace['acid'][index] = acid
+        trace['CO'][index] = CO
+        self.steps = index + 1
+
+    def in_band_fraction(self):
+        return self.both_in_band / self.steps if self.steps else 1.0
+
+    def score(self):
+        """Live score, 0..100; higher is better."""
+        if self.steps == 0:
+            return BAND_WEIGHT
+        # Extrapolate the penalties to a full run so the live value is comparable
+        scale = (self.N - 1) / self.steps
+        deviation = (self.electricity_over + self.electricity_under
+                     + self.heat_over + self.heat_under) * scale
+        emission = (self.acid_total + self.CO_total) * scale
+        return float(score_value(self.in_band_fraction(), deviation, emission))
+
+    def summary(self):
+        """End-of-run figures computed from the stored traces."""
+        n = self.steps
+        dt = self.dt
+        result = {'steps': n, 'hours': n * dt, 'score': self.score()}
+        for name, req in (('electricity', self.requirements.electricity),
+                          ('heat', self.requirements.heat)):
+            produced = self.trace[name][:n]
+            over = np.maximum(produced - req.need_max_vector[:n], 0.0)
+            under = np.maximum(req.need_min_vector[:n] - produced, 0.0)
+            in_band = (over == 0.0) & (under == 0.0)
+            result[name] = {
+                'over_mwh': float(over.sum() * dt),
+                'under_mwh': float(under.sum() * dt),
+                'in_band_pct': float(100.0 * in_band.mean()) if n else 100.0,
+                'max_over_mw': float(over.max()) if n else 0.0,
+                'max_under_mw': float(under.max()) if n else 0.0,
+                'produced_mwh': float(produced.sum() * dt),
+                'needed_mwh': float(req.need_vector[:n].sum() * dt),
+            }
+        el_over = np.maximum(self.trace['electricity'][:n] - self.requirements.electricity.need_max_vector[:n], 0.0)
+        heat_over = result['heat']['over_mwh']
+        result['wasted_fuel_mwh'] = float(np.minimum(el_over, self.trace['plant_electricity'][:n]).sum() * dt + heat_over)
+        result['acid_total'] = float(self.trace['acid'][:n].sum() * dt)
+        result['CO_total'] = float(self.trace['CO'][:n].sum() * dt)
+        return result
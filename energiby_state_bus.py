@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Shared-memory state bus for Energiby YderZonen.
+
+The simulator writes one fixed-size record of plant and grid state per tick
+into a named POSIX shared-memory segment. Local consumers (oven video mixer,
+plot renderers, ...) read it directly, without OSC/UDP serialization.
+
+Consistency is guaranteed with a seqlock: the writer bumps the sequence number
+to an odd value, writes the payload and bumps it to the next even value.
+Readers copy the payload and retry if the sequence was odd or changed while
+copying. Python gives no memory barriers, and on weakly ordered CPUs (the
+Pi's ARM cores) a reader on another core can see the sequence stores out of
+order with the payload, so the record also carries a CRC-32 of the payload
+and readers retry on a mismatch. There is exactly one writer; any number of
+readers.
+"""
+
+import struct
+import time
+import zlib
+from collections import namedtuple
+from multiprocessing import shared_memory
+from typing import Optional
+
+
+DEFAULT_NAME = "energiby_state"
+
+# Payload fields, all stored as float64 in this order
+FIELDS = (
+    "timestamp",            # time.monotonic() of the write (system-wide clock)
+    "index",                # simulation step (0 .. N-1)
+    "run",                  # 1.0 while a game is running
+    "t",                    # simulation time [h]
+    "oven_amount_pct",
+    "storage_pct",
+    "total_power_pct",      # oven power, drives the flame video
+    "electric_power_pct",
+    "heat_power_pct",
+    "electricity_pct",
+    "heat_pct",
+    "oven_temperature_pct",
+    "air_flow",
+    "turbine_pct",
+    "CaCO3_amount",
+    "NaOH_amount",
+    "acid_emission",
+    "CO_emission",
+    "wind_power",           # [MW]
+    "sun_power",            # [MW]
+    "total_electricity",    # [MW]
+    "total_heat",           # [MW]
+    "electricity_need",     # [MW]
+    "heat_need",            # [MW]
+)
+
+GridState = namedtuple("GridState", FIELDS)
+
+_HEADER = struct.Struct("<II")               # seq, CRC-32 of the payload
+_SEQ = struct.Struct("<I")
+_CRC_OFFSET = 4
+_PAYLOAD = struct.Struct("<" + "d" * len(FIELDS))
+SEGMENT_SIZE = _HEADER.size + _PAYLOAD.size
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing segment without handing it to the resource tracker."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always tracks, and would unlink the segment on exit
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+class StateBusWriter:
+    """Single writer side of the state bus; owns (creates and unlinks) the segment."""
+
+    def __init__(self, name: str = DEFAULT_NAME):
+        self.name = name
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=SEGMENT_SIZE)
+        except FileExistsError:
+            # Left behind by a crashed simulator; take it over
+            stale = _attach(name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=SEGMENT_SIZE)
+        self.buf = self.shm.buf
+        self.seq = 0
+        _HEADER.pack_into(self.buf, 0, self.seq, 0)
+
+    def publish(self, **fields):
+        """Write one state record; missing fields are written as 0.0."""
+        fields.setdefault("timestamp", time.monotonic())
+        payload = _PAYLOAD.pack(*[float(fields.get(f, 0.0)) for f in FIELDS])
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        _SEQ.pack_into(self.buf, 0, self.seq)            # odd: write in progress
+        _SEQ.pack_into(self.buf, _CRC_OFFSET, zlib.crc32(payload))
+        self.buf[_HEADER.size:SEGMENT_SIZE] = payload
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        _SEQ.pack_into(self.buf, 0, self.seq)            # even: consistent
+
+    def close(self):
+        """Release and remove the segment."""
+        self.buf = None
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class StateBusReader:
+    """
+    Reader side of the state bus.
+
+    Attaching is lazy, so a reader can be created before the simulator is
+    started; `read()` returns None until the segment exists and has been
+    written at least once. If the sequence number stops changing for
+    `stale_after` seconds the reader re-attaches, which picks up a new
+    segment after the simulator has been restarted.
+    """
+
+    def __init__(self, name: str = DEFAULT_NAME, retry_interval: float = 1.0, stale_after: float = 2.0):
+        self.name = name
+        self.retry_interval = retry_interval
+        self.stale_after = stale_after
+        self.shm = None
+        self._next_attach = 0.0
+        self.last_seq = 0
+        self._last_change = 0.0
+
+    def _ensure_attached(self) -> bool:
+        if self.shm is not None:
+            return True
+        now = time.monotonic()
+        if now < self._next_attach:
+            return False
+        self._next_attach = now + self.retry_interval
+        try:
+            self.shm = _attach(self.name)
+        except FileNotFoundError:
+            return False
+        self._last_change = now
+        return True
+
+    def read(self, max_retries: int = 100) -> Optional[GridState]:
+        """Return the latest consistent state, or None if unavailable."""
+        if not self._ensure_attached():
+            return None
+        buf = self.shm.buf
+        for _ in range(max_retries):
+            seq1, crc = _HEADER.unpack_from(buf, 0)
+            if seq1 & 1:
+                continue
+            payload = bytes(buf[_HEADER.size:SEGMENT_SIZE])
+            seq2 = _SEQ.unpack_from(buf, 0)[0]
+            if seq1 != seq2:
+                continue
+            if seq1 == 0:
+                self._check_stale(seq1)
+                return None
+            if zlib.crc32(payload) != crc:
+                continue  # torn copy that the sequence did not reveal
+            self._check_stale(seq1)
+            return GridState(*_PAYLOAD.unpack(payload))
+        return None
+
+    def _check_stale(self, seq: int):
+        now = time.monotonic()
+        if seq != self.last_seq:
+            self.last_seq = seq
+            self._last_change = now
+        elif now - self._last_change > self.stale_after:
+            # Writer gone or replaced; attach again on the next retry
+            self.close()
+            self._last_change = now
+
+    def close(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
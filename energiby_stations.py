@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Several Energiby player stations served from one process.
+
+    python energiby_stations.py --stations 3 --same-scenario
+
+Every station has its own `EnergyGrid` (scenario, demand, controls), its own
+OSC port pair and its own raster plot windows, but the power plants of all
+stations are stepped together in one `BatchEnergyGrid` call per tick instead
+of one Python object graph each. Station k listens for its control surface on
+`--port + 2k`; its Teensy gets the plant state on `--teensy-port + 2k` (or at
+the k-th `--teensy HOST:PORT`). Stations' plots go to the monitors in turn.
+
+With --same-scenario all stations play the same wind and sun. Start on any
+station while no station is playing starts a new round on all of them: a
+race. During a round, Start only restarts that station on the round's
+scenario, so nobody else's game is interrupted.
+"""
+
+import argparse
+import time
+from threading import Thread
+
+import numpy as np
+
+import energiby_log as log
+from energiby_model import EnergyGrid, N
+from energiby_batch import BatchEnergyGrid, PlantView
+from energiby_score import EnvelopeScore
+from energiby_fanout import StateFanout
+from energiby_plots import get_monitor_info
+
+
+CARRIER_LABELS = {
+    'electricity': "El Produktion",
+    'heat': "Fjernvarme Produktion",
+}
+
+
+class Station:
+    """One player station: its grid, controls, score, outputs and plots."""
+
+    def __init__(self, number, row, batch, teensy, carriers, monitors):
+        self.number = number
+        self.row = row
+        self.batch = batch
+        self.grid = EnergyGrid()
+        self.grid.reset()
+        self.plant = PlantView(batch, row)
+        self.score = EnvelopeScore(self.grid.requirements, N)
+        self.running = False
+        self.index = 0
+        self.commands = []  # applied on the tick thread
+        self.sources = None
+        self.fanout = StateFanout()
+        self.fanout.add(teensy[0], teensy[1], permanent=True)
+
+        from energiby_raster import RasterPlot
+        self.plots = {}
+        for carrier, monitor in zip(carriers, monitors):
+            requirement = getattr(self.grid.requirements, carrier)
+            label = CARRIER_LABELS[carrier]
+            self.plots[carrier] = RasterPlot(
+                "Station {0}: {1}".format(number, label), monitor,
+                (requirement.time_vector, requirement.need_min_vector, requirement.need_max_vector), label)
+
+    # ------------------------------------------------------------ OSC thread
+    def dispatcher(self, fast=False):
+        """An OSC dispatcher for this station's control surface."""
+        from pythonosc import dispatcher as osc_dispatcher
+        powerplant = self.grid.powerplant
+        if fast:
+            from energiby_osc import FastDispatcher
+            dispatcher = FastDispatcher()
+            map_control = dispatcher.map_fast
+        else:
+            dispatcher = osc_dispatcher.Dispatcher()
+            map_control = dispatcher.map
+        # Faders only set the controls; everything touching the plant state waits for the tick
+        map_control("/OvenAirFlow", lambda addr, value: powerplant.set_air_flow(value))
+        map_control("/TurbinePct", lambda addr, value: powerplant.set_turbine_pct(value))
+        map_control("/CaCO3", lambda addr, value: powerplant.set_CaCO3_amount(value))
+        map_control("/NaOH", lambda addr, value: powerplant.set_NaOH_amount(value))
+        map_control("/UseWind", lambda addr, value: self.grid.wind_generator.activate(value))
+        map_control("/UseSun", lambda addr, value: self.grid.sun_generator.activate(value))
+        map_control("/FillOven", lambda addr, value: self.commands.append(('FillButton',)))
+        map_control("/AmountInOven", lambda addr, value: self.commands.append(('AmountInOven', value)))
+        map_control("/cmd", lambda addr, value: self.commands.append((value,)))
+        dispatcher.map("/Subscribe", self._subscribe, needs_reply_address=True)
+        dispatcher.map("/SubscribeBundled", self._subscribe, needs_reply_address=True)
+        dispatcher.map("/Unsubscribe", lambda client_address, addr, port: self.fanout.remove(client_address[0], port),
+                       needs_reply_address=True)
+        dispatcher.set_default_handler(
+            lambda address, *args: log.info("osc_unhandled", station=self.number, address=address, args=args))
+        return dispatcher
+
+    def _subscribe(self, client_address, addr, port, *options):
+        rate = None
+        if options and not isinstance(options[0], str):
+            rate, options = options[0], options[1:]
+        self.fanout.add(client_address[0], port, patterns=options or ("*",), rate=rate,
+                        bundle=addr == "/SubscribeBundled")
+
+    # ----------------------------------------------------------- tick thread
+    def new_game(self, seed=None, running=True):
+        """Reset to a new scenario, score and plots, and start playing unless `running` is False."""
+        self.grid.reset(seed=seed)
+        self.batch.load(self.grid.powerplant.snapshot(), rows=self.row)
+        self.sources = None
+        self.update_renewables()
+        self.score.reset()
+        for plot in self.plots.values():
+            plot.reset()
+        self.index = 0
+        self.running = running
+
+    def stop(self):
+        self.running = False
+
+    def update_renewables(self):
+        """This station's row of the batch's renewable production (after a wind/sun toggle)."""
+        wind, sun = self.grid.wind_generator, self.grid.sun_generator
+        sources = (wind.active, sun.active)
+        if sources != self.sources:
+            self.batch.renewables[self.row] = wind.vector * wind.active + sun.vector * sun.active
+            self.sources = sources
+
+    def fill_oven(self):
+        mask = np.zeros(self.batch.size, dtype=bool)
+        mask[self.row] = True
+        self.batch.fill_oven(mask)
+
+    def record(self, electricity, heat):
+        """Score and plot the tick just computed; returns True when the game is over."""
+        index = self.index
+        self.score.update(index, electricity, heat, self.plant)
+        t = [index * 0.05]
+        if 'electricity' in self.plots:
+            self.plots['electricity'].send_samples(t, [electricity])
+        if 'heat' in self.plots:
+            self.plots['heat'].send_samples(t, [heat])
+        self.index += 1
+        return self.index >= N
+
+    def publish(self, index):
+        """Send the plant state, like `sendElData` in the single-station exhibit."""
+        b, k = self.batch, self.row
+        powerplant = self.grid.powerplant
+        wind, sun = self.grid.wind_generator, self.grid.sun_generator
+        power_pct = b.power[k] / b.power_max
+        self.fanout.publish((
+            ("/OvenAmount", b.oven_amount[k] / b.oven_amount_max),
+            ("/WasteStorage", b.storage_amount[k] / b.storage_amount_max),
+            ("/OvenPower", power_pct),
+            ("/WindPower", wind.get(index) / wind.max),
+            ("/SunPower", sun.get(index) / sun.max),
+            ("/Acid", b.acid[k]),
+            ("/CO", b.CO[k]),
+            ("/ElectricityPct", b.turbine[k]),
+            ("/HeatPct", 1 - b.turbine[k]),
+            ("/PlantElectricPower", power_pct * b.turbine[k]),
+            ("/OvenTemp", power_pct),
+            ("/CaCO3", powerplant.CaCO3_amount),
+            ("/NaOH", powerplant.NaOH_amount),
+            ("/TurbinePct", powerplant.turbine_pct),
+            ("/OvenAirFlow", powerplant.get_air_flow()),
+            ("/Score", self.score.score()),
+            ("/InBand", self.score.in_band_fraction()),
+        ))
+
+    def report(self):
+        summary = self.score.summary()
+        log.info("run_summary", station=self.number, score=round(summary['score'], 1))
+        self.fanout.send("/RunSummary", [
+            summary['score'],
+            summary['electricity']['in_band_pct'],
+            summary['heat']['in_band_pct'],
+            summary['electricity']['over_mwh'],
+            summary['electricity']['under_mwh'],
+            summary['heat']['over_mwh'],
+            summary['heat']['under_mwh'],
+            summary['wasted_fuel_mwh'],
+            summary['acid_total'],
+            summary['CO_total'],
+        ])
+
+
+class StationHost:
+    """All stations, stepped together."""
+
+    def __init__(self, count, teensies, carriers, monitors, same_scenario=False):
+        template = EnergyGrid()
+        self.batch = BatchEnergyGrid(template, count, renewables=np.zeros((count, N)))
+        self.same_scenario = same_scenario
+        self.round_seed = None
+        per_station = len(carriers)
+        self.stations = [
+            Station(k + 1, k, self.batch, teensies[k], carriers,
+                    [monitors[(per_station * k + i) % len(monitors)] for i in range(per_station)])
+            for k in range(count)
+        ]
+        self.ticks = 0
+
+    def start_round(self):
+        """Start every station on the same new scenario."""
+        self.round_seed = int(np.random.SeedSequence().generate_state(1)[0])
+        for station in self.stations:
+            station.new_game(self.round_seed)
+        log.info("round", seed=self.round_seed)
+
+    def scenario_seed(self):
+        """Seed for a station's next game: the round's with --same-scenario, else a new one."""
+        return self.round_seed if self.same_scenario else None
+
+    def apply_commands(self, station):
+        while station.commands:
+            command = station.commands.pop(0)
+            name = command[0]
+            if name == 'StartButton':
+                if self.same_scenario and not any(s.running for s in self.stations):
+                    self.start_round()
+                else:
+                    station.new_game(self.scenario_seed())
+            elif name == 'clear':
+                # As in the single-station exhibit: new scenario, score and plots; playing or not as before
+                station.new_game(self.scenario_seed(), running=station.running)
+            elif name == 'Reset':
+                station.new_game(self.scenario_seed(), running=False)
+            elif name == 'stop':
+                station.stop()
+            elif name == 'run':
+                station.running = True
+            elif name == 'FillButton':
+                station.fill_oven()
+            elif name == 'AmountInOven':
+                self.batch.oven_amount[station.row] = command[1]
+            log.info("osc", station=station.number, command=name)
+        station.update_renewables()
+
+    def tick(self):
+        stations = self.stations
+        for station in stations:
+            self.apply_commands(station)
+        running = np.array([station.running for station in stations])
+        if running.any():
+            index = np.array([min(station.index, N - 1) for station in stations])
+            plants = [station.grid.powerplant for station in stations]
+            electricity, heat = self.batch.step(
+                index,
+                np.array([p.air_flow for p in plants]),
+                np.array([p.turbine_pct for p in plants]),
+                np.array([p.CaCO3_amount for p in plants]),
+                np.array([p.NaOH_amount for p in plants]),
+                mask=running)
+            publish = self.ticks % 2 == 0
+            for k in np.flatnonzero(running):
+                station = stations[k]
+                if station.record(electricity[k], heat[k]):
+                    station.stop()
+                    station.publish(index[k])
+                    station.report()
+                elif publish:
+                    station.publish(index[k])
+        self.ticks += 1
+
+    def plots(self):
+        return [plot for station in self.stations for plot in station.plots.values()]
+
+
+def serve_osc(dispatcher, ip, port, name):
+    from pythonosc import osc_server
+    server = osc_server.BlockingOSCUDPServer((ip, port), dispatcher)
+    Thread(target=server.serve_forever, name=name, daemon=True).start()
+    log.info("osc_serving", address=server.server_address)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Several Energiby stations in one process")
+    parser.add_argument("--stations", type=int, default=2, help="Number of player stations")
+    parser.add_argument("--ip", default="0.0.0.0", help="The ip to listen on")
+    parser.add_argument("--port", type=int, default=7133, help="Control port of station 1 (station k: port + 2k)")
+    parser.add_argument("--teensy", action="append", default=[], metavar="HOST:PORT",
+                        help="Teensy of each station, in order (default 127.0.0.1 on --teensy-port + 2k)")
+    parser.add_argument("--teensy-port", type=int, default=7134)
+    parser.add_argument("--plots", nargs="+", choices=sorted(CARRIER_LABELS), default=["electricity", "heat"],
+                        help="Plot windows per station")
+    parser.add_argument("--same-scenario", action="store_true",
+                        help="All stations play the same scenario; Start while all are idle starts a round on all")
+    parser.add_argument("--fast-osc", action="store_true", help="Use the fast OSC decoder for the controls")
+    parser.add_argument("--log-level", choices=["debug", "info", "warning", "error"], default="info")
+    args = parser.parse_args()
+    log.configure(level=args.log_level)
+
+    teensies = []
+    for k in range(args.stations):
+        if k < len(args.teensy):
+            host, port = args.teensy[k].rsplit(":", 1)
+            teensies.append((host, int(port)))
+        else:
+            teensies.append(("127.0.0.1", args.teensy_port + 2 * k))
+    monitors = get_monitor_info() or [(0, 0, 1024, 600)]
+    log.info("monitors", detected=monitors)
+
+    host = StationHost(args.stations, teensies, args.plots, monitors, args.same_scenario)
+    log.start()
+    for k, station in enumerate(host.stations):
+        serve_osc(station.dispatcher(args.fast_osc), args.ip, args.port + 2 * k, "osc-station-{0}".format(k + 1))
+
+    from energiby_raster import poll_quit
+    plots = host.plots()
+    interval = 0.05
+    next_tick = time.perf_counter()
+    try:
+        while any(plot.is_alive() for plot in plots):
+            host.tick()
+            for plot in plots:
+                plot.present()
+            if poll_quit():
+                break
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.perf_counter()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for plot in plots:
+            plot.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+One supervisor for the exhibit's processes, with CPU placement per component.
+
+    python energiby_supervisor.py                      # simulator and video mixer
+    bash energiby_supervisor_install.sh                # install as the exhibit's service
+    python energiby_supervisor.py --config site.json -- --backend raster
+
+The supervisor starts every component as its own process, places it on
+cores and sets its scheduling from a table that adapts to the detected core
+count, restarts a component within a fraction of a second when it exits,
+and logs the CPU use of every component at a fixed interval. Arguments after
+`--` go to the simulator.
+
+Cores are detected with their topology: the logical CPUs of one physical
+core (SMT siblings) stay together, and on CPUs with cores of different speed
+the slow cores come first. Placement indices count physical cores in that
+order, so the last index is a fast core on any machine.
+
+Roles:
+
+    simulator  energiby_yderzonen.py, with its OSC server threads
+    plots      the simulator's renderer processes (--plot-processes); one
+               core of the role per renderer, in turn
+    mixer      oven_video_display.py
+
+The plan is handed to the simulator in $ENERGIBY_PLACEMENT. Run on its own,
+the simulator computes the same plan and places itself: on the simulator
+cores with --plot-processes, else on the simulator and plots cores. Lowering nice below
+0 or a real-time policy needs CAP_SYS_NICE (or root); without it the setting
+is skipped with a warning.
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import energiby_log as log
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_CONFIG = {
+    # Programs to start, relative to this directory, run with this Python
+    "components": {
+        "simulator": ["energiby_yderzonen.py", "--plot-processes"],
+        "mixer": ["oven_video_display.py"],
+    },
+    # Per role: "nice", and optionally "policy" (other, batch, idle, fifo, rr) with a real-time "priority"
+    "scheduling": {
+        "simulator": {"nice": -5},
+        "mixer": {"nice": -2},
+    },
+    # Physical cores per role (slowest first), by the smallest core count the row is for.
+    # Core 0 takes most interrupts and the desktop, so it is the last one handed out.
+    # On four cores both renderers share core 2, which keeps the simulator without
+    # renderer processes on [2, 3] and leaves the mixer two cores of its own.
+    "placement": {
+        "1": {"simulator": [0], "plots": [0], "mixer": [0]},
+        "2": {"simulator": [1], "plots": [1], "mixer": [0]},
+        "4": {"simulator": [3], "plots": [2], "mixer": [0, 1]},
+        "8": {"simulator": [7], "plots": [5, 6], "mixer": [2, 3, 4]},
+    },
+}
+
+POLICIES = {
+    "other": "SCHED_OTHER",
+    "batch": "SCHED_BATCH",
+    "idle": "SCHED_IDLE",
+    "fifo": "SCHED_FIFO",
+    "rr": "SCHED_RR",
+}
+
+
+def load_config(path=None):
+    """The default config, with the sections of a JSON file merged in by key (null removes a key)."""
+    config = {section: dict(values) for section, values in DEFAULT_CONFIG.items()}
+    if path:
+        with open(path) as f:
+            for section, values in json.load(f).items():
+                merged = config.setdefault(section, {})
+                merged.update(values)
+                for key, value in values.items():
+                    if value is None:
+                        del merged[key]
+    return config
+
+
+def _read_int(path, default):
+    try:
+        with open(path) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return default
+
+
+def detect_cores():
+    """Logical CPUs this process may use, grouped per physical core; slow cores first."""
+    if hasattr(os, "sched_getaffinity"):
+        allowed = sorted(os.sched_getaffinity(0))
+    else:
+        allowed = list(range(os.cpu_count() or 1))
+    groups = {}
+    for cpu in allowed:
+        base = "/sys/devices/system/cpu/cpu{0}/".format(cpu)
+        key = (_read_int(base + "cpu_capacity", 1024),
+               _read_int(base + "topology/physical_package_id", 0),
+               _read_int(base + "topology/core_id", cpu))
+        groups.setdefault(key, []).append(cpu)
+    return [groups[key] for key in sorted(groups)]
+
+
+def plan(config=None, cores=None):
+    """Placement per role: {role: {"cores": [[cpu, ...], ...], "nice": n, ...}}."""
+    config = config or DEFAULT_CONFIG
+    cores = cores or detect_cores()
+    table = config["placement"]
+    fitting = [int(k) for k in table if int(k) <= len(cores)] or [min(int(k) for k in table)]
+    placement = {}
+    for role, indices in table[str(max(fitting))].items():
+        placement[role] = dict(config["scheduling"].get(role, {}),
+                               cores=[cores[i % len(cores)] for i in indices])
+    return placement
+
+
+def current_plan():
+    """The plan handed down by the supervisor, or the default plan for this machine."""
+    handed_down = os.environ.get("ENERGIBY_PLACEMENT")
+    return json.loads(handed_down) if handed_down else plan()
+
+
+def supervised():
+    return "ENERGIBY_PLACEMENT" in os.environ
+
+
+def role_cpus(placement):
+    return sorted({cpu for core in placement.get("cores", []) for cpu in core})
+
+
+def _threads(pid):
+    """Every thread of a process (affinity and nice are per thread on Linux)."""
+    try:
+        return [int(tid) for tid in os.listdir("/proc/{0}/task".format(pid or os.getpid()))]
+    except OSError:
+        return [pid]
+
+
+def apply(name, placement, pid=0):
+    """Put a process (default: this one) on its cores with its scheduling; failures are logged and skipped."""
+    if not placement:
+        return
+    cpus = role_cpus(placement)
+    nice = placement.get("nice")
+    policy = placement.get("policy")
+    for tid in _threads(pid):
+        try:
+            if cpus and hasattr(os, "sched_setaffinity"):
+                os.sched_setaffinity(tid, cpus)
+        except OSError as e:
+            log.warning("placement_failed", component=name, setting="cpus", cpus=cpus, error=e)
+            cpus = None
+        try:
+            if policy:
+                os.sched_setscheduler(tid, getattr(os, POLICIES[policy]),
+                                      os.sched_param(placement.get("priority", 0)))
+        except (AttributeError, OSError) as e:
+            log.warning("placement_failed", component=name, setting="policy", policy=policy, error=e)
+            policy = None
+        try:
+            if nice is not None and (policy or "other") in ("other", "batch"):
+                os.setpriority(os.PRIO_PROCESS, tid, nice)
+        except (AttributeError, OSError) as e:
+            log.warning("placement_failed", component=name, setting="nice", nice=nice, error=e)
+            nice = None
+    log.info("placed", component=name, pid=pid or os.getpid(), cpus=cpus, nice=nice, policy=policy)
+
+
+class Component:
+    """One supervised program: started in its own session, restarted when it exits."""
+
+    MIN_BACKOFF = 0.2   # s before the first restart
+    MAX_BACKOFF = 10.0  # s between restarts of a component that keeps crashing
+    STABLE = 30.0       # s of uptime after which a crash counts as the first again
+
+    def __init__(self, name, command, placement, env):
+        self.name = name
+        self.command = command
+        self.placement = placement
+        self.env = env
+        self.process = None
+        self.started = 0.0
+        self.restarts = 0
+        self.backoff = self.MIN_BACKOFF
+        self.restart_at = 0.0
+        self.cpu_total = None
+
+    def start(self):
+        self.process = subprocess.Popen(self.command, cwd=HERE, env=self.env, start_new_session=True)
+        self.started = time.monotonic()
+        self.cpu_total = None
+        apply(self.name, self.placement, self.process.pid)
+        log.info("started", component=self.name, pid=self.process.pid, restarts=self.restarts)
+
+    def _kill_group(self, sig):
+        try:
+            os.killpg(self.process.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def poll(self, now):
+        """Notice an exit and restart when due."""
+        if self.process is None:
+            if now >= self.restart_at:
+                self.start()
+            return
+        code = self.process.poll()
+        if code is None:
+            return
+        # Renderer and worker processes must not outlive a crashed parent
+        self._kill_group(signal.SIGKILL)
+        uptime = now - self.started
+        if uptime > self.STABLE:
+            self.backoff = self.MIN_BACKOFF
+        self.restart_at = now + self.backoff
+        self.restarts += 1
+        self.process = None
+        log.warning("exited", component=self.name, code=code, uptime=round(uptime, 1),
+                    restart_in=round(self.backoff, 1))
+        self.backoff = min(self.backoff * 2, self.MAX_BACKOFF)
+
+    def stop(self, timeout=5.0):
+        if self.process is None:
+            return
+        self._kill_group(signal.SIGTERM)
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            pass
+        self._kill_group(signal.SIGKILL)
+        self.process.wait()
+        self.process = None
+
+    def cpu_seconds(self, psutil):
+        """CPU seconds used so far by (the component itself, its child processes)."""
+        try:
+            main = psutil.Process(self.process.pid)
+            own = sum(main.cpu_times()[:2])
+            children = 0.0
+            for child in main.children(recursive=True):
+                try:
+                    children += sum(child.cpu_times()[:2])
+                except psutil.Error:
+                    pass
+            return own, children
+        except (psutil.Error, AttributeError):
+            return None
+
+
+class Supervisor:
+    def __init__(self, config, names, simulator_args=(), report_interval=10.0):
+        self.placement = plan(config)
+        self.report_interval = report_interval
+        env = dict(os.environ, ENERGIBY_PLACEMENT=json.dumps(self.placement))
+        self.components = []
+        for name in names:
+            command = [sys.executable] + list(config["components"][name])
+            if name == "simulator":
+                command += list(simulator_args)
+            self.components.append(Component(name, command, self.placement.get(name), env))
+        self.running = False
+        # Only the CPU reports need psutil; the simulator imports this module for its placement
+        try:
+            import psutil
+        except ImportError:
+            psutil = None
+        self.psutil = psutil
+
+    def report(self, elapsed):
+        """Per-component CPU use over the last interval, in % of one core, and the load per core."""
+        fields = {}
+        for component in self.components:
+            if component.process is None:
+                continue
+            total = component.cpu_seconds(self.psutil)
+            if total is None:
+                continue
+            if component.cpu_total is not None:
+                fields[component.name] = round(100 * (total[0] - component.cpu_total[0]) / elapsed, 1)
+                fields[component.name + "_children"] = round(100 * max(total[1] - component.cpu_total[1], 0) / elapsed, 1)
+            component.cpu_total = total
+        if fields:
+            log.info("cpu", cores=self.psutil.cpu_percent(percpu=True), **fields)
+
+    def run(self):
+        log.info("plan", **{role: role_cpus(placement) for role, placement in self.placement.items()})
+        self.running = True
+        if self.psutil is not None:
+            self.psutil.cpu_percent(percpu=True)
+        last_report = time.monotonic()
+        try:
+            while self.running:
+                now = time.monotonic()
+                for component in self.components:
+                    component.poll(now)
+                if self.psutil is not None and now - last_report >= self.report_interval:
+                    self.report(now - last_report)
+                    last_report = now
+                time.sleep(0.05)
+        finally:
+            for component in self.components:
+                component.stop()
+
+    def stop(self, *_):
+        self.running = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Start, place and restart the Energiby processes")
+    parser.add_argument("--config", default=None, help="JSON file overriding components, scheduling or placement")
+    parser.add_argument("--components", nargs="+", default=None,
+                        help="Components to run (default: all in the config)")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="Seconds between CPU reports")
+    parser.add_argument("--show-plan", action="store_true", help="Print the placement for this machine and exit")
+    parser.add_argument("--log-level", choices=["debug", "info", "warning", "error"], default="info")
+    parser.add_argument("simulator_args", nargs="*", help="Arguments for the simulator (after --)")
+    args = parser.parse_args()
+    log.configure(level=args.log_level)
+
+    config = load_config(args.config)
+    if args.show_plan:
+        print(json.dumps({"cores": detect_cores(), "placement": plan(config)}, indent=2))
+        return
+    names = args.components or list(config["components"])
+    for name in names:
+        if name not in config["components"]:
+            parser.error("unknown component {0!r} (have {1})".format(name, ", ".join(config["components"])))
+
+    supervisor = Supervisor(config, names, args.simulator_args, args.report_interval)
+    signal.signal(signal.SIGTERM, supervisor.stop)
+    signal.signal(signal.SIGINT, supervisor.stop)
+    log.start()
+    supervisor.run()
+
+
+if __name__ == "__main__":
+    main()
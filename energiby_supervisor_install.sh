@@ -0,0 +1,7 @@
+#!/bin/bash
+# The supervisor starts the oven video mixer itself; the old standalone unit would start a second one
+sudo systemctl disable --now oven_video_display.service 2>/dev/null
+sudo rm -f "/lib/systemd/system/oven_video_display.service"
+sudo rsync -av "./energiby_supervisor.service" "/lib/systemd/system/"
+sudo systemctl daemon-reload
+sudo systemctl enable energiby_supervisor.service
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Measured wind and solar data for Energiby YderZonen.
+
+A (large, multi-year) CSV of measured production, e.g. Energinet's hourly
+wind and solar production for Denmark, is converted once, in chunks through
+a temporary memory-mapped table, into a memory-mapped binary on the
+simulation's 0.05 h grid:
+
+    python energiby_weather.py data.csv --time-column HourDK \\
+        --wind-column OffshoreWindPower --wind-column OnshoreWindPower \\
+        --sun-column SolarPower
+
+The conversion writes three files next to each other:
+
+    weather.npy        float32 (steps x 2): wind and sun as a fraction of capacity,
+                       NaN where the measurements have gaps
+    weather.json       start time, grid step and source description
+    weather_index.npy  grid offsets of every gap-free 48 h window starting at midnight
+
+`WeatherData` memory-maps the grid, so only the windows actually played are
+read from disk, and picks a random window in O(1) from the index.
+"""
+
+import argparse
+import csv
+import json
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from energiby_model import N
+from energiby_history import DATA_DIR
+
+
+WEATHER_PATH = os.path.join(DATA_DIR, 'weather.npy')
+STEP_HOURS = 0.05
+STEPS_PER_DAY = int(round(24 / STEP_HOURS))
+
+EPOCH = datetime(1970, 1, 1)
+
+Window = namedtuple("Window", "start wind sun offset")
+
+
+def _paths(path):
+    base = path[:-4] if path.endswith('.npy') else path
+    return base + '.npy', base + '.json', base + '_index.npy'
+
+
+def _parse_time(value):
+    """Hours since the epoch of a naive local timestamp (ISO 8601) or a number of seconds."""
+    try:
+        return float(value) / 3600.0
+    except ValueError:
+        pass
+    value = value.strip().replace('Z', '')
+    moment = datetime.fromisoformat(value.replace(' ', 'T'))
+    return (moment.replace(tzinfo=None) - EPOCH).total_seconds() / 3600.0
+
+
+def _read_csv(csv_path, rows_path, time_column, wind_columns, sun_columns, delimiter, chunk=1 << 16):
+    """Convert the CSV in chunks into a memory-mapped float64 table (hours, wind, sun), sorted by time."""
+    with open(csv_path, newline='') as f, open(rows_path, 'wb') as out:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader, [])
+        try:
+            t_col = header.index(time_column)
+            w_cols = [header.index(c) for c in wind_columns]
+            s_cols = [header.index(c) for c in sun_columns]
+        except ValueError:
+            raise ValueError("{0} lacks one of the columns {1}".format(
+                csv_path, ", ".join([time_column] + list(wind_columns) + list(sun_columns))))
+        buf = np.empty((chunk, 3))
+        n = 0
+        for row in reader:
+            try:
+                buf[n] = (_parse_time(row[t_col]),
+                          sum(float(row[c].replace(',', '.')) for c in w_cols),
+                          sum(float(row[c].replace(',', '.')) for c in s_cols))
+            except (ValueError, IndexError):
+                continue  # missing values are gaps
+            n += 1
+            if n == chunk:
+                buf.tofile(out)
+                n = 0
+        buf[:n].tofile(out)
+    if os.path.getsize(rows_path) == 0:
+        return np.empty((0, 3))
+    rows = np.memmap(rows_path, dtype=np.float64, mode='r+').reshape(-1, 3)
+    # Exports are normally in order already; only sort when they are not
+    if np.any(rows[1:, 0] < rows[:-1, 0]):
+        rows[:] = rows[np.argsort(rows[:, 0], kind='stable')]
+    return rows
+
+
+def convert(csv_path, out_path, time_column, wind_columns, sun_columns,
+            wind_capacity=None, sun_capacity=None, max_gap=2.0, delimiter=',', chunk=1 << 20):
+    """Resample a measurement CSV onto the 0.05 h grid and build the window index."""
+    data_path, meta_path, index_path = _paths(out_path)
+    os.makedirs(os.path.dirname(data_path) or '.', exist_ok=True)
+    rows_path = data_path + '.rows.tmp'
+    try:
+        rows = _read_csv(csv_path, rows_path, time_column, wind_columns, sun_columns, delimiter)
+        return _resample(rows, csv_path, data_path, meta_path, index_path, wind_columns, sun_columns,
+                         wind_capacity, sun_capacity, max_gap, chunk)
+    finally:
+        if os.path.exists(rows_path):
+            os.remove(rows_path)
+
+
+def _resample(rows, csv_path, data_path, meta_path, index_path, wind_columns, sun_columns,
+              wind_capacity, sun_capacity, max_gap, chunk):
+    if len(rows) < 2:
+        raise ValueError("no usable rows in {0}".format(csv_path))
+    hours, wind, sun = rows[:, 0], rows[:, 1], rows[:, 2]
+    wind_capacity = wind_capacity or float(wind.max()) or 1.0
+    sun_capacity = sun_capacity or float(sun.max()) or 1.0
+
+    # Grid from the first midnight at or after the first sample
+    start = np.ceil(hours[0] / 24.0) * 24.0
+    steps = int((hours[-1] - start) / STEP_HOURS) + 1
+    grid = np.lib.format.open_memmap(data_path + '.tmp', mode='w+', dtype=np.float32, shape=(steps, 2))
+    bad = np.zeros(steps, dtype=bool)
+    for lo in range(0, steps, chunk):
+        t = start + STEP_HOURS * np.arange(lo, min(lo + chunk, steps))
+        grid[lo:lo + len(t), 0] = np.interp(t, hours, wind) / wind_capacity
+        grid[lo:lo + len(t), 1] = np.interp(t, hours, sun) / sun_capacity
+        # Grid points between samples further apart than max_gap are gaps
+        right = np.clip(np.searchsorted(hours, t), 1, len(hours) - 1)
+        bad[lo:lo + len(t)] = (hours[right] - hours[right - 1]) > max_gap
+    grid[bad] = np.nan
+    grid.flush()
+    del grid
+    os.replace(data_path + '.tmp', data_path)
+
+    # Gap-free N-step windows starting at midnight
+    bad_count = np.concatenate([[0], np.cumsum(bad)])
+    starts = np.arange(0, steps - N + 1, STEPS_PER_DAY)
+    starts = starts[bad_count[starts + N] == bad_count[starts]]
+    np.save(index_path, starts.astype(np.int64))
+
+    meta = {
+        'start_hours': float(start),
+        'start': (EPOCH + timedelta(hours=float(start))).isoformat(),
+        'step_hours': STEP_HOURS,
+        'steps': steps,
+        'source': os.path.basename(csv_path),
+        'wind_columns': list(wind_columns),
+        'sun_columns': list(sun_columns),
+        'wind_capacity': wind_capacity,
+        'sun_capacity': sun_capacity,
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta, len(starts)
+
+
+class WeatherData:
+    """Memory-mapped measured weather; `pick` returns a random 48 h window in O(1)."""
+
+    def __init__(self, path=WEATHER_PATH):
+        data_path, meta_path, index_path = _paths(path)
+        with open(meta_path) as f:
+            self.meta = json.load(f)
+        self.grid = np.load(data_path, mmap_mode='r')
+        self.starts = np.load(index_path)
+        if len(self.starts) == 0:
+            raise ValueError("no gap-free 48 h windows in {0}".format(data_path))
+        self.rng = np.random.default_rng()
+
+    def window(self, offset):
+        """Wind and sun (fractions of capacity) for the N steps from grid `offset`."""
+        rows = np.asarray(self.grid[offset:offset + N], dtype=np.float64)
+        start = EPOCH + timedelta(hours=self.meta['start_hours'] + offset * STEP_HOURS)
+        return Window(start, rows[:, 0], rows[:, 1], offset)
+
+    def pick(self):
+        return self.window(int(self.starts[self.rng.integers(len(self.starts))]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert measured wind/solar production to the weather grid")
+    parser.add_argument("csv", help="Measurement CSV (one row per sample)")
+    parser.add_argument("--time-column", required=True, help="Timestamp column (ISO 8601 local time or epoch seconds)")
+    parser.add_argument("--wind-column", action="append", required=True, help="Wind column(s), summed")
+    parser.add_argument("--sun-column", action="append", required=True, help="Solar column(s), summed")
+    parser.add_argument("--wind-capacity", type=float, help="Wind normalization (default: series maximum)")
+    parser.add_argument("--sun-capacity", type=float, help="Solar normalization (default: series maximum)")
+    parser.add_argument("--max-gap", type=float, default=2.0, help="Longest interpolated gap [h]")
+    parser.add_argument("--delimiter", default=",")
+    parser.add_argument("--out", default=WEATHER_PATH)
+    args = parser.parse_args()
+
+    meta, windows = convert(args.csv, args.out, args.time_column, args.wind_column, args.sun_column,
+                            args.wind_capacity, args.sun_capacity, args.max_gap, args.delimiter)
+    print("Wrote {0} steps from {1} ({2} playable 48 h windows) to {3}".format(
+        meta['steps'], meta['start'], windows, args.out))
+
+
+if __name__ == "__main__":
+    main()
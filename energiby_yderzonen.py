@@ -1,123 +1,160 @@
-import argparse
-import subprocess
-import re
 import time
-import matplotlib
-matplotlib.use('TkAgg')  # Use TkAgg backend for window management
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
+STARTUP_T0 = time.perf_counter()  # Startup-time measurement starts before the imports
+
+import argparse
 import numpy as np
-import numpy.matlib
 
 import math
-from pythonosc import dispatcher
-from pythonosc import osc_server
-from pythonosc import udp_client
 from threading import Thread, Lock
 from concurrent.futures import ThreadPoolExecutor
 import os
-
-from pprint import pprint
-import urllib.request
+import atexit
 
 import json
-from scipy.interpolate import interp1d
+import sqlite3
+
+import energiby_log as log
+import energiby_supervisor
+from energiby_model import (OnePole, EnergyRequirement, EnergyRequirements, WindGenerator, SunGenerator,
+                            PowerPlant, EnergyGrid, default_mw_needed, N, timeOfDay, CACHE_DIR,
+                            load_profiles, PROFILE_DIR)
+from energiby_state_bus import StateBusWriter
+from energiby_score import EnvelopeScore
+from energiby_history import RunRecorder, RunHistory, RecentRuns, HISTORY_DIR
+from energiby_autopilot import AutopilotProcess
+from energiby_forecast import ForecastProcess
+from energiby_scenarios import ScenarioBank, BANK_PATH
+from energiby_weather import WeatherData, WEATHER_PATH
+from energiby_fanout import StateFanout, BROADCAST_PORT
+from energiby_plots import (configure_matplotlib, create_plot_on_monitor, setup_power_axes, setup_forecast_artists,
+                            set_forecast_data, setup_runs_artist, set_runs_data, cache_envelopes, show_envelope,
+                            PlotProcess, get_monitor_info)
+
+# ==================== STARTUP TIMING ====================
+startup_marks = []
+
+def markStartup(label):
+    """Record how long startup has taken up to this point"""
+    startup_marks.append((label, time.perf_counter() - STARTUP_T0))
+
+def reportStartup():
+    log.info("startup", **{label.replace(' ', '_'): round(t, 2) for label, t in startup_marks})
+
+markStartup("imports")
 
 # ==================== RASPBERRY PI OPTIMIZATION ====================
 # Optimize matplotlib rendering and system performance
 os.environ['MPLBACKEND'] = 'TkAgg'
 
-# Try to set CPU affinity to use specific cores (RPi 5 has 4 cores)
-try:
-    import psutil
-    process = psutil.Process()
-    # Use cores 2 and 3, leaving 0-1 for system/rendering
-    process.cpu_affinity([2, 3])
-except ImportError:
-    pass
-
-# Reduce matplotlib memory usage and improve rendering
-plt.rcParams['figure.max_open_warning'] = 0
-plt.rcParams['lines.linewidth'] = 2
-#plt.rcParams['lines.antialiased'] = False  # Disable antialiasing for speed
-#plt.rcParams['patch.antialiased'] = False
-#plt.style.use('fivethirtyeight')
-plt.rcParams['toolbar'] = 'None'
-plt.rcParams['figure.dpi'] = 96  # Standard DPI for RPi displays
-plt.rcParams['font.size'] = 9
 # ===================================================================
 
+parser = argparse.ArgumentParser()
+parser.add_argument("--ip", default="0.0.0.0", help="The ip to listen on")
+parser.add_argument("--port", type=int, default=7133, help="The port to listen on")
+parser.add_argument("--teensy-ip", default="127.0.0.1", help="Where the Teensy listens for the plant state")
+parser.add_argument("--teensy-port", type=int, default=7134, help="The Teensy's OSC port")
+parser.add_argument("--subscriber", action="append", default=[], metavar="HOST:PORT",
+                    help="Another permanent output for the plant state (tablets can also /Subscribe over OSC)")
+parser.add_argument("--broadcast", action="store_true",
+                    help="Also broadcast the plant state to port {0}".format(BROADCAST_PORT))
+parser.add_argument("--plot-processes", action="store_true",
+                    help="Render each monitor's figure in its own process, fed over a pipe")
+parser.add_argument("--backend", choices=["matplotlib", "raster"], default="matplotlib",
+                    help="Plot backend: matplotlib/TkAgg or the NumPy/OpenCV raster renderer")
+parser.add_argument("--autopilot", action="store_true",
+                    help="Unattended demo mode: the autopilot plays run after run")
+parser.add_argument("--expert-ghost", action="store_true",
+                    help="Show the autopilot's planned production as a faint reference trace")
+parser.add_argument("--past-runs", type=int, default=0, metavar="K",
+                    help="Show the last K completed runs faintly behind the live line")
+parser.add_argument("--best-run", action="store_true", help="Show the day's best run behind the live line")
+parser.add_argument("--forecast", action="store_true",
+                    help="Overlay a forecast of the next hours under the current controls and a fan of alternatives")
+scenario_source = parser.add_mutually_exclusive_group()
+scenario_source.add_argument("--scenario-bank", nargs="?", const=BANK_PATH, default=None,
+                             help="Draw scenarios from a bank made with energiby_scenarios.py (default path if no file given)")
+scenario_source.add_argument("--weather", nargs="?", const=WEATHER_PATH, default=None,
+                             help="Play measured wind/sun from energiby_weather.py data (default path if no file given)")
+parser.add_argument("--difficulty", default="medium",
+                    help="Difficulty band used with --scenario-bank (name or index; OSC /Difficulty)")
+parser.add_argument("--profiles", default=PROFILE_DIR,
+                    help="Directory of demand profiles (OSC /ElectricityProfile and /HeatProfile switch between them)")
+parser.add_argument("--fast-osc", action="store_true",
+                    help="Decode the fixed control addresses without python-osc's generic parser, on one server thread")
+parser.add_argument("--log-level", choices=["debug", "info", "warning", "error"], default="info",
+                    help="Least severe log records written (debug includes every wind sample)")
+parser.add_argument("--log-json", action="store_true", help="Write log records as JSON lines")
+parser.add_argument("--history-dir", default=HISTORY_DIR,
+                    help="Where completed runs are stored (empty to disable the run history)")
+args = parser.parse_args()
 
-# Functions to handle the monitor information and plotting on multiple monitors
-def get_monitor_info():
-    """Get monitor positions and sizes using xrandr."""
-    result = subprocess.run(['xrandr'], capture_output=True, text=True)
-    output = result.stdout
-    monitors = []
-    for line in output.split('\n'):
-        if ' connected ' in line and 'primary' in line:  # Primary monitor first
-            match = re.search(r'(\d+)x(\d+)\+(\d+)\+(\d+)', line)
-            if match:
-                width, height, x, y = map(int, match.groups())
-                monitors.append((x, y, width, height))
-        elif ' connected ' in line and 'primary' not in line:
-            match = re.search(r'(\d+)x(\d+)\+(\d+)\+(\d+)', line)
-            if match:
-                width, height, x, y = map(int, match.groups())
-                monitors.append((x, y, width, height))
-    return monitors
-
-def create_plot_on_monitor(monitor, plot_func):
-    """Create a matplotlib figure positioned on the specified monitor."""
-    x, y, width, height = monitor
-    width = int(width * 0.5)  # Use 90% of the monitor width
-    height = int(height * 0.5)  # Use 90% of the monitor height
-    fig = plt.figure(figsize=(width/100, height/100), dpi=96)  # Lower DPI for performance
-    # Disable toolbar and enable fast rendering
-    # fig.canvas.set_window_title('')
-    plot_func(fig)
-    # Position the window
-    fig.canvas.manager.window.geometry(f"{width}x{height}+{x}+{y}")
-    fig.canvas.manager.window.deiconify()  # Make the window visible
-    fig.canvas.manager.window.update()  # Update the window to apply position
-    # Enable faster rendering mode
-    fig.patch.set_animated(True)
-    return fig
-
-
-monitors = get_monitor_info()
-print("Detected monitors:", monitors)
+# CPU placement by core count (see energiby_supervisor.py); under the supervisor it is already applied.
+# Without renderer processes the figures are drawn here, so the plot cores are ours too.
+placement = energiby_supervisor.current_plan()
+if not energiby_supervisor.supervised():
+    roles = ["simulator"] if args.plot_processes else ["simulator", "plots"]
+    energiby_supervisor.apply("simulator", {"cores": [core for role in roles
+                                                      for core in placement.get(role, {}).get("cores", [])]})
+
+log.configure(level=args.log_level, as_json=args.log_json)
+# Fader sweeps arrive at tens of messages per second; a trace of them is enough
+log.limit("/OvenAirFlow", per_second=2)
+log.limit("/AmountInOven", per_second=2)
+log.limit("osc_unhandled", per_second=5)
+
+# Heavy GUI modules are only imported by the backend that uses them
+if args.backend == "matplotlib" and not args.plot_processes:
+    import matplotlib
+    matplotlib.use('TkAgg')  # Use TkAgg backend for window management
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation
+
+    # Reduce matplotlib memory usage and improve rendering
+    configure_matplotlib(plt)
+markStartup("gui imports")
+
+
+# Monitor layout and window layouts from the last start, refreshed after the first frame
+STARTUP_CACHE = os.path.join(CACHE_DIR, 'startup.json')
+
+def loadStartupCache():
+    try:
+        with open(STARTUP_CACHE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def saveStartupCache():
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = STARTUP_CACHE + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(startup_cache, f)
+        os.replace(tmp, STARTUP_CACHE)
+    except OSError as e:
+        log.warning("startup_cache_not_written", error=e)
+
+def refreshMonitorCache():
+    """Re-detect the monitors in the background and cache them for the next start"""
+    detected = [list(m) for m in get_monitor_info()]
+    if detected and detected != startup_cache.get('monitors'):
+        if startup_cache.get('monitors'):
+            log.info("monitor_layout_changed", monitors=detected, note="takes effect on next start")
+        startup_cache['monitors'] = detected
+    saveStartupCache()
+
+startup_cache = loadStartupCache()
+if startup_cache.get('monitors'):
+    monitors = [tuple(m) for m in startup_cache['monitors']]
+else:
+    monitors = get_monitor_info()
+    startup_cache['monitors'] = [list(m) for m in monitors]
+log.info("monitors", detected=monitors)
+markStartup("monitors")
 if len(monitors) < 2:
-    print("Need at least two monitors connected.")
+    log.error("monitors", message="Need at least two monitors connected")
     # exit(1)
 
-# ==================== LOWPASS FILTER====================
-class OnePole:
-    def __init__(self, alpha, initial_value):
-        self.alpha = alpha
-        self.value = initial_value
-
-    def set_alpha(self, alpha):
-        self.alpha = alpha
-    
-    def update(self, new_value):
-        self.value = new_value * self.alpha + self.value * (1 - self.alpha)
-        return self.value
-    
-    def update_alpha(self, new_value, alpha):
-        self.value = new_value * alpha + self.value * (1 - alpha)
-        return self.value
-    
-    def reset(self, initial_value):
-        self.value = initial_value
-        return self.value
-
-    def get(self):
-        return self.value
-
-
-
-
 # Data synchronization for multi-threaded rendering
 data_lock = Lock()
 rendering_queue = {'x': [], 'y': [], 'v': []}
@@ -125,84 +162,12 @@ rendering_queue = {'x': [], 'y': [], 'v': []}
 # Thread pool for parallel calculations
 executor = ThreadPoolExecutor(max_workers=3)
 
-oscSenderTeensy = udp_client.SimpleUDPClient("127.0.0.1",7134)
+# Created by startOsc() once the first frame is on screen
+state_fanout = None
 
 # Variables used for the live plot
 global x_values, el_plot_values, index, run, t, td
 
-# Data about the energy requirements
-
-class EnergyRequirement:
-    """Encapsulate a demand profile and derived curves.
-
-    An instance holds an hourly baseline vector and produces the
-    interpolated/filtered curves that the rest of the application uses.
-
-    Two separate objects are created below: one for electricity and one
-    for heat.  The setter method allows the profile to be changed at
-    runtime.
-    """
-
-    def __init__(self, mw_needed, N=961, offset=0.0, uncertainty=7.0, alpha=0.02):
-        self.hours_vector = np.linspace(0, 48, 49, True)
-        self.N = N
-        self.set_mw_needed(mw_needed, offset, uncertainty, alpha)
-
-    def set_mw_needed(self, mw_needed, offset=0.0, uncertainty=7.0, alpha=0.02):
-        """Assign a new hourly demand pattern and recompute all curves."""
-        self.offset = offset
-        self.uncertainty = uncertainty
-        self.alpha = alpha
-
-        self.mw_needed = np.array(mw_needed) + offset
-        self.time_vector = np.zeros(self.N)
-        self.need_vector = np.full(self.N, self.mw_needed.mean())
-        self.need_min_vector = np.zeros(self.N)
-        self.need_max_vector = np.zeros(self.N)
-
-        last_need = self.mw_needed[0]
-        spline = interp1d(self.hours_vector, self.mw_needed, kind='cubic')
-        for x in range(self.N):
-            t = 0.05 * x
-            last_need = spline(t) * self.alpha + last_need * (1.0 - self.alpha)
-            self.need_vector[x] = last_need
-            self.need_min_vector[x] = last_need - self.uncertainty
-            self.need_max_vector[x] = last_need + self.uncertainty
-            self.time_vector[x] = t
-
-# default hourly demand curve used for both electricity and heat
-default_mw_needed = [
-    24.0, 26.0, 27.0, 28.5, 32.5, 37.0, 39.0, 41.0, 40.0, 37.0, 32.0, 27.0,
-    21.0, 17.0, 16.0, 12.0, 18.0, 23.0, 29.0, 32.0, 26.0, 20.0, 16.0, 20.0,
-    22.0, 25.0, 27.0, 29.0, 33.0, 38.0, 40.0, 40.0, 39.0, 37.0, 32.0, 27.0,
-    21.0, 17.0, 16.0, 12.0, 18.0, 23.0, 29.0, 32.0, 26.0, 20.0, 18.0, 20.0,
-    24.0,
-]
-
-# Number of time steps in the simulation (48 hours with 0.05 hour time steps)
-N = 961
-
-# instantiate requirement object; electricity and heat profiles can be changed independently
-class EnergyRequirements:
-    def __init__(self):
-        # Set default curves for both electricity and heat; they can be changed independently at runtime using the set_mw_needed method
-        self.electricity = EnergyRequirement(default_mw_needed, N=N, uncertainty=9.0, alpha=0.020, offset= 5.0)
-        self.heat        = EnergyRequirement(default_mw_needed, N=N, uncertainty=7.0, alpha=0.005, offset=-4.0)
-
-    def get_total_need_vector(self):
-        return self.electricity.need_vector + self.heat.need_vector
-
-    def get_total_need_at(self, index):
-        return self.electricity.need_vector[index] + self.heat.need_vector[index]
-
-
-
-def timeOfDay(t):
-    while(t > 24.0):
-        t -= 24.0
-    return t
-
-
 x_values = []
 el_plot_values = []
 b_values = []
@@ -213,368 +178,406 @@ run = 0
 t = 0  # Time in hours
 td = 0 # Time of day in hours (0-24)
 
-# ------------------------------------------------------------------------------------------- #
-# ---------------------------------- Wind Generator ----------------------------------------- #
-# ------------------------------------------------------------------------------------------- #
-class WindGenerator:
-    def __init__(self):
-        self.max = 35.0  # Max Wind Power in MW
-        self.n = 0
-        self.N = 15
-        self.mean = 20.0
-        self.sd = 15.0
-        self.f1 = OnePole(0.10, self.mean)
-        self.f2 = OnePole(0.01, self.mean)
-        self.power = self.mean
-        self.tmp = self.mean
-        self.vector = np.zeros(N)
-        self.active = True
-
-    def activate(self, active):
-        self.active = active
-    
-    def calculate(self):
-        if self.n >= self.N:
-            self.tmp = np.random.normal(self.mean, self.sd)
-            print(self.tmp)
-            self.n = 0
-        else:
-            self.n = self.n + 1
-
-        self.f1.update(self.tmp)
-        self.f2.update(self.f1.get())
-        self.power = max(self.f2.get(), 0)
-        return self.power
-    
-    def make_new_vector(self):
-        # Reset Wind
-        self.mean = np.random.normal(10.0, 10.0)
-        if self.mean < 0:
-            self.mean = 0
-        self.sd = abs(np.random.normal(0.0, 15.0))
-        
-        self.f1.reset(self.mean)
-        self.f2.reset(self.mean)
-        self.power = self.mean
-        self.tmp = self.mean
-        for x in range(N):
-            self.vector[x] = self.calculate()
-
-    def get(self, index):
-        if self.active:
-            return self.vector[index]
-        else:
-            return 0.0
-
-# ------------------------------------------------------------------------------------------- #
-# ---------------------------------- Sun Generator ------------------------------------------ #
-# ------------------------------------------------------------------------------------------- #
-class SunGenerator:
-    def __init__(self):
-        # use the current average electricity demand for scaling
-        self.max = 0.07 * 35 # Max Solar Power in MW, scaled to be a fraction of the average electricity demand
-        self.f1 = OnePole(0.1, 0.0)
-        self.f2 = OnePole(0.1, self.f1.get())
-        self.power = 0.0
-        self.vector = np.zeros(N)
-        self.active = True
-    
-    def activate(self, active):
-        self.active = active
-
-    def calculate(self, td):
-        sol = 0.0
-        sol_alpha = 0.1
-        if td > 5 and td < 13:
-            sol = self.max
-        else:
-            sol = 0.0
-            sol_alpha = 0.05
-        
-        # Two stage lowpass filter to create a smoother curve
-        sol = self.f1.update_alpha(sol, sol_alpha)
-        sol = self.f2.update_alpha(sol, sol_alpha)
-
-        self.power = sol
-        
-        return self.power
-    
-    def make_new_vector(self):
-        self.__init__()  # Reset the sun generator to create a new sun profile
-        for x in range(N):
-            td = timeOfDay(0.05 * x)
-            self.vector[x] = self.calculate(td)
-
-    def get(self, index):
-        if self.active:
-            return self.vector[index]
-        else:
-            return 0.0
-
-
-# ------------------------------------------------------------------------------------------- #
-# ---------------------------------- PowerPlant --------------------------------------------- #
-# ------------------------------------------------------------------------------------------- #
-class PowerPlant:
-    def __init__(self, requirements):
-        # Ref to requirements for scaling power output and emissions
-        self.requirements = requirements
-        # Parameters related to the storage of burnable waste
-        self.storage_amount_max = 64.0
-        self.storage_amount = self.storage_amount_max
-        # oven state
-        self.oven_amount_initial = 13.0
-        self.oven_amount = self.oven_amount_initial
-        self.oven_amount_max = 26.0
-        self.oven_amount_ok_min = 8.0
-        self.oven_amount_ok_max = 18.0
-        self.oven_amount_to_fill = 4.0
-        self.oven_consumption_rate = 0.3
-        # Air flow state
-        self.air_flow = 0.5
-
-        # power generation state
-        self.power_max = 60  # MW
-        self.alpha_up = 0.008
-        self.alpha_down = 0.004
-        self.alpha_empty = 0.01
-        # initialise filter using the current electricity requirement baseline
-        self.power_filter = OnePole(0.1, self.requirements.get_total_need_at(0))
-        self.v1 = 0.0
-
-        # Turbine amount, i.e. the percentage of power that is converted to electricity
-        self.turbine_pct = 0.3
-        self.turbine_pct_filter = OnePole(0.1, self.turbine_pct)
-
-        # Emission
-        self.CaCO3_amount = 0.0
-        self.NaOH_amount = 0.0
-        self.acid_emission = OnePole(0.05, 0.0)
-        self.CO_emission = OnePole(0.05, 0.0)
-
-    def get_storage_pct(self):
-        return self.storage_amount / self.storage_amount_max
-    
-    def get_oven_pct(self):
-        return self.oven_amount / self.oven_amount_max
-    
-    def set_air_flow(self, air_flow):
-        self.air_flow = air_flow
-
-    def get_air_flow(self):
-        return self.air_flow
-
-    def set_turbine_pct(self, pct):
-        self.turbine_pct = pct
-        
-    def get_electricity_pct(self):
-        return self.turbine_pct_filter.get()
-    
-    def get_heat_pct(self):
-        return 1 - self.turbine_pct_filter.get()
-
-    def get_electric_power(self):
-        return self.power_filter.get() * self.get_electricity_pct()
-    
-    def get_electric_power_pct(self):
-        return self.get_electric_power() / self.power_max
-
-    def get_heat_power(self):
-        return self.power_filter.get() * self.get_heat_pct()
-
-    def get_heat_power_pct(self):
-        return self.get_heat_power() / self.power_max
-    
-    def get_total_power(self):
-        return self.power_filter.get()
-    
-    def get_total_power_pct(self):
-        return self.power_filter.get() / self.power_max
-    
-    def get_oven_temperature(self):
-        return 800.0 * self.get_total_power_pct()
-    
-    def get_oven_temperature_pct(self):
-        return self.get_total_power_pct()
-    
-    def get_lambda(self):
-        if self.oven_amount > 0:
-            return self.air_flow / self.get_oven_pct()
-        else:
-            return 1.0
-
-    def set_CaCO3_amount(self, amount):
-        self.CaCO3_amount = amount
-
-    def set_NaOH_amount(self, amount):
-        self.NaOH_amount = amount
-
-    def get_acid_emission(self):
-        return self.acid_emission.get()
-        
-    def get_CO_emission(self):
-        return self.CO_emission.get()
-    
-    def fill_oven(self):
-        space = self.oven_amount_max - self.oven_amount
-        if self.storage_amount >= self.oven_amount_to_fill and space >= self.oven_amount_to_fill:
-            self.oven_amount += self.oven_amount_to_fill
-            self.storage_amount -= self.oven_amount_to_fill
-        elif space >= self.oven_amount_to_fill:
-            self.oven_amount += self.storage_amount
-            self.storage_amount = 0
-    
-    def calculate_acid_emission(self):
-        # Calculate 
-        acid_emission = self.get_total_power_pct() * (1-self.CaCO3_amount) * 0.6
-        return self.acid_emission.update(acid_emission)
-        
-    def calculate_CO_emission(self):
-        CO_emission = self.get_total_power_pct() * (1-self.NaOH_amount) * 0.4
-        return self.CO_emission.update(CO_emission)
-
-    def calculate_power(self):
-        tmp_power = self.air_flow * self.get_oven_pct() * self.power_max
-        oven_factor = 0.8 + 0.3 * self.oven_amount / self.oven_amount_max
-        bio_factor = 1.0
-        consumption = (0.3 + 0.7 * tmp_power / self.power_max) * oven_factor * self.oven_consumption_rate
-        if self.oven_amount > self.oven_amount_ok_max + 0.5:
-            consumption *= 1 + (self.oven_amount - self.oven_amount_ok_max)
-        elif self.oven_amount < self.oven_amount_ok_min - 0.5:
-            bio_factor = max(1 - 0.02 * (self.oven_amount_ok_min - self.oven_amount), 0.0)
-        self.oven_amount = max(self.oven_amount - consumption, 0.0)
-        if self.oven_amount == 0.0:
-            bio_factor = 0
-            self.power_filter.update_alpha(0.0, self.alpha_empty)
-        else:
-            tmp_power = tmp_power * bio_factor
-            if tmp_power > self.power_filter.get():
-                self.power_filter.update_alpha(tmp_power, self.alpha_up)
-            elif tmp_power < self.power_filter.get():
-                self.power_filter.update_alpha(tmp_power, self.alpha_down)
-
-        return self.power_filter.get()
-    
-    def calculate(self):
-        # Update the turbine filter
-        self.turbine_pct_filter.update(self.turbine_pct)
-        # Calculate the power output of the plant
-        power = self.calculate_power()
-        # Calculate the emissions
-        self.calculate_acid_emission()
-        self.calculate_CO_emission()
-        # Return the power output
-        return power
-
-    def reset(self):
-        self.__init__(self.requirements)
-       
-
-# EnergyGrid class to manage the overall energy production and consumption balance
-class EnergyGrid:
-    def __init__(self):
-        self.requirements = EnergyRequirements()
-        self.wind_generator = WindGenerator()
-        self.sun_generator = SunGenerator()
-        self.powerplant = PowerPlant(self.requirements)
-
-    def reset(self):
-        self.wind_generator.make_new_vector()
-        self.sun_generator.make_new_vector()
-        self.powerplant.reset()
-
-    def get_total_electricity(self, index):
-        return self.wind_generator.get(index) + self.sun_generator.get(index) + self.powerplant.get_electric_power()        
-
-    def get_total_heat(self, index):
-        return self.powerplant.get_heat_power()
-
-    def get_total_production(self, index):
-        return self.wind_generator.get(index) + self.sun_generator.get(index) + self.powerplant.get_total_power()
-
-    def calculate(self, index):
-        # Calculate the power plant output first as it depends on the current state of the oven and air flow
-        plant_power = self.powerplant.calculate()
-        # Then calculate the wind and sun power for the current time step
-        wind_power = self.wind_generator.get(index)
-        sun_power = self.sun_generator.get(index)
-        # Return the total production
-        return wind_power + sun_power + plant_power
-
-
-
 energy_grid = EnergyGrid()
+try:
+    # Curves for every profile are computed (or loaded from the cache) now, never on the OSC thread
+    energy_grid.requirements.add_profiles(load_profiles(args.profiles))
+except (OSError, ValueError) as e:
+    log.warning("profiles_disabled", error=e)
+pending_profiles = set()  # Carriers whose plot envelope still has to be switched
+envelope_score = EnvelopeScore(energy_grid.requirements, N)
+scenario_bank = None
+difficulty = args.difficulty
+if args.scenario_bank:
+    try:
+        scenario_bank = ScenarioBank(args.scenario_bank)
+        log.info("scenario_bank", scenarios=len(scenario_bank.seed), bands=scenario_bank.bands)
+        try:
+            scenario_bank.band_index(difficulty)
+        except ValueError:
+            log.warning("unknown_band", band=difficulty, using=scenario_bank.bands[0])
+            difficulty = 0
+    except (OSError, KeyError, ValueError) as e:
+        log.warning("scenario_bank_disabled", error=e)
+weather_data = None
+if args.weather:
+    try:
+        weather_data = WeatherData(args.weather)
+        log.info("weather_data", windows=len(weather_data.starts), source=weather_data.meta['source'])
+    except (OSError, KeyError, ValueError) as e:
+        log.warning("weather_data_disabled", error=e)
+run_recorder = RunRecorder(N)
+run_history = None  # Started by finishStartup()
+# Earlier runs drawn behind the live line; the overlay only changes when a run finishes
+recent_runs = RecentRuns(args.past_runs) if args.past_runs > 0 or args.best_run else None
+markStartup("model")
+
+# Planner process for the demo mode and the expert ghost trace; forked before any threads exist
+autopilot_process = None
+autopilot_schedule = None
+DEMO_PAUSE = 10.0  # Seconds between demo runs
+demo_idle_since = None
+if args.autopilot or args.expert_ghost:
+    autopilot_process = AutopilotProcess(N, energy_grid)
+    autopilot_process.start()
+    atexit.register(autopilot_process.stop)
+
+# Forecast process for the live forecast overlay, also forked before any threads exist
+forecast_process = None
+if args.forecast:
+    forecast_process = ForecastProcess(N, energy_grid)
+    forecast_process.start()
+    atexit.register(forecast_process.stop)
 
 
 
 def plot_electricity(fig):
-    global lb,lheat,ls,lel
-    ax = fig.gca()  # Get the current axes
-    ax.set_xlim([0,48]) # Set the x-limits
-    ax.set_ylim([0,70]) # Set the y-limits
-    ax.set_xlabel('Time [h]')
-    ax.set_ylabel('Power [MW]')
-    ax.set_xticks([0  ,6  ,12  ,18  ,24 ,30 ,36  ,42  ,48])
-    xlabels = ['0:00','6:00','12:00','18:00','0:00','6:00','12:00','18:00','0:00']
-    ax.set_xticklabels(xlabels)
+    global lel
     # fill the requirement envelope from the electricity requirement object
-    plt.fill_between(energy_grid.requirements.electricity.time_vector,
-                     energy_grid.requirements.electricity.need_min_vector,
-                     energy_grid.requirements.electricity.need_max_vector,
-                     label="Behov")
-    #lb, = ax.plot(x_values,b_values,'r-', label="Produktion") # Create a line with the data
-    #lheat, = ax.plot(x_values,heat_plot_values,'b-', label="Vind") # Create a line with the data
-    lel,  = plt.plot(x_values,el_plot_values,'k-', label="El Produktion") # Create a line with the data
-    #ls, = ax.plot(x_values,s_values,'k-', label="Energi til Net") # Create a line with the data
-
-    plt.legend(loc='upper left')
-    plt.grid(True)
+    global lel_ghost, el_envelopes
+    lel, envelope, lel_ghost = setup_power_axes(fig,
+                              energy_grid.requirements.electricity.time_vector,
+                              energy_grid.requirements.electricity.need_min_vector,
+                              energy_grid.requirements.electricity.need_max_vector,
+                              "El Produktion", x_values, el_plot_values)
+    global lel_forecast, lel_fan, lel_runs
+    lel_forecast, lel_fan = setup_forecast_artists(fig)
+    lel_runs = setup_runs_artist(fig)
+    el_envelopes = cache_envelopes(fig, profileEnvelopes('electricity'),
+                                   energy_grid.requirements.profile_names['electricity'], envelope)
 
 def plot_heat(fig):
     global lheat
-    ax = fig.gca()  # Get the current axes
-    ax.set_xlim([0,48]) # Set the x-limits
-    ax.set_ylim([0,70]) # Set the y-limits
-    ax.set_xlabel('Time [h]')
-    ax.set_ylabel('Power [MW]')
-    ax.set_xticks([0  ,6  ,12  ,18  ,24 ,30 ,36  ,42  ,48])
-    xlabels = ['0:00','6:00','12:00','18:00','0:00','6:00','12:00','18:00','0:00']
-    ax.set_xticklabels(xlabels)
     # use heat requirement for plot_heat
-    plt.fill_between(energy_grid.requirements.heat.time_vector,
-                     energy_grid.requirements.heat.need_min_vector,
-                     energy_grid.requirements.heat.need_max_vector,
-                     label="Behov")
-    lheat, = ax.plot(x_values,heat_plot_values,'k-', label="Fjernvarme Produktion") # Create a line with the data
-
-    plt.legend(loc='upper left')
-    plt.grid(True)
-
-# Create plots on each monitor
-plt.ioff()  # Turn off interactive mode to prevent blocking
+    global lheat_ghost, heat_envelopes
+    lheat, envelope, lheat_ghost = setup_power_axes(fig,
+                                energy_grid.requirements.heat.time_vector,
+                                energy_grid.requirements.heat.need_min_vector,
+                                energy_grid.requirements.heat.need_max_vector,
+                                "Fjernvarme Produktion", x_values, heat_plot_values)
+    global lheat_forecast, lheat_fan, lheat_runs
+    lheat_forecast, lheat_fan = setup_forecast_artists(fig)
+    lheat_runs = setup_runs_artist(fig)
+    heat_envelopes = cache_envelopes(fig, profileEnvelopes('heat'),
+                                     energy_grid.requirements.profile_names['heat'], envelope)
+
+# Plot outputs fed sample by sample (--plot-processes or --backend raster),
+# electricity first then heat. Each has send_samples/reset/present/is_alive/stop.
+plot_outputs = []
+plot_samples_sent = 0
+
+def plotSpecs():
+    return [
+        ('electricity', "El Produktion"),
+        ('heat', "Fjernvarme Produktion"),
+    ]
+
+def envelopeOf(requirement):
+    return (requirement.time_vector, requirement.need_min_vector, requirement.need_max_vector)
+
+def profileEnvelopes(carrier):
+    """Envelopes of all demand profiles of a carrier, by profile name"""
+    return {name: envelopeOf(requirement) for name, requirement in energy_grid.requirements.library[carrier].items()}
+
+def startPlotProcesses():
+    """Start one renderer process per figure, each on its own monitor and core."""
+    # Each renderer gets one core of the "plots" role, in turn
+    plot_cores = placement.get("plots", {}).get("cores")
+    for i, (carrier, label) in enumerate(plotSpecs()):
+        cpus = plot_cores[i % len(plot_cores)] if plot_cores else None
+        plot_process = PlotProcess(monitors[i % len(monitors)], envelopeOf(getattr(energy_grid.requirements, carrier)),
+                                   label, cpus=cpus, envelope_key=energy_grid.requirements.profile_names[carrier],
+                                   extra_envelopes=profileEnvelopes(carrier))
+        plot_process.start()
+        plot_outputs.append(plot_process)
+
+def startRasterPlots():
+    """Create one fullscreen raster plot per figure, each on its own monitor."""
+    from energiby_raster import RasterPlot
+    for i, (carrier, label) in enumerate(plotSpecs()):
+        plot_outputs.append(RasterPlot(label, monitors[i % len(monitors)],
+                                       envelopeOf(getattr(energy_grid.requirements, carrier)), label,
+                                       envelope_key=energy_grid.requirements.profile_names[carrier],
+                                       extra_envelopes=profileEnvelopes(carrier)))
+
+def setProfile(carrier, name):
+    """Switch a carrier to a precomputed demand profile; the plots follow on the next tick"""
+    try:
+        energy_grid.requirements.set_profile(carrier, name)
+    except KeyError:
+        log.warning("unknown_profile", carrier=carrier, name=name)
+        return
+    pending_profiles.add(carrier)
+    # The planner and forecaster work on copies of the grid
+    requestPlan()
+    if forecast_process is not None:
+        forecast_process.set_scenario(energy_grid)
+
+def applyProfileChanges():
+    """Show the envelopes of switched profiles (main thread)"""
+    while pending_profiles:
+        carrier = pending_profiles.pop()
+        name = energy_grid.requirements.profile_names[carrier]
+        if plot_outputs:
+            plot_outputs[0 if carrier == 'electricity' else 1].set_envelope(name)
+        else:
+            show_envelope(el_envelopes if carrier == 'electricity' else heat_envelopes, name)
+
+def sendPlotSamples():
+    """Send the samples added since the last call to the plot outputs."""
+    global plot_samples_sent
+    start = plot_samples_sent
+    end = len(x_values)
+    if end <= start:
+        return
+    x = x_values[start:end]
+    plot_outputs[0].send_samples(x, el_plot_values[start:end])
+    plot_outputs[1].send_samples(x, heat_plot_values[start:end])
+    plot_samples_sent = end
+
+def resetPlotOutputs():
+    global plot_samples_sent
+    plot_samples_sent = 0
+    for plot_output in plot_outputs:
+        plot_output.reset()
+
+def showGhost(schedule):
+    """Show the planned production as the ghost trace on both plots (None hides it)"""
+    if schedule is None:
+        x = el = heat = []
+    else:
+        x = energy_grid.requirements.electricity.time_vector[schedule.start:]
+        el = schedule.electricity
+        heat = schedule.heat
+    if plot_outputs:
+        plot_outputs[0].set_ghost(x, el)
+        plot_outputs[1].set_ghost(x, heat)
+    else:
+        lel_ghost.set_data(x, el)
+        lheat_ghost.set_data(x, heat)
+
+def showRecentRuns():
+    """Show the earlier runs and the day's best behind the live line on both plots"""
+    if recent_runs is None:
+        return
+    el_recent, el_best = recent_runs.lines('electricity')
+    heat_recent, heat_best = recent_runs.lines('heat')
+    if not args.best_run:
+        el_best = heat_best = None
+    if plot_outputs:
+        plot_outputs[0].set_runs(el_recent, el_best)
+        plot_outputs[1].set_runs(heat_recent, heat_best)
+    else:
+        set_runs_data(lel_runs, el_recent, el_best)
+        set_runs_data(lheat_runs, heat_recent, heat_best)
+
+def showForecast(forecast):
+    """Show a forecast and its fan of alternatives on both plots (None hides them)"""
+    if forecast is None:
+        x = el = heat = []
+        el_fan = heat_fan = []
+    else:
+        x = energy_grid.requirements.electricity.time_vector[forecast.start:forecast.start + len(forecast.electricity)]
+        el, heat = forecast.electricity, forecast.heat
+        el_fan, heat_fan = forecast.fan_electricity, forecast.fan_heat
+    if plot_outputs:
+        plot_outputs[0].set_forecast(x, el, el_fan)
+        plot_outputs[1].set_forecast(x, heat, heat_fan)
+    else:
+        set_forecast_data(lel_forecast, lel_fan, x, el, el_fan)
+        set_forecast_data(lheat_forecast, lheat_fan, x, heat, heat_fan)
+
+def updateForecast():
+    """Show the newest forecast and ask for one from the current state"""
+    if forecast_process is None:
+        return
+    forecast = forecast_process.poll()
+    if run > 0:
+        if forecast is not None:
+            showForecast(forecast)
+        forecast_process.request(index, energy_grid.snapshot())
+
+# Set by requestPlan (from any thread); the request and the ghost clearing happen in pollAutopilot
+replan_pending = False
+
+def requestPlan():
+    """Ask for a schedule for the current scenario on the next tick"""
+    global replan_pending
+    if autopilot_process is not None:
+        replan_pending = True
+
+def pollAutopilot():
+    """Send a pending plan request and pick up the schedule (main thread)"""
+    global autopilot_schedule, replan_pending
+    if autopilot_process is None:
+        return
+    if replan_pending:
+        replan_pending = False
+        if autopilot_schedule is not None:
+            autopilot_schedule = None
+            showGhost(None)
+        autopilot_process.request(energy_grid)
+    if autopilot_schedule is not None:
+        return
+    autopilot_schedule = autopilot_process.poll()
+    if autopilot_schedule is not None:
+        log.info("autopilot_plan", score=round(autopilot_schedule.score, 1))
+        showGhost(autopilot_schedule)
+
+def applyAutopilot():
+    """Set the plant controls from the schedule for the coming tick"""
+    k = index - autopilot_schedule.start
+    if k < 0 or k >= len(autopilot_schedule.air_flow):
+        return
+    if autopilot_schedule.fill[k]:
+        fillOven()
+    energy_grid.powerplant.set_air_flow(autopilot_schedule.air_flow[k])
+    energy_grid.powerplant.set_turbine_pct(autopilot_schedule.turbine_pct[k])
+
+def demoTick():
+    """Start a new autopilot run DEMO_PAUSE seconds after the last one"""
+    global run, demo_idle_since
+    if run > 0:
+        demo_idle_since = None
+        return
+    now = time.monotonic()
+    if demo_idle_since is None:
+        demo_idle_since = now
+    if now - demo_idle_since < DEMO_PAUSE:
+        return
+    if index > 0:
+        clear()  # New scenario; the run starts once it has been planned
+    elif autopilot_schedule is not None:
+        run = 1
 
-fig1 = create_plot_on_monitor(monitors[0], plot_electricity)  # Assign to monitor 1
-plt.tight_layout()
-fig2 = create_plot_on_monitor(monitors[0], plot_heat)  # Assign to monitor 0
-plt.tight_layout()
+def applyTightLayout(fig, name):
+    """tight_layout, or the subplot parameters it produced last time for this window size"""
+    width, height = fig.canvas.get_width_height()
+    key = "{0}:{1}x{2}".format(name, width, height)
+    layouts = startup_cache.setdefault('layouts', {})
+    if key in layouts:
+        fig.subplots_adjust(**layouts[key])
+    else:
+        fig.tight_layout()
+        pars = fig.subplotpars
+        layouts[key] = dict(left=pars.left, right=pars.right, top=pars.top, bottom=pars.bottom,
+                            wspace=pars.wspace, hspace=pars.hspace)
+
+if args.backend == "raster":
+    startRasterPlots()
+elif args.plot_processes:
+    startPlotProcesses()
+else:
+    # Create plots on each monitor
+    plt.ioff()  # Turn off interactive mode to prevent blocking
+
+    fig1 = create_plot_on_monitor(monitors[0], plot_electricity)  # Assign to monitor 1
+    applyTightLayout(fig1, "electricity")
+    fig2 = create_plot_on_monitor(monitors[0], plot_heat)  # Assign to monitor 0
+    applyTightLayout(fig2, "heat")
+markStartup("plots")
 
 def sendElData():
-    global storage_amount
-    oscSenderTeensy.send_message("/OvenAmount", energy_grid.powerplant.oven_amount/energy_grid.powerplant.oven_amount_max)
-    oscSenderTeensy.send_message("/WasteStorage", energy_grid.powerplant.get_storage_pct())
-    oscSenderTeensy.send_message("/OvenPower", energy_grid.powerplant.get_total_power_pct())
-    oscSenderTeensy.send_message("/WindPower", energy_grid.wind_generator.get(index)/energy_grid.wind_generator.max)
-    oscSenderTeensy.send_message("/SunPower", energy_grid.sun_generator.get(index)/energy_grid.sun_generator.max)
-    oscSenderTeensy.send_message("/Acid", energy_grid.powerplant.get_acid_emission())
-    oscSenderTeensy.send_message("/CO", energy_grid.powerplant.get_CO_emission())
-    oscSenderTeensy.send_message("/ElectricityPct", energy_grid.powerplant.get_electricity_pct())
-    oscSenderTeensy.send_message("/HeatPct", energy_grid.powerplant.get_heat_pct())
-    oscSenderTeensy.send_message("/PlantElectricPower", energy_grid.powerplant.get_electric_power_pct())
-    oscSenderTeensy.send_message("/OvenTemp", energy_grid.powerplant.get_oven_temperature_pct())
-    oscSenderTeensy.send_message("/CaCO3", energy_grid.powerplant.CaCO3_amount)
-    oscSenderTeensy.send_message("/NaOH", energy_grid.powerplant.NaOH_amount)
-    oscSenderTeensy.send_message("/TurbinePct", energy_grid.powerplant.turbine_pct)
-    oscSenderTeensy.send_message("/OvenAirFlow", energy_grid.powerplant.get_air_flow())
+    """Send the plant state to the Teensy and every other subscriber"""
+    if state_fanout is None:
+        return
+    powerplant = energy_grid.powerplant
+    state_fanout.publish((
+        ("/OvenAmount", powerplant.oven_amount/powerplant.oven_amount_max),
+        ("/WasteStorage", powerplant.get_storage_pct()),
+        ("/OvenPower", powerplant.get_total_power_pct()),
+        ("/WindPower", energy_grid.wind_generator.get(index)/energy_grid.wind_generator.max),
+        ("/SunPower", energy_grid.sun_generator.get(index)/energy_grid.sun_generator.max),
+        ("/Acid", powerplant.get_acid_emission()),
+        ("/CO", powerplant.get_CO_emission()),
+        ("/ElectricityPct", powerplant.get_electricity_pct()),
+        ("/HeatPct", powerplant.get_heat_pct()),
+        ("/PlantElectricPower", powerplant.get_electric_power_pct()),
+        ("/OvenTemp", powerplant.get_oven_temperature_pct()),
+        ("/CaCO3", powerplant.CaCO3_amount),
+        ("/NaOH", powerplant.NaOH_amount),
+        ("/TurbinePct", powerplant.turbine_pct),
+        ("/OvenAirFlow", powerplant.get_air_flow()),
+        ("/Score", envelope_score.score()),
+        ("/InBand", envelope_score.in_band_fraction()),
+    ))
+
+def sendRunSummary(summary):
+    """Send the end-of-run score summary"""
+    if state_fanout is None:
+        return
+    state_fanout.send("/RunSummary", [
+        summary['score'],
+        summary['electricity']['in_band_pct'],
+        summary['heat']['in_band_pct'],
+        summary['electricity']['over_mwh'],
+        summary['electricity']['under_mwh'],
+        summary['heat']['over_mwh'],
+        summary['heat']['under_mwh'],
+        summary['wasted_fuel_mwh'],
+        summary['acid_total'],
+        summary['CO_total'],
+    ])
+
+def reportRunSummary():
+    """Print, send and store the summary of the completed run"""
+    summary = envelope_score.summary()
+    log.info("run_summary", score=round(summary['score'], 1),
+             electricity_in_band_pct=round(summary['electricity']['in_band_pct']),
+             heat_in_band_pct=round(summary['heat']['in_band_pct']),
+             wasted_fuel_mwh=round(summary['wasted_fuel_mwh'], 1),
+             acid=round(summary['acid_total'], 2), CO=round(summary['CO_total'], 2))
+    executor.submit(sendRunSummary, summary)
+    traces = run_recorder.snapshot()
+    if run_history is not None:
+        run_history.submit(traces, seed=run_recorder.seed, summary=summary, source=run_recorder.source)
+    if recent_runs is not None:
+        recent_runs.add(traces, summary['score'])
+        showRecentRuns()
+
+def fillOven():
+    run_recorder.fills += 1
+    energy_grid.powerplant.fill_oven()
+
+# Shared-memory state bus read by local consumers (oven video mixer, plot renderers)
+try:
+    state_bus = StateBusWriter()
+    atexit.register(state_bus.close)
+except OSError as e:
+    log.warning("state_bus_disabled", error=e)
+    state_bus = None
+
+def publishState():
+    """Write the current plant and grid state to the shared-memory state bus"""
+    if state_bus is None:
+        return
+    i = min(index, N - 1)
+    powerplant = energy_grid.powerplant
+    state_bus.publish(
+        index=i,
+        run=run,
+        t=t,
+        oven_amount_pct=powerplant.get_oven_pct(),
+        storage_pct=powerplant.get_storage_pct(),
+        total_power_pct=powerplant.get_total_power_pct(),
+        electric_power_pct=powerplant.get_electric_power_pct(),
+        heat_power_pct=powerplant.get_heat_power_pct(),
+        electricity_pct=powerplant.get_electricity_pct(),
+        heat_pct=powerplant.get_heat_pct(),
+        oven_temperature_pct=powerplant.get_oven_temperature_pct(),
+        air_flow=powerplant.get_air_flow(),
+        turbine_pct=powerplant.turbine_pct,
+        CaCO3_amount=powerplant.CaCO3_amount,
+        NaOH_amount=powerplant.NaOH_amount,
+        acid_emission=powerplant.get_acid_emission(),
+        CO_emission=powerplant.get_CO_emission(),
+        wind_power=energy_grid.wind_generator.get(i),
+        sun_power=energy_grid.sun_generator.get(i),
+        total_electricity=energy_grid.get_total_electricity(i),
+        total_heat=energy_grid.get_total_heat(i),
+        electricity_need=energy_grid.requirements.electricity.need_vector[i],
+        heat_need=energy_grid.requirements.heat.need_vector[i],
+    )
 
 # Non-blocking OSC sender using thread pool
 def sendElDataAsync():
@@ -582,8 +585,11 @@ def sendElDataAsync():
     executor.submit(sendElData)
 
 def updatePlot():
-    lel.set_xdata(x_values)
-    lel.set_ydata(el_plot_values)
+    if plot_outputs:
+        sendPlotSamples()
+    else:
+        lel.set_xdata(x_values)
+        lel.set_ydata(el_plot_values)
     # Use async OSC sending to avoid blocking the render thread
     sendElDataAsync()
 
@@ -600,11 +606,35 @@ def clear():
     heat_plot_values = []
     b_values = []
     s_values = []
-    energy_grid.reset()
+    if scenario_bank is not None:
+        scenario = scenario_bank.pick(difficulty)
+        energy_grid.reset(seed=scenario.seed)
+        seed = scenario.seed
+        source = {'kind': 'bank', 'index': scenario.index, 'band': scenario.band, 'seed': scenario.seed}
+    elif weather_data is not None:
+        window = weather_data.pick()
+        log.info("weather_window", start=window.start)
+        energy_grid.reset(wind_vector=window.wind * energy_grid.wind_generator.max,
+                          sun_vector=window.sun * energy_grid.sun_generator.max)
+        seed = None  # the grid's seed did not draw this scenario
+        source = {'kind': 'weather', 'data': weather_data.meta['source'], 'offset': window.offset,
+                  'start': window.start.isoformat()}
+    else:
+        energy_grid.reset()
+        seed = energy_grid.seed
+        source = {'kind': 'random', 'seed': seed}
+    envelope_score.reset()
+    run_recorder.reset(seed, source)
     index = 0
     t = 0
     td = 0
+    requestPlan()
+    if forecast_process is not None:
+        forecast_process.set_scenario(energy_grid)
+        showForecast(None)
 
+    if plot_outputs:
+        resetPlotOutputs()
     updatePlot()
 
 
@@ -616,13 +646,39 @@ BATCH_SIZE = 2  # Update every 2 frames to reduce rendering overhead
 # Animate Function for the plotting - OPTIMIZED
 def animate(i):
     global index, run, t, td, render_frame_counter
+    applyCommands()
+    applyProfileChanges()
+    pollAutopilot()
+    if args.autopilot:
+        demoTick()
     if run > 0:
+        if args.autopilot and autopilot_schedule is not None:
+            applyAutopilot()
         t = index * 0.05
         td = timeOfDay(t)
         energy_grid.calculate(index)
         x_values.append(t)
         el_plot_values.append(energy_grid.get_total_electricity(index))
         heat_plot_values.append(energy_grid.get_total_heat(index))
+        envelope_score.update(index, el_plot_values[-1], heat_plot_values[-1], energy_grid.powerplant)
+        powerplant = energy_grid.powerplant
+        run_recorder.record(
+            index,
+            t=t,
+            electricity=el_plot_values[-1],
+            heat=heat_plot_values[-1],
+            wind=energy_grid.wind_generator.get(index),
+            sun=energy_grid.sun_generator.get(index),
+            plant_power=powerplant.get_total_power(),
+            acid_emission=powerplant.get_acid_emission(),
+            CO_emission=powerplant.get_CO_emission(),
+            oven_amount=powerplant.oven_amount,
+            storage_amount=powerplant.storage_amount,
+            air_flow=powerplant.air_flow,
+            turbine_pct=powerplant.turbine_pct,
+            CaCO3_amount=powerplant.CaCO3_amount,
+            NaOH_amount=powerplant.NaOH_amount,
+        )
         
         # Batch rendering updates to reduce matplotlib overhead
         render_frame_counter += 1
@@ -632,10 +688,17 @@ def animate(i):
         
         if t >= 48.0:
             run = 0
-            print("Consumption {0}".format(index))
+            log.info("run_finished", steps=index)
             updatePlot()  # Final update
+            reportRunSummary()
+            if forecast_process is not None:
+                showForecast(None)
 
         index = index + 1
+        updateForecast()
+    
+    # Publish once per tick so local consumers follow the simulation
+    publishState()
     
     # Minimal sleep to prevent CPU spinning (set to 0 for maximum speed on RPi)
     time.sleep(0.01)
@@ -653,82 +716,211 @@ def animateHeat(i):
 # Function to recieve value over osc 
 def oscValue(addr, value):
     energy_grid.powerplant.set_air_flow(value)
-    print("[{0}] ~ {1}".format(addr, energy_grid.powerplant.air_flow))
+    log.info("osc", address=addr, value=energy_grid.powerplant.air_flow)
+
+# Commands from the OSC thread; applied on the main thread at the start of the next tick, so
+# clearing a run never races the tick, the plot outputs or the worker pipes
+pending_commands = []
 
 def oscCmd(addr, value):
-    global x_values, el_plot_values, index, run
-    if value == 'clear':
-        clear()
-    elif value == 'run':
-        run = 1
-    elif value == 'stop':
-        run = 0
-    elif value == 'StartButton':
-        run = 0
-        clear()
-        run = 1
-    elif value == 'FillButton':
-        energy_grid.powerplant.fill_oven()
-    elif value == 'Reset':
-        run = 0
-        clear()
-        
-    print("[{0}] ~ {1}".format(addr, value))
+    pending_commands.append(value)
+    log.info("osc", address=addr, value=value)
+
+def applyCommands():
+    """Apply the queued /cmd commands (main thread)"""
+    global run
+    while pending_commands:
+        value = pending_commands.pop(0)
+        if value == 'clear':
+            clear()
+        elif value == 'run':
+            run = 1
+        elif value == 'stop':
+            run = 0
+        elif value == 'StartButton':
+            run = 0
+            clear()
+            run = 1
+        elif value == 'FillButton':
+            fillOven()
+        elif value == 'Reset':
+            run = 0
+            clear()
+
+def oscDifficulty(addr, value):
+    """Difficulty band (name or index) for the next scenario"""
+    global difficulty
+    if scenario_bank is None:
+        return
+    try:
+        scenario_bank.band_index(value)
+    except (ValueError, TypeError):
+        log.warning("osc_unknown_band", address=addr, value=value)
+        return
+    difficulty = value
+    log.info("osc", address=addr, value=value)
 
 def oscAmountInOven(addr, value):
     energy_grid.powerplant.oven_amount = value
-    print("[{0}] ~ {1}".format(addr, energy_grid.powerplant.oven_amount))
-
-# Setup the OSC Functionality
-dispatcher = dispatcher.Dispatcher()
-parser = argparse.ArgumentParser()
-parser.add_argument("--ip", default="0.0.0.0", help="The ip to listen on")
-parser.add_argument("--port", type=int, default=7133, help="The port to listen on")
-args = parser.parse_args()
-dispatcher.map("/OvenAirFlow", oscValue)
-dispatcher.map("/cmd", oscCmd)
-dispatcher.map("/AmountInOven", oscAmountInOven)
-dispatcher.map("/UseWind", lambda addr, value: energy_grid.wind_generator.activate(value))
-dispatcher.map("/UseSun", lambda addr, value: energy_grid.sun_generator.activate(value))
-dispatcher.map("/FillOven", lambda addr, value: energy_grid.powerplant.fill_oven())
-dispatcher.map("/CaCO3", lambda addr, value: energy_grid.powerplant.set_CaCO3_amount(value))
-dispatcher.map("/NaOH", lambda addr, value: energy_grid.powerplant.set_NaOH_amount(value))
-dispatcher.map("/TurbinePct", lambda addr, value: energy_grid.powerplant.set_turbine_pct(value))
-
-# Print all incoming messages
-def print_handler(address, *args):
-    print(f"Received message: {address} {args}")
-
-
-# Set default handler
-dispatcher.set_default_handler(print_handler)
-
-
-server = osc_server.ThreadingOSCUDPServer((args.ip, args.port), dispatcher)
-print("Serving on {}".format(server.server_address))
-
-# Start Osc in a Thread
-oscThread = Thread(target = server.serve_forever)
-oscThread.daemon = True  # Make it a daemon thread so it doesn't block shutdown
-oscThread.start()
+    log.info("osc", address=addr, value=energy_grid.powerplant.oven_amount)
+
+def oscSubscribe(client_address, addr, port, *options):
+    """Subscribe the sender: port [rate] [pattern ...]"""
+    rate = None
+    if options and not isinstance(options[0], str):
+        rate, options = options[0], options[1:]
+    state_fanout.add(client_address[0], port, patterns=options or ("*",), rate=rate,
+                     bundle=addr == "/SubscribeBundled")
+    log.info("osc_subscribe", address=addr, target="{0}:{1}".format(client_address[0], port),
+             rate=rate, patterns=options or "*")
+
+def oscUnsubscribe(client_address, addr, port):
+    state_fanout.remove(client_address[0], port)
+    log.info("osc_unsubscribe", target="{0}:{1}".format(client_address[0], port))
+
+# Log all other incoming messages
+def log_handler(address, *args):
+    log.info("osc_unhandled", address=address, args=args)
+
+def startOsc():
+    """Import python-osc and start the OSC sender and server"""
+    global state_fanout, server, oscThread
+    from pythonosc import dispatcher as osc_dispatcher
+    from pythonosc import osc_server
+
+    # The Teensy and any configured outputs get every update
+    state_fanout = StateFanout()
+    state_fanout.add(args.teensy_ip, args.teensy_port, permanent=True)
+    for subscriber in args.subscriber:
+        host, port = subscriber.rsplit(":", 1)
+        state_fanout.add(host, port, permanent=True)
+    if args.broadcast:
+        state_fanout.add("255.255.255.255", BROADCAST_PORT, permanent=True)
+
+    # Setup the OSC Functionality
+    if args.fast_osc:
+        # Fixed control addresses are decoded straight from the datagram
+        from energiby_osc import FastDispatcher
+        dispatcher = FastDispatcher()
+        map_control = dispatcher.map_fast
+    else:
+        dispatcher = osc_dispatcher.Dispatcher()
+        map_control = dispatcher.map
+    map_control("/OvenAirFlow", oscValue)
+    map_control("/cmd", oscCmd)
+    map_control("/AmountInOven", oscAmountInOven)
+    map_control("/UseWind", lambda addr, value: energy_grid.wind_generator.activate(value))
+    map_control("/UseSun", lambda addr, value: energy_grid.sun_generator.activate(value))
+    map_control("/FillOven", lambda addr, value: fillOven())
+    map_control("/CaCO3", lambda addr, value: energy_grid.powerplant.set_CaCO3_amount(value))
+    map_control("/NaOH", lambda addr, value: energy_grid.powerplant.set_NaOH_amount(value))
+    map_control("/TurbinePct", lambda addr, value: energy_grid.powerplant.set_turbine_pct(value))
+    dispatcher.map("/Difficulty", oscDifficulty)
+    dispatcher.map("/ElectricityProfile", lambda addr, value: setProfile('electricity', value))
+    dispatcher.map("/HeatProfile", lambda addr, value: setProfile('heat', value))
+    dispatcher.map("/Subscribe", oscSubscribe, needs_reply_address=True)
+    dispatcher.map("/SubscribeBundled", oscSubscribe, needs_reply_address=True)
+    dispatcher.map("/Unsubscribe", oscUnsubscribe, needs_reply_address=True)
+
+    # Set default handler
+    dispatcher.set_default_handler(log_handler)
+
+    if args.fast_osc:
+        # Handle datagrams in order on the server thread instead of starting a thread per message
+        server = osc_server.BlockingOSCUDPServer((args.ip, args.port), dispatcher)
+    else:
+        server = osc_server.ThreadingOSCUDPServer((args.ip, args.port), dispatcher)
+    log.info("osc_serving", address=server.server_address)
+
+    # Start Osc in a Thread
+    oscThread = Thread(target = server.serve_forever)
+    oscThread.daemon = True  # Make it a daemon thread so it doesn't block shutdown
+    oscThread.start()
+
+def startHistory():
+    """Open the run history store and its writer thread"""
+    global run_history
+    if not args.history_dir:
+        return
+    try:
+        run_history = RunHistory(args.history_dir)
+    except (OSError, sqlite3.Error) as e:
+        log.warning("run_history_disabled", error=e)
+        return
+    atexit.register(run_history.close)
+    if recent_runs is not None:
+        recent_runs.load(run_history)
+        showRecentRuns()
+
+def finishStartup():
+    """Non-critical initialization, run once the first frame is on screen"""
+    markStartup("first frame")
+    # The log writer thread starts after the worker processes have been forked
+    log.start()
+    startOsc()
+    startHistory()
+    markStartup("osc")
+    reportStartup()
+    # Refresh the cached monitor/window layout for the next start off the main thread
+    Thread(target=refreshMonitorCache, daemon=True).start()
 
 clear()
 
-# Start the Animation Function with optimized settings
-# Use larger interval (50ms) for RPi to reduce CPU load, disable blitting as matplotlib TkAgg doesn't support it well
-ani1 = FuncAnimation(fig1, animate, interval=50, blit=False, cache_frame_data=False)
-ani2 = FuncAnimation(fig2, animateHeat, interval=50, blit=False, cache_frame_data=False)
-
-plt.figure(fig1.number)
-fig1.canvas.manager.window.attributes('-fullscreen', False)
-fig1.canvas.draw()
-
-plt.figure(fig2.number)
-fig2.canvas.manager.window.attributes('-fullscreen', False)
-fig2.canvas.draw()
-
-# Show the plots (this will block until the windows are closed)
-plt.show()    
+def runWithPlotOutputs(interval=0.05):
+    """Tick the simulation on this thread and present the plot outputs."""
+    if args.backend == "raster":
+        from energiby_raster import poll_quit
+    else:
+        poll_quit = lambda: False
+    i = 0
+    next_tick = time.perf_counter()
+    try:
+        # Run until every plot window has been closed
+        while any(plot_output.is_alive() for plot_output in plot_outputs):
+            animate(i)
+            for plot_output in plot_outputs:
+                plot_output.present()
+            if poll_quit():
+                break
+            if i == 0:
+                finishStartup()
+                next_tick = time.perf_counter()
+            i += 1
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.perf_counter()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for plot_output in plot_outputs:
+            plot_output.stop()
+
+if plot_outputs:
+    runWithPlotOutputs()
+else:
+    # Start the Animation Function with optimized settings
+    # Use larger interval (50ms) for RPi to reduce CPU load, disable blitting as matplotlib TkAgg doesn't support it well
+    ani1 = FuncAnimation(fig1, animate, interval=50, blit=False, cache_frame_data=False)
+    ani2 = FuncAnimation(fig2, animateHeat, interval=50, blit=False, cache_frame_data=False)
+
+    plt.figure(fig1.number)
+    fig1.canvas.manager.window.attributes('-fullscreen', False)
+    fig1.canvas.draw()
+
+    plt.figure(fig2.number)
+    fig2.canvas.manager.window.attributes('-fullscreen', False)
+    fig2.canvas.draw()
+
+    # Put the first frame on screen before the remaining initialization
+    fig1.canvas.flush_events()
+    fig2.canvas.flush_events()
+    finishStartup()
+
+    # Show the plots (this will block until the windows are closed)
+    plt.show()    
 
 
 # ==================== RASPBERRY PI OPTIMIZATION TIPS ====================
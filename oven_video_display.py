@@ -1,30 +1,47 @@
 #!/usr/bin/env python3
 """
 Real-time video mixer for oven intensity control.
-Interpolates between 4 looping oven videos based on intensity parameter (0-1).
-All videos are loaded into RAM for low-latency real-time playback.
+Interpolates between N looping oven videos (default: low, medium, high,
+overdrive) based on intensity parameter (0-1).
+All videos are loaded into RAM for low-latency real-time playback, as far
+as the memory budget allows: `plan_memory` picks the internal resolution and
+frame stride that fit, and clips are decoded while playing when nothing does.
 """
 
 import cv2
 import numpy as np
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Sequence, Tuple
 import tkinter as tk
 import multiprocessing
+from multiprocessing.pool import ThreadPool
+import threading
+import queue
+import argparse
 import time
 
+from energiby_state_bus import StateBusReader
 
-def load_video_frames(path: str, frame_width: int, frame_height: int) -> Optional[List[np.ndarray]]:
-    """Load all frames from a video file into RAM with resizing."""
+
+def load_video_frames(path: str, frame_width: int, frame_height: int, stride: int = 1) -> Optional[List[np.ndarray]]:
+    """Load every `stride`-th frame of a video file into RAM with resizing."""
     cap = cv2.VideoCapture(str(path))
     if not cap.isOpened():
         return None
     
     frames = []
+    position = 0
     while True:
+        if position % stride:
+            # Skipped frames are only demuxed and decoded, never converted or resized
+            if not cap.grab():
+                break
+            position += 1
+            continue
         ret, frame = cap.read()
         if not ret:
             break
+        position += 1
         
         # Resize to output dimensions (using nearest neighbor for faster performance)
         frame = cv2.resize(frame, (frame_width, frame_height), interpolation=cv2.INTER_NEAREST)
@@ -34,6 +51,160 @@ def load_video_frames(path: str, frame_width: int, frame_height: int) -> Optiona
     return frames if frames else None
 
 
+def probe_video(path: str) -> Optional[int]:
+    """Number of frames in a video file, from its header (counted if the header has none)."""
+    cap = cv2.VideoCapture(str(path))
+    if not cap.isOpened():
+        return None
+    count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if count <= 0:
+        count = 0
+        while cap.grab():
+            count += 1
+    cap.release()
+    return count or None
+
+
+def available_memory() -> Optional[int]:
+    """MemAvailable from /proc/meminfo in bytes (None where there is none)."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def scaled_size(frame_width: int, frame_height: int, scale: float) -> Tuple[int, int]:
+    """Internal (width, height) for a scale factor relative to the output size."""
+    return max(1, int(round(frame_width * scale))), max(1, int(round(frame_height * scale)))
+
+
+def decoded_footprint(frame_counts: Sequence[int], frame_width: int, frame_height: int,
+                      scale_levels: Sequence[float], stride: int = 1) -> int:
+    """Bytes of decoded BGR frames: kept frames x width x height x 3, summed over clips and scale levels."""
+    frame_bytes = sum(w * h * 3 for w, h in (scaled_size(frame_width, frame_height, s) for s in scale_levels))
+    return sum(-(-count // stride) for count in frame_counts) * frame_bytes
+
+
+class MemoryPlan:
+    """
+    How the mixer holds its clips: scale levels and frame stride, or streamed.
+    
+    Only the active level is resident; `footprint` is the peak while the
+    next level is built, before the old one is released.
+    """
+    
+    def __init__(self, scale_levels: Sequence[float], stride: int = 1, streaming: bool = False,
+                 footprint: int = 0, budget: Optional[int] = None):
+        self.scale_levels = list(scale_levels)
+        self.stride = stride
+        self.streaming = streaming
+        self.footprint = footprint
+        self.budget = budget
+    
+    def __str__(self) -> str:
+        budget = "no budget" if self.budget is None else f"budget {self.budget / 2**20:.0f} MB"
+        if self.streaming:
+            return f"streaming at scale {self.scale_levels[0]:.2f} ({budget})"
+        levels = ", ".join(f"{s:.2f}" for s in self.scale_levels)
+        return f"preloading scale {levels} with frame stride {self.stride}: {self.footprint / 2**20:.0f} MB peak ({budget})"
+
+
+def plan_memory(frame_counts: Sequence[int], frame_width: int, frame_height: int,
+                scale_levels: Sequence[float], budget: Optional[int],
+                fallback_scales: Sequence[float] = (0.75, 0.5), max_stride: int = 2) -> MemoryPlan:
+    """
+    Choose how to hold the clips within `budget` bytes.
+    
+    Candidates lower the largest internal scale (keeping the smaller
+    requested levels) and keep every `stride`-th frame. Only one level is
+    resident at a time, but changing level needs the two largest at once; if
+    that does not fit but the largest alone does, the candidate keeps only
+    the largest level. The fitting candidate that keeps the most pixels per
+    second (scale^2 / stride) wins, the lower stride and then more levels on
+    a tie. If none fits, the clips are streamed at the requested largest
+    scale, which needs next to no memory.
+    
+    Args:
+        frame_counts: Frames per clip
+        frame_width: Output frame width
+        frame_height: Output frame height
+        scale_levels: Requested internal scales, descending
+        budget: Bytes the decoded frames may use (None: no limit)
+        fallback_scales: Largest internal scales to try below the requested one
+        max_stride: Largest frame stride to try
+    
+    Returns:
+        The chosen MemoryPlan
+    """
+    top = scale_levels[0]
+    tops = sorted({top} | {s for s in list(scale_levels) + list(fallback_scales) if s < top}, reverse=True)
+    candidates = []
+    for candidate_top in tops:
+        levels = [candidate_top] + [s for s in scale_levels if s < candidate_top]
+        for stride in range(1, max_stride + 1):
+            for kept in ([levels[:1], levels] if len(levels) > 1 else [levels]):
+                footprint = decoded_footprint(frame_counts, frame_width, frame_height, kept[:2], stride)
+                candidates.append((candidate_top ** 2 / stride, -stride, len(kept), kept, stride, footprint))
+    for _, _, _, levels, stride, footprint in sorted(candidates, key=lambda c: c[:3], reverse=True):
+        if budget is None or footprint <= budget:
+            return MemoryPlan(levels, stride, footprint=footprint, budget=budget)
+    return MemoryPlan([top], streaming=True, budget=budget)
+
+
+class StreamedClip:
+    """
+    Frames of one clip decoded on demand, for when preloading does not fit.
+    
+    Indexes like the list of preloaded frames it replaces. Playback moves
+    forward a frame at a time, so an access normally decodes one frame; a
+    loop back or a jump far ahead seeks. Costs a decode per clip in use per
+    frame instead of memory.
+    """
+    
+    SEEK_AHEAD = 30  # Further ahead than this, seek instead of decoding the frames in between
+    
+    def __init__(self, path: str, frame_count: int, frame_width: int, frame_height: int):
+        self.cap = cv2.VideoCapture(str(path))
+        self.frame_count = frame_count
+        self.size = (frame_width, frame_height)
+        self.position = 0   # Index of the frame the decoder returns next
+        self.index = -1
+        self.frame = np.zeros((frame_height, frame_width, 3), dtype=np.uint8)
+    
+    def __len__(self) -> int:
+        return self.frame_count
+    
+    def _seek(self, index: int):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        self.position = index
+    
+    def __getitem__(self, index: int) -> np.ndarray:
+        if index == self.index:
+            return self.frame
+        if index < self.position or index - self.position > self.SEEK_AHEAD:
+            self._seek(index)
+        while self.position < index and self.cap.grab():
+            self.position += 1
+        ret, frame = self.cap.read()
+        if not ret:
+            # Fewer frames than the header said: loop from the start
+            self._seek(0)
+            index = 0
+            ret, frame = self.cap.read()
+            if not ret:
+                return self.frame
+        self.position += 1
+        if frame.shape[1] != self.size[0] or frame.shape[0] != self.size[1]:
+            frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_NEAREST)
+        self.index = index
+        self.frame = frame
+        return frame
+
+
 class OvenVideoMixer:
     """Real-time video mixer based on oven intensity (0-1)."""
     
@@ -41,41 +212,156 @@ class OvenVideoMixer:
         self,
         video_paths: List[str],
         frame_width: int = 1280,
-        frame_height: int = 720
+        frame_height: int = 720,
+        scale_levels: Sequence[float] = (1.0,),
+        breakpoints: Optional[Sequence[float]] = None,
+        smooth: bool = False,
+        lut_size: int = 1024,
+        memory_budget: Optional[int] = None,
+        memory_reserve: int = 600 * 2**20,
+        streaming: bool = False
     ):
         """
         Initialize the oven video mixer.
         
         Args:
-            video_paths: List of 4 video file paths [low, medium, high, overdrive]
+            video_paths: Video file paths ordered by intensity, at least 2
+                (default set: [low, medium, high, overdrive])
             frame_width: Output frame width
             frame_height: Output frame height
+            scale_levels: Internal resolution scales, relative to the output
+                size. Blending runs at the current scale and frames are upscaled
+                once for presentation. Only the current level is kept in RAM;
+                another is built in the background when `set_scale` asks for it.
+            breakpoints: Intensity at which each clip is shown unblended, one per
+                clip, ascending (default: 0.0, 0.33, 0.66, 1.0 for 4 clips and
+                evenly spaced otherwise)
+            smooth: Blend up to three neighbouring clips with a quadratic
+                B-spline kernel instead of linearly between two (inner clips
+                are then never shown fully unblended)
+            lut_size: Number of quantized intensity steps in the lookup table
+            memory_budget: Bytes the decoded frames may use (default: available
+                memory minus `memory_reserve`)
+            memory_reserve: Memory left for the other components (simulator and
+                plot renderers, which may still be starting) with the default budget
+            streaming: Decode the clips while playing instead of preloading them
         """
-        if len(video_paths) != 4:
-            raise ValueError("Exactly 4 video paths required: [low, medium, high, overdrive]")
+        if len(video_paths) < 2:
+            raise ValueError("At least 2 video paths required, ordered by intensity")
         
         self.frame_width = frame_width
         self.frame_height = frame_height
-        self.video_names = ["low", "medium", "high", "overdrive"]
+        if len(video_paths) == 4:
+            self.video_names = ["low", "medium", "high", "overdrive"]
+        else:
+            self.video_names = [Path(path).stem for path in video_paths]
+        self.build_intensity_lut(len(video_paths), breakpoints, smooth, lut_size)
+        self.scale_levels = sorted({float(s) for s in scale_levels}, reverse=True)
+        if not self.scale_levels or self.scale_levels[0] > 1.0 or self.scale_levels[-1] <= 0.0:
+            raise ValueError("Scale levels must be in the range (0, 1]")
         
-        # Load all videos into RAM in parallel
-        print("Loading videos into RAM...")
+        # Size the decoded frames before decoding any
+        frame_counts = [probe_video(path) for path in video_paths]
+        for i, count in enumerate(frame_counts):
+            if not count:
+                raise RuntimeError(f"Failed to load video {i}: {video_paths[i]}")
+        if memory_budget is None:
+            available = available_memory()
+            memory_budget = None if available is None else max(0, available - memory_reserve)
+        if streaming:
+            plan = MemoryPlan(self.scale_levels[:1], streaming=True, budget=memory_budget)
+        else:
+            plan = plan_memory(frame_counts, frame_width, frame_height, self.scale_levels, memory_budget)
+        full = decoded_footprint(frame_counts, frame_width, frame_height, self.scale_levels[:1])
+        print(f"Memory plan: {sum(frame_counts)} frames would take {full / 2**20:.0f} MB decoded; {plan}")
+        self.memory_plan = plan
+        self.scale_levels = plan.scale_levels
+        self.stride = plan.stride
+        self.video_paths = list(video_paths)
+        self.scale = self.scale_levels[0]
+        self._rebuild = None    # thread building another level
+        self._rebuilt = None    # (scale, frames) waiting to be swapped in by get_frame
         
-        with multiprocessing.Pool(processes=4) as pool:
-            results = pool.starmap(load_video_frames, [(path, self.frame_width, self.frame_height) for path in video_paths])
+        if plan.streaming:
+            size = self.internal_size(self.scale)
+            self.frames = [StreamedClip(path, count, *size) for path, count in zip(video_paths, frame_counts)]
+            print(f"  Streaming {len(self.frames)} videos")
+            return
         
-        self.frames = results
+        print("Loading videos into RAM...")
+        self.frames = self._decode(self.scale)
+        for name, frames in zip(self.video_names, self.frames):
+            print(f"  Loaded {name}: {len(frames)} frames")
+        print(f"  Loaded {len(self.frames)} videos")
+    
+    def _decode(self, scale: float) -> List[List[np.ndarray]]:
+        """Decode every clip at an internal scale."""
+        # Threads, not processes: OpenCV decodes without the GIL, and frames are not copied back through a pipe
+        width, height = self.internal_size(scale)
+        with ThreadPool(processes=min(len(self.video_paths), multiprocessing.cpu_count())) as pool:
+            results = pool.starmap(load_video_frames,
+                                   [(path, width, height, self.stride) for path in self.video_paths])
         for i, frames in enumerate(results):
             if not frames:
-                raise RuntimeError(f"Failed to load video {i}: {video_paths[i]}")
-            print(f"  Loaded {self.video_names[i]}: {len(frames)} frames")
+                raise RuntimeError(f"Failed to load video {i}: {self.video_paths[i]}")
+        return results
+    
+    def internal_size(self, scale: float) -> tuple:
+        """Internal (width, height) for a scale factor relative to the output size."""
+        return scaled_size(self.frame_width, self.frame_height, scale)
+    
+    def set_scale(self, scale: float) -> bool:
+        """
+        Start building an internal scale level; blending switches to it once built.
         
-        print(f"  Loaded {len(self.frames)} videos")
+        A smaller level is derived from the resident frames, a larger one is
+        decoded again. Returns False while another level is still being built.
+        """
+        if scale == self.scale or self._rebuild is not None:
+            return False
+        self._rebuild = threading.Thread(target=self._build_level, args=(scale, self.frames),
+                                         name="scale-level", daemon=True)
+        self._rebuild.start()
+        return True
+    
+    def _build_level(self, scale: float, current: List[List[np.ndarray]]):
+        try:
+            if scale < self.scale:
+                size = self.internal_size(scale)
+                frames = [[cv2.resize(frame, size, interpolation=cv2.INTER_AREA) for frame in clip]
+                          for clip in current]
+            else:
+                frames = self._decode(scale)
+        except (RuntimeError, cv2.error) as e:
+            print(f"Internal scale {scale:.2f} not built: {e}")
+            self._rebuild = None
+            return
+        self._rebuilt = (scale, frames)
+    
+    def _swap_level(self):
+        """Blend at the newly built level from the next frame on; the old level is released."""
+        scale, frames = self._rebuilt
+        self._rebuilt = None
+        self.scale = scale
+        self.frames = frames
+        self._rebuild = None
+        print(f"  Internal scale {scale:.2f} active: {frames[0][0].shape[1]}x{frames[0][0].shape[0]}")
+    
+    def upscale(self, frame: np.ndarray) -> np.ndarray:
+        """Resize an internal-resolution frame to the output size (no-op at full size)."""
+        if frame.shape[1] == self.frame_width and frame.shape[0] == self.frame_height:
+            return frame
+        return cv2.resize(frame, (self.frame_width, self.frame_height), interpolation=cv2.INTER_LINEAR)
+    
+    @property
+    def loop_length(self) -> int:
+        """Number of frames after which all clips have looped at least once."""
+        return max(len(frames) for frames in self.frames) * self.stride
     
     def _get_frame(self, video_idx: int, frame_num: int) -> np.ndarray:
-        """Get a looping frame from a video."""
+        """Get a looping frame from a video (each kept frame is held for `stride` frames)."""
         frames = self.frames[video_idx]
-        looped_idx = frame_num % len(frames)
+        looped_idx = (frame_num // self.stride) % len(frames)
         return frames[looped_idx]
     
     def blend_frames(
@@ -98,11 +384,92 @@ class OvenVideoMixer:
         alpha = np.clip(alpha, 0.0, 1.0)
         return cv2.addWeighted(frame1, 1 - alpha, frame2, alpha, 0)
     
+    def build_intensity_lut(
+        self,
+        num_levels: int,
+        breakpoints: Optional[Sequence[float]] = None,
+        smooth: bool = False,
+        lut_size: int = 1024
+    ):
+        """
+        Precompute the intensity -> (first clip, fixed-point weights) table.
+        
+        Each entry holds the index of the first of three consecutive clips and
+        their weights in Q8 fixed point (summing to 256). Linear blending
+        only uses the first two weights (the third is always 0, so
+        `get_frame` blends two frames); the smooth kernel spreads the weight
+        over up to three neighbours. With the smooth kernel the first and
+        last clip are shown pure at their breakpoints, while an inner clip
+        peaks at 3/4 with 1/8 of each neighbour.
+        
+        Args:
+            num_levels: Number of clips in the palette
+            breakpoints: Intensity at which each clip is shown unblended
+            smooth: Use the three-clip quadratic B-spline kernel
+            lut_size: Number of quantized intensity steps
+        """
+        if breakpoints is None:
+            if num_levels == 4:
+                breakpoints = [0.0, 0.33, 0.66, 1.0]
+            else:
+                breakpoints = np.linspace(0.0, 1.0, num_levels)
+        breakpoints = np.asarray(breakpoints, dtype=np.float64)
+        if len(breakpoints) != num_levels:
+            raise ValueError(f"Expected {num_levels} breakpoints, got {len(breakpoints)}")
+        if np.any(np.diff(breakpoints) <= 0):
+            raise ValueError("Breakpoints must be strictly ascending")
+        
+        self.breakpoints = breakpoints
+        self.smooth = smooth and num_levels >= 3
+        self.lut_size = lut_size
+        
+        # Continuous palette position (0 .. N-1) for every quantized intensity
+        intensity = np.linspace(0.0, 1.0, lut_size)
+        position = np.interp(intensity, breakpoints, np.arange(num_levels))
+        
+        weights = np.zeros((lut_size, num_levels))
+        rows = np.arange(lut_size)
+        if self.smooth:
+            # Quadratic B-spline centred on the nearest clip
+            center = np.clip(np.floor(position + 0.5).astype(int), 0, num_levels - 1)
+            u = position - center + 0.5
+            for offset, w in ((-1, 0.5 * (1 - u) ** 2), (0, 0.75 - (u - 0.5) ** 2), (1, 0.5 * u ** 2)):
+                np.add.at(weights, (rows, np.clip(center + offset, 0, num_levels - 1)), w)
+            # Within half a clip of either end the kernel is clamped to a linear ramp, so the edge
+            # clips are shown pure at their breakpoints; the spline is 50/50 with slope 1 where it joins
+            for edge, inner, ramp in ((0, 1, position < 0.5), (num_levels - 1, num_levels - 2, position > num_levels - 1.5)):
+                frac = np.abs(position[ramp] - edge)
+                weights[ramp] = 0.0
+                weights[ramp, edge] = 1.0 - frac
+                weights[ramp, inner] = frac
+        else:
+            lower = np.clip(np.floor(position).astype(int), 0, num_levels - 2)
+            frac = position - lower
+            weights[rows, lower] = 1.0 - frac
+            weights[rows, lower + 1] = frac
+        
+        # Window of consecutive clips holding all non-zero weight: two for linear blending
+        # (starting at the lower clip, so the third weight stays 0), up to three for smooth
+        width = min(3, num_levels) if self.smooth else 2
+        first = np.argmax(weights > 1e-9, axis=1)
+        first = np.clip(first, 0, num_levels - width)
+        window = weights[rows[:, None], first[:, None] + np.arange(width)]
+        
+        # Q8 fixed point, rounding error pushed onto the largest weight
+        q8 = np.round(window * 256).astype(np.int32)
+        q8[rows, np.argmax(window, axis=1)] += 256 - q8.sum(axis=1)
+        
+        self.lut_first = first.astype(np.int16)
+        self.lut_weights = np.zeros((lut_size, 3), dtype=np.uint16)
+        self.lut_weights[:, :width] = q8
+    
     def get_frame(self, frame_num: int, intensity: float) -> np.ndarray:
         """
         Get a frame based on oven intensity (0-1).
         
-        Intensity mapping:
+        The intensity is quantized into the precomputed lookup table, which
+        gives the clips to mix and their fixed-point weights. With the default
+        four clips and breakpoints the mapping is:
         - 0.00-0.33: blend between low and medium
         - 0.33-0.66: blend between medium and high
         - 0.66-1.00: blend between high and overdrive
@@ -112,40 +479,535 @@ class OvenVideoMixer:
             intensity: Oven intensity (0.0 to 1.0)
         
         Returns:
-            Blended frame
+            Blended frame (always a new buffer)
+        """
+        if self._rebuilt is not None:
+            self._swap_level()
+        idx = int(min(max(intensity, 0.0), 1.0) * (self.lut_size - 1) + 0.5)
+        first = int(self.lut_first[idx])
+        w0, w1, w2 = self.lut_weights[idx]
+        
+        frame = cv2.addWeighted(
+            self._get_frame(first, frame_num), w0 / 256.0,
+            self._get_frame(first + 1, frame_num), w1 / 256.0,
+            0
+        )
+        if w2:
+            # Accumulate the third neighbour in place, no intermediate buffer
+            cv2.addWeighted(frame, 1.0, self._get_frame(first + 2, frame_num), w2 / 256.0, 0, dst=frame)
+        return frame
+
+
+class HudOverlay:
+    """
+    Intensity bar and status text drawn onto the bottom/top of a frame.
+    
+    Only the pixels covered by the HUD are touched: the bar is blended into
+    its own rectangle and the text is alpha-composited into its bounding box.
+    The bar and text sprites are rendered once and cached until the displayed
+    values change.
+    """
+    
+    BAR_HEIGHT = 40
+    BAR_MARGIN = 10
+    BAR_ALPHA = 0.3
+    BORDER = 2
+    TEXT_ORIGIN = (20, 40)
+    FONT = cv2.FONT_HERSHEY_SIMPLEX
+    FONT_SCALE = 1.2
+    FONT_THICKNESS = 2
+    FPS_REFRESH_S = 0.5
+    
+    def __init__(self, frame_width: int, frame_height: int):
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.bar_width = int(frame_width * 0.8)
+        self.bar_x = (frame_width - self.bar_width) // 2
+        self.bar_y = frame_height - self.BAR_HEIGHT - self.BAR_MARGIN
+        
+        # ROI around the bar, padded so the border stroke fits inside it
+        pad = self.BORDER
+        self._bar_roi = (
+            slice(max(0, self.bar_y - pad), min(frame_height, self.bar_y + self.BAR_HEIGHT + pad + 1)),
+            slice(max(0, self.bar_x - pad), min(frame_width, self.bar_x + self.bar_width + pad + 1)),
+        )
+        self._bar_fill = None
+        self._bar_sprite = None
+        self._bar_mask = None
+        
+        self._text = None
+        self._text_roi = None
+        self._text_sprite = None
+        self._text_alpha = None
+        
+        self._fps_shown = 0.0
+        self._fps_updated = 0.0
+    
+    def _render_bar(self, fill_width: int):
+        """Render the bar sprite and its coverage mask for a given fill width."""
+        rows, cols = self._bar_roi
+        h = rows.stop - rows.start
+        w = cols.stop - cols.start
+        x0 = self.bar_x - cols.start
+        y0 = self.bar_y - rows.start
+        x1 = x0 + self.bar_width
+        y1 = y0 + self.BAR_HEIGHT
+        
+        sprite = np.zeros((h, w, 3), dtype=np.uint8)
+        mask = np.zeros((h, w), dtype=np.uint8)
+        cv2.rectangle(sprite, (x0, y0), (x1, y1), (0, 0, 0), -1)
+        cv2.rectangle(sprite, (x0, y0), (x0 + fill_width, y1), (0, 200, 255), -1)
+        cv2.rectangle(sprite, (x0, y0), (x1, y1), (255, 255, 255), self.BORDER)
+        cv2.rectangle(mask, (x0, y0), (x1, y1), 255, -1)
+        cv2.rectangle(mask, (x0, y0), (x1, y1), 255, self.BORDER)
+        
+        self._bar_fill = fill_width
+        self._bar_sprite = sprite
+        self._bar_mask = mask.astype(bool)[:, :, None]
+    
+    def _render_text(self, text: str):
+        """Render the premultiplied text sprite and its alpha for a given string."""
+        (tw, th), baseline = cv2.getTextSize(text, self.FONT, self.FONT_SCALE, self.FONT_THICKNESS)
+        x, y = self.TEXT_ORIGIN
+        pad = self.FONT_THICKNESS
+        top = max(0, y - th - pad)
+        left = max(0, x - pad)
+        bottom = min(self.frame_height, y + baseline + pad)
+        right = min(self.frame_width, x + tw + pad)
+        
+        sprite = np.zeros((bottom - top, right - left, 3), dtype=np.uint8)
+        cv2.putText(
+            sprite,
+            text,
+            (x - left, y - top),
+            self.FONT,
+            self.FONT_SCALE,
+            (0, 255, 0),
+            self.FONT_THICKNESS
+        )
+        
+        self._text = text
+        self._text_roi = (slice(top, bottom), slice(left, right))
+        # putText anti-aliases against black, so the sprite is premultiplied
+        self._text_sprite = sprite.astype(np.float32)
+        self._text_alpha = 1.0 - sprite.max(axis=2, keepdims=True).astype(np.float32) / 255.0
+    
+    def draw(self, frame: np.ndarray, intensity: float, fps: float, test_mode: bool = False) -> np.ndarray:
         """
-        intensity = np.clip(intensity, 0.0, 1.0)
+        Composite the HUD onto a frame in place.
         
-        if intensity < 0.33:
-            # Blend between low (0) and medium (1)
-            blend_alpha = intensity / 0.33
-            frame1 = self._get_frame(0, frame_num)
-            frame2 = self._get_frame(1, frame_num)
+        Args:
+            frame: Frame to draw on (modified in place, must not be a cached source frame)
+            intensity: Oven intensity shown in the bar (0.0 to 1.0)
+            fps: Measured frame rate for the readout
+            test_mode: Whether the test mode tag is shown
+        
+        Returns:
+            The same frame, for convenience
+        """
+        fill_width = int(self.bar_width * min(max(intensity, 0.0), 1.0))
+        if fill_width != self._bar_fill:
+            self._render_bar(fill_width)
+        
+        roi = frame[self._bar_roi]
+        blended = cv2.addWeighted(roi, 1 - self.BAR_ALPHA, self._bar_sprite, self.BAR_ALPHA, 0)
+        np.copyto(roi, blended, where=self._bar_mask)
         
-        elif intensity < 0.66:
-            # Blend between medium (1) and high (2)
-            blend_alpha = (intensity - 0.33) / 0.33
-            frame1 = self._get_frame(1, frame_num)
-            frame2 = self._get_frame(2, frame_num)
+        # Refresh the FPS readout at a fixed rate instead of every frame
+        now = time.perf_counter()
+        if now - self._fps_updated >= self.FPS_REFRESH_S:
+            self._fps_shown = fps
+            self._fps_updated = now
         
+        text = f"Intensity: {intensity:.2f} FPS: {self._fps_shown:.1f}"
+        if test_mode:
+            text += " [TEST MODE]"
+        if text != self._text:
+            self._render_text(text)
+        
+        roi = frame[self._text_roi]
+        roi[:] = roi * self._text_alpha + self._text_sprite
+        return frame
+
+
+class ResolutionController:
+    """
+    Picks the mixer's internal scale from measured frame work time.
+    
+    Work time (blend, upscale and HUD) is smoothed with a one-pole filter. The
+    scale steps down when it exceeds `high_load` of the frame period and steps
+    up when the next larger level is predicted (cost ~ area) to stay below
+    `low_load`. A cooldown after each change lets the average settle.
+    """
+    
+    def __init__(self, mixer: OvenVideoMixer, target_fps: float = 30.0,
+                 high_load: float = 0.75, low_load: float = 0.5, cooldown: int = 30):
+        self.mixer = mixer
+        self.period = 1.0 / target_fps
+        self.high_load = high_load
+        self.low_load = low_load
+        self.cooldown = cooldown
+        self.work_time = 0.0
+        self._frames_since_change = 0
+    
+    def update(self, work_time: float):
+        """Fold in one frame's work time and change scale if needed."""
+        if self.work_time == 0.0:
+            self.work_time = work_time
         else:
-            # Blend between high (2) and overdrive (3)
-            blend_alpha = (intensity - 0.66) / 0.34
-            frame1 = self._get_frame(2, frame_num)
-            frame2 = self._get_frame(3, frame_num)
+            self.work_time = self.work_time * 0.9 + work_time * 0.1
+        
+        self._frames_since_change += 1
+        if self._frames_since_change < self.cooldown:
+            return
+        
+        levels = self.mixer.scale_levels
+        idx = levels.index(self.mixer.scale)
+        if self.work_time > self.high_load * self.period and idx + 1 < len(levels):
+            self._change(levels[idx + 1])
+        elif idx > 0:
+            growth = (levels[idx - 1] / levels[idx]) ** 2
+            if self.work_time * growth < self.low_load * self.period:
+                self._change(levels[idx - 1])
+    
+    def _change(self, scale: float):
+        if not self.mixer.set_scale(scale):
+            return
+        print(f"Internal scale {self.mixer.scale:.2f} -> {scale:.2f} "
+              f"(work {self.work_time * 1000:.1f} ms)")
+        self._frames_since_change = 0
+
+
+class MixerControls:
+    """Playback state shared between the input/display loop and the blend worker."""
+    
+    def __init__(self, intensity: float = 0.5, test_speed: float = 0.01,
+                 state_reader: Optional[StateBusReader] = None):
+        self.intensity = intensity
+        self.test_mode = False
+        self.test_speed = test_speed
+        self.fps = 30.0
+        self.state_reader = state_reader
+    
+    def poll_state(self):
+        """Follow the oven power published on the state bus (ignored in test mode)."""
+        if self.state_reader is None or self.test_mode:
+            return
+        state = self.state_reader.read()
+        if state is not None:
+            self.intensity = min(max(state.total_power_pct, 0.0), 1.0)
+    
+    def handle_key(self, key: int) -> bool:
+        """
+        Apply a key press from cv2.waitKey.
+        
+        Returns:
+            False if the key requests quitting, True otherwise
+        """
+        if key == ord('q') or key == 27:  # Q or ESC
+            return False
+        elif key == ord('w'):  # W
+            self.intensity = min(1.0, self.intensity + 0.05)
+        elif key == ord('s'):  # S
+            self.intensity = max(0.0, self.intensity - 0.05)
+        elif key == ord('t'):  # Test mode
+            self.test_mode = not self.test_mode
+        
+        # Auto-cycle in test mode
+        if self.test_mode:
+            self.intensity += self.test_speed
+            if self.intensity >= 1.0 or self.intensity <= 0.0:
+                self.test_speed *= -1
+        return True
+    
+    def update_fps(self, frame_time: float):
+        """Fold one presented frame interval into the smoothed FPS readout."""
+        fps = 1 / frame_time if frame_time > 0 else 30.0
+        # Smooth the readout so the cached text sprite is not rebuilt every frame
+        self.fps = self.fps * 0.9 + fps * 0.1
+
+
+class FramePacer:
+    """
+    Drift-free frame scheduler based on absolute `perf_counter` deadlines.
+    
+    Deadlines are spaced exactly one period apart from the start time, so a
+    slow frame does not push every later frame back. When presentation falls
+    more than `max_lag_frames` behind, the missed deadlines are skipped
+    instead of being caught up in a burst, which bounds latency. The source
+    frame index is derived from elapsed time, so the oven animation keeps
+    running in real time and source frames are skipped while behind.
+    """
+    
+    def __init__(self, target_fps: float = 30.0, max_lag_frames: int = 2, window: int = 300):
+        self.period = 1.0 / target_fps
+        self.max_lag_frames = max_lag_frames
+        self.window = window
+        self.start()
+    
+    def start(self):
+        """Restart the schedule and statistics from now."""
+        now = time.perf_counter()
+        self.t0 = now
+        self.deadline = now + self.period
+        self.last_present = now
+        self.last_interval = self.period
+        self.last_source_frame = -1
+        self.presented = 0
+        self.dropped = 0
+        self._intervals = []
+    
+    def source_frame(self, at: Optional[float] = None) -> int:
+        """Source frame index that belongs on screen at time `at` (default: next deadline)."""
+        if at is None:
+            at = self.deadline
+        return int((at - self.t0) / self.period)
+    
+    def next_source_frame(self) -> int:
+        """Source frame for the next presentation, counting skipped frames as dropped."""
+        frame = self.source_frame()
+        if self.last_source_frame >= 0 and frame > self.last_source_frame + 1:
+            self.dropped += frame - self.last_source_frame - 1
+        self.last_source_frame = frame
+        return frame
+    
+    def presented_frame(self):
+        """Record that a frame has just been presented."""
+        now = time.perf_counter()
+        self.last_interval = now - self.last_present
+        self.last_present = now
+        self.presented += 1
+        self._intervals.append(self.last_interval)
+        if len(self._intervals) > self.window:
+            del self._intervals[:len(self._intervals) - self.window]
+    
+    def is_late(self) -> bool:
+        """True if the current deadline has already passed."""
+        return time.perf_counter() > self.deadline
+    
+    def present(self, window: str, frame: np.ndarray) -> int:
+        """
+        Show `frame` at the current deadline, advance the schedule and return the pressed key.
+        
+        The wait comes first, so the time a frame took to blend does not show
+        up as presentation jitter; `waitKey(1)` then only pumps the GUI.
+        """
+        remaining = self.deadline - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+        cv2.imshow(window, frame)
+        key = cv2.waitKey(1) & 0xFF
+        self.presented_frame()
         
-        return self.blend_frames(frame1, frame2, blend_alpha)
+        self.deadline += self.period
+        now = time.perf_counter()
+        lag = now - self.deadline
+        if lag > self.max_lag_frames * self.period:
+            # Too far behind: skip the missed slots rather than racing to catch up
+            missed = int(lag / self.period)
+            self.deadline += missed * self.period
+        return key
+    
+    def stats(self) -> dict:
+        """Frame rate, jitter and drop statistics over the recent window."""
+        if not self._intervals:
+            return {"fps": 0.0, "jitter_ms": 0.0, "max_interval_ms": 0.0,
+                    "presented": self.presented, "dropped": self.dropped}
+        intervals = np.array(self._intervals)
+        return {
+            "fps": 1.0 / intervals.mean(),
+            "jitter_ms": float(np.sqrt(np.mean((intervals - self.period) ** 2)) * 1000),
+            "max_interval_ms": float(intervals.max() * 1000),
+            "presented": self.presented,
+            "dropped": self.dropped,
+        }
+    
+    def report(self) -> str:
+        """One-line summary of `stats()` for logging."""
+        st = self.stats()
+        return (f"Pacing: {st['fps']:.1f} fps, jitter {st['jitter_ms']:.2f} ms, "
+                f"max {st['max_interval_ms']:.1f} ms, presented {st['presented']}, "
+                f"dropped {st['dropped']}")
+
+
+class BlendWorker(threading.Thread):
+    """
+    Producer thread that blends and composites frames ahead of the display.
+    
+    Frames are pushed into a small bounded queue; when the display falls behind
+    the worker blocks on the full queue, so it never runs more than
+    `queue_size` frames ahead. OpenCV releases the GIL while blending, so the
+    next frame is produced while the display thread presents the current one.
+    Source frames are picked from the pacer's clock, so the animation stays in
+    real time regardless of how fast the worker runs.
+    """
+    
+    def __init__(self, mixer: OvenVideoMixer, hud: HudOverlay, controls: MixerControls,
+                 pacer: FramePacer, queue_size: int = 2, scaler: Optional[ResolutionController] = None):
+        super().__init__(name="BlendWorker", daemon=True)
+        self.mixer = mixer
+        self.hud = hud
+        self.controls = controls
+        self.pacer = pacer
+        self.scaler = scaler
+        self.frames = queue.Queue(maxsize=queue_size)
+        self._stop_event = threading.Event()
+    
+    def run(self):
+        last_frame = -1
+        while not self._stop_event.is_set():
+            # Aim at the frame that will be on screen when this one is presented
+            frame_num = self.pacer.source_frame(
+                time.perf_counter() + self.frames.qsize() * self.pacer.period)
+            frame_num = max(frame_num, last_frame + 1)
+            last_frame = frame_num
+            
+            frame = compose_frame(self.mixer, self.hud, self.controls,
+                                  frame_num % self.mixer.loop_length, self.scaler)
+            
+            while not self._stop_event.is_set():
+                try:
+                    self.frames.put(frame, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+    
+    def stop(self):
+        """Stop producing and wait for the worker to exit."""
+        self._stop_event.set()
+        self.join(timeout=1.0)
+
+
+WINDOW_NAME = "Oven Video Mixer"
+TARGET_FPS = 30.0
+
+
+def compose_frame(mixer: OvenVideoMixer, hud: HudOverlay, controls: MixerControls,
+                  frame_num: int, scaler: Optional[ResolutionController] = None) -> np.ndarray:
+    """Blend at the internal scale, upscale once and draw the HUD at output size."""
+    start = time.perf_counter()
+    frame = mixer.get_frame(frame_num, controls.intensity)
+    frame = mixer.upscale(frame)
+    
+    # Add UI overlay (composited in place, HUD rectangles only)
+    hud.draw(frame, controls.intensity, controls.fps, controls.test_mode)
+    
+    if scaler is not None:
+        scaler.update(time.perf_counter() - start)
+    return frame
+
+
+def maybe_report(pacer: FramePacer, last_report: float, stats_interval: float) -> float:
+    """Print pacing statistics every `stats_interval` seconds (0 disables)."""
+    now = time.perf_counter()
+    if stats_interval > 0 and now - last_report >= stats_interval:
+        print(pacer.report())
+        return now
+    return last_report
+
+
+def run_sequential(mixer: OvenVideoMixer, hud: HudOverlay, controls: MixerControls,
+                   pacer: FramePacer, stats_interval: float = 30.0,
+                   scaler: Optional[ResolutionController] = None):
+    """Blend, composite and present every frame on the calling thread."""
+    pacer.start()
+    last_report = pacer.t0
+    
+    while True:
+        controls.poll_state()
+        
+        # Get the frame due at the next deadline (skips source frames when behind)
+        frame_num = pacer.next_source_frame() % mixer.loop_length
+        frame = compose_frame(mixer, hud, controls, frame_num, scaler)
+        
+        # Display at the deadline
+        key = pacer.present(WINDOW_NAME, frame)
+        controls.update_fps(pacer.last_interval)
+        last_report = maybe_report(pacer, last_report, stats_interval)
+        if not controls.handle_key(key):
+            break
+
+
+def run_pipelined(mixer: OvenVideoMixer, hud: HudOverlay, controls: MixerControls,
+                  pacer: FramePacer, queue_size: int = 2, stats_interval: float = 30.0,
+                  scaler: Optional[ResolutionController] = None):
+    """Present frames produced by a BlendWorker; this thread only displays and handles input."""
+    pacer.start()
+    last_report = pacer.t0
+    worker = BlendWorker(mixer, hud, controls, pacer, queue_size=queue_size, scaler=scaler)
+    worker.start()
+    
+    try:
+        while True:
+            try:
+                frame = worker.frames.get(timeout=1.0)
+            except queue.Empty:
+                # Keep the window responsive even if the worker stalls
+                if not controls.handle_key(cv2.waitKey(1) & 0xFF):
+                    break
+                continue
+            
+            # When late, present the newest queued frame to keep latency bounded
+            while pacer.is_late():
+                try:
+                    frame = worker.frames.get_nowait()
+                    pacer.dropped += 1
+                except queue.Empty:
+                    break
+            
+            key = pacer.present(WINDOW_NAME, frame)
+            controls.update_fps(pacer.last_interval)
+            controls.poll_state()
+            last_report = maybe_report(pacer, last_report, stats_interval)
+            
+            if not controls.handle_key(key):
+                break
+    finally:
+        worker.stop()
+        print(pacer.report())
 
 
 def main():
     """Real-time oven video mixer with intensity control."""
     
-    video_paths = [
+    parser = argparse.ArgumentParser(description="Real-time oven video mixer")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="Blend frames on a worker thread while the main thread presents")
+    parser.add_argument("--queue-size", type=int, default=2,
+                        help="Frames the blend worker may run ahead in pipelined mode")
+    parser.add_argument("--fps", type=float, default=TARGET_FPS,
+                        help="Target presentation frame rate")
+    parser.add_argument("--adaptive-resolution", action="store_true",
+                        help="Blend at a lower internal resolution chosen from measured frame time")
+    parser.add_argument("--scale-levels", default="1.0,0.75,0.5",
+                        help="Comma-separated internal scales used by --adaptive-resolution")
+    parser.add_argument("--videos", nargs="+", default=None,
+                        help="Clip paths ordered by intensity (default: the four oven clips)")
+    parser.add_argument("--breakpoints", default=None,
+                        help="Comma-separated intensity per clip where it is shown unblended")
+    parser.add_argument("--smooth-blend", action="store_true",
+                        help="Blend up to three neighbouring clips with a smooth kernel")
+    parser.add_argument("--state-bus", action="store_true",
+                        help="Follow the simulator's oven power from the shared-memory state bus")
+    parser.add_argument("--stats-interval", type=float, default=30.0,
+                        help="Seconds between pacing statistics reports (0 disables)")
+    parser.add_argument("--memory-budget", type=float, default=None,
+                        help="MB the decoded clips may use (default: available memory minus --memory-reserve)")
+    parser.add_argument("--memory-reserve", type=float, default=600,
+                        help="MB left for the simulator and plot renderers with the default budget")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Decode the clips while playing instead of preloading them")
+    args = parser.parse_args()
+    
+    video_paths = args.videos or [
         "/home/radius/repositories/energiby-yderzonen/oven_low.mp4",
         "/home/radius/repositories/energiby-yderzonen/oven_medium.mp4",
         "/home/radius/repositories/energiby-yderzonen/oven_high.mp4",
         "/home/radius/repositories/energiby-yderzonen/oven_overdrive.mp4",
     ]
+    breakpoints = None
+    if args.breakpoints:
+        breakpoints = [float(b) for b in args.breakpoints.split(",")]
     
     # Check if videos exist
     missing_videos = [p for p in video_paths if not Path(p).exists()]
@@ -160,10 +1022,19 @@ def main():
     root.destroy()
     
     # Create mixer
+    scale_levels = [1.0]
+    if args.adaptive_resolution:
+        scale_levels = [float(s) for s in args.scale_levels.split(",")]
     mixer = OvenVideoMixer(
         video_paths=video_paths,
         frame_width=screen_width,
-        frame_height=screen_height
+        frame_height=screen_height,
+        scale_levels=scale_levels,
+        breakpoints=breakpoints,
+        smooth=args.smooth_blend,
+        memory_budget=None if args.memory_budget is None else int(args.memory_budget * 2**20),
+        memory_reserve=int(args.memory_reserve * 2**20),
+        streaming=args.streaming
     )
     
     print("Starting video playback...")
@@ -173,94 +1044,25 @@ def main():
     print("  'Q' or ESC: Quit")
     print()
     
-    frame_num = 0
-    intensity = 0.5
-    test_mode = False
-    test_speed = 0.01
-    prev_time = time.time()
-    last_fps = 30.0
+    controls = MixerControls(state_reader=StateBusReader() if args.state_bus else None)
+    hud = HudOverlay(mixer.frame_width, mixer.frame_height)
     
     # Create fullscreen window
-    cv2.namedWindow("Oven Video Mixer", cv2.WINDOW_NORMAL)
-    cv2.setWindowProperty("Oven Video Mixer", cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+    cv2.namedWindow(WINDOW_NAME, cv2.WINDOW_NORMAL)
+    cv2.setWindowProperty(WINDOW_NAME, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
     
-    while True:
-        loop_start = time.time()
-        # Get current frame
-        frame = mixer.get_frame(frame_num, intensity)
-        
-        # Add UI overlay
-        h, w = frame.shape[:2]
-        overlay = frame.copy()
-        
-        # Draw intensity bar
-        bar_height = 40
-        bar_y = h - bar_height - 10
-        bar_width = int(w * 0.8)
-        bar_x = (w - bar_width) // 2
-        
-        # Background
-        cv2.rectangle(overlay, (bar_x, bar_y), (bar_x + bar_width, bar_y + bar_height), (0, 0, 0), -1)
-        
-        # Fill based on intensity
-        fill_width = int(bar_width * intensity)
-        cv2.rectangle(overlay, (bar_x, bar_y), (bar_x + fill_width, bar_y + bar_height), (0, 200, 255), -1)
-        
-        # Border
-        cv2.rectangle(overlay, (bar_x, bar_y), (bar_x + bar_width, bar_y + bar_height), (255, 255, 255), 2)
-        
-        # Blend overlay
-        frame = cv2.addWeighted(frame, 0.7, overlay, 0.3, 0)
-        
-        # Add text
-        text = f"Intensity: {intensity:.2f} FPS: {last_fps:.1f}"
-        if test_mode:
-            text += " [TEST MODE]"
-        cv2.putText(
-            frame,
-            text,
-            (20, 40),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            1.2,
-            (0, 255, 0),
-            2
-        )
-        
-        # Display
-        cv2.imshow("Oven Video Mixer", frame)
-        
-        # Calculate FPS
-        current_time = time.time()
-        fps = 1 / (current_time - prev_time) if (current_time - prev_time) > 0 else 30.0
-        prev_time = current_time
-        last_fps = fps
-        
-        # Adjust wait time to maintain 30 fps
-        elapsed = time.time() - loop_start
-        target_fps = 30.0
-        target_time = 1 / target_fps
-        wait_ms = max(1, int((target_time - elapsed) * 1000))
-        
-        # Handle input
-        key = cv2.waitKey(wait_ms) & 0xFF
-        
-        if key == ord('q') or key == 27:  # Q or ESC
-            break
-        elif key == ord('w'):  # W
-            intensity = min(1.0, intensity + 0.05)
-        elif key == ord('s'):  # S
-            intensity = max(0.0, intensity - 0.05)
-        elif key == ord('t'):  # Test mode
-            test_mode = not test_mode
-        
-        # Auto-cycle in test mode
-        if test_mode:
-            intensity += test_speed
-            if intensity >= 1.0 or intensity <= 0.0:
-                test_speed *= -1
-        
-        frame_num += 1
-        frame_num %= max(len(mixer.frames[0]), len(mixer.frames[1]), len(mixer.frames[2]), len(mixer.frames[3]))
+    pacer = FramePacer(target_fps=args.fps)
+    scaler = None
+    if args.adaptive_resolution and len(mixer.scale_levels) > 1:
+        scaler = ResolutionController(mixer, target_fps=args.fps)
+    
+    if args.pipelined:
+        run_pipelined(mixer, hud, controls, pacer, queue_size=args.queue_size,
+                      stats_interval=args.stats_interval, scaler=scaler)
+    else:
+        run_sequential(mixer, hud, controls, pacer,
+                       stats_interval=args.stats_interval, scaler=scaler)
+        print(pacer.report())
     
     cv2.destroyAllWindows()
     print("Done!")